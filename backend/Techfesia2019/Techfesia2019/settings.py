@@ -106,6 +106,11 @@ WSGI_APPLICATION = 'Techfesia2019.wsgi.application'
 
 DATABASES = external_settings.DATABASES
 
+# SQLite tests run against a file rather than in memory, so the worker processes of the concurrency tests share
+# the test database
+if DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+    DATABASES['default'].setdefault('TEST', {}).setdefault('NAME', os.path.join(BASE_DIR, 'test_db.sqlite3'))
+
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
 
@@ -193,6 +198,31 @@ SWAGGER_SETTINGS = {
     },
 }
 
+# Event registrations
+
+# When True, registration requests are queued and admitted in batches by `manage.py process_registration_queue`
+EVENT_REGISTRATION_QUEUE = False
+
+# Seconds a waitlist position is cached for, clients poll it
+WAITLIST_POSITION_CACHE_TIMEOUT = 5
+
+# Events are cached by public_id for this many seconds in each process (0 disables the cache), changes made in
+# other processes become visible after this. With EVENT_CACHE_SHARED the default cache backs the local copies.
+EVENT_CACHE_TIMEOUT = 60
+EVENT_CACHE_SIZE = 1000
+EVENT_CACHE_SHARED = False
+
+# Threads encoding event CSVs in parallel for the participants ZIP export
+EXPORT_WORKERS = 4
+
+# Seconds after which a running export job is taken for dead (its worker was stopped) and marked failed
+EXPORT_JOB_TIMEOUT = 60 * 30
+
+# Teams per page of the team list, clients can ask for up to the max with ?page_size= and follow the Link header.
+# Set it to None for clients that expect the whole list, as before paging was added.
+TEAM_LIST_PAGE_SIZE = 50
+TEAM_LIST_MAX_PAGE_SIZE = 500
+
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/2.2/howto/static-files/
 
@@ -246,3 +276,14 @@ PAYTM_INDUSTRY_TYPE_ID = external_settings.PAYTM_INDUSTRY_TYPE_ID
 
 PAYTM_PAYMENT_URL = external_settings.PAYTM_PAYMENT_URL
 
+# order status api used to verify callbacks, load tests point it at payments.fake_gateway
+PAYTM_STATUS_URL = ('https://securegw.paytm.in/order/status' if PAYTM_PRODUCTION
+                    else 'https://securegw-stage.paytm.in/order/status')
+
+# Order status calls: connect and read timeouts in seconds, retries after a connection error, timeout or 5xx
+# answer, waiting up to PAYTM_STATUS_BACKOFF * 2 ** retry seconds before each, and kept alive connections
+PAYTM_STATUS_TIMEOUT = (3.05, 10)
+PAYTM_STATUS_RETRIES = 2
+PAYTM_STATUS_BACKOFF = 0.25
+PAYTM_POOL_SIZE = 20
+
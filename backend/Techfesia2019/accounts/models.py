@@ -7,9 +7,12 @@ from django.dispatch import receiver
 from events.models import Event, SoloEvent
 from registration.models import User
 
+# Students of the host institute get the reserved seats and fees
+HOME_INSTITUTE = 'Indian Institute of Information Technology, Sri City'
+
 
 class Institute(models.Model):
-    name = models.CharField(max_length=200, default='Indian Institute of Information Technology, Sri City', unique=True)
+    name = models.CharField(max_length=200, default=HOME_INSTITUTE, unique=True)
 
 
 class Profile(models.Model):
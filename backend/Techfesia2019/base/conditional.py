@@ -0,0 +1,28 @@
+"""
+    Conditional GET for API views whose state can be summed up in a few cheap values.
+
+    A view computes its validators before doing any serialization, returns not_modified() when the client's copy
+    is current, and otherwise sets the validators on its response with set_validators().
+"""
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+
+def make_etag(*parts):
+    return '"{0}"'.format('-'.join(str(i) for i in parts))
+
+
+def not_modified(request, etag, last_modified=None):
+    """
+        Returns a 304 response when If-None-Match or If-Modified-Since match, else None
+    """
+
+    return get_conditional_response(request, etag=etag,
+                                    last_modified=last_modified and int(last_modified.timestamp()))
+
+
+def set_validators(response, etag, last_modified=None):
+    response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    return response
@@ -0,0 +1,64 @@
+"""
+    Keyset (cursor) pagination on a (timestamp, id) pair.
+
+    A page is fetched by seeking past the last row of the previous one instead of OFFSET, so every page costs the
+    same index range scan however deep it is, and rows inserted meanwhile do not shift the pages.
+"""
+import base64
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.utils.urls import replace_query_param
+
+
+def encode_cursor(timestamp, pk):
+    return base64.urlsafe_b64encode('{0}|{1}'.format(timestamp.isoformat(), pk).encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        timestamp, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        timestamp, pk = parse_datetime(timestamp), int(pk)
+    except (ValueError, UnicodeError):
+        timestamp = None
+    if timestamp is None:
+        raise ValueError('Invalid cursor')
+    return timestamp, pk
+
+
+def keyset_page(queryset, field, cursor=None, page_size=50):
+    """
+        Returns (rows, next_cursor) for the page of `queryset` ordered by (`field`, pk) that starts after `cursor`,
+        next_cursor is None on the last page. A page_size of None returns all the remaining rows.
+    """
+
+    queryset = queryset.order_by(field, 'pk')
+    if cursor:
+        timestamp, pk = decode_cursor(cursor)
+        queryset = queryset.filter(Q(**{field + '__gt': timestamp}) | Q(**{field: timestamp, 'pk__gt': pk}))
+    if page_size is None:
+        return list(queryset), None
+    rows = list(queryset[:page_size + 1])
+    if len(rows) <= page_size:
+        return rows, None
+    rows = rows[:page_size]
+    return rows, encode_cursor(getattr(rows[-1], field), rows[-1].pk)
+
+
+def paginate_by_keyset(request, queryset, field, default_page_size, max_page_size):
+    """
+        keyset_page driven by the `cursor` and `page_size` query parameters, returns (rows, next page url or None).
+        With a default_page_size of None the rows are only paged when the client asks for a page_size.
+        Raises ValueError for a bad cursor or page size.
+    """
+
+    page_size = request.query_params.get('page_size', default_page_size)
+    try:
+        page_size = None if page_size is None else int(page_size)
+    except ValueError:
+        raise ValueError('page_size must be a number')
+    if page_size is not None and not 0 < page_size <= max_page_size:
+        raise ValueError('page_size must be between 1 and {0}'.format(max_page_size))
+    rows, next_cursor = keyset_page(queryset, field, request.query_params.get('cursor'), page_size)
+    if next_cursor is None:
+        return rows, None
+    return rows, replace_query_param(request.build_absolute_uri(), 'cursor', next_cursor)
@@ -0,0 +1,23 @@
+"""
+    Newline delimited JSON, one object per line, for clients that want to process a long list as it arrives.
+"""
+import json
+from rest_framework.renderers import BaseRenderer
+
+
+def ndjson_lines(items):
+    for item in items:
+        yield json.dumps(item, separators=(',', ':')) + '\n'
+
+
+class NDJSONRenderer(BaseRenderer):
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        # Lists give a line per item, anything else (errors) a single line
+        if data is None:
+            return b''
+        items = data if isinstance(data, list) else [data]
+        return ''.join(ndjson_lines(items)).encode(self.charset)
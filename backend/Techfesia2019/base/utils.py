@@ -18,3 +18,17 @@ def generate_public_id(object, length=10):
         rand_string = generate_random_string()
 
     return rand_string
+
+
+def generate_public_ids(model, count, length=10):
+    """
+        Generates `count` unused public ids for `model` with a single lookup, for use with bulk_create
+    """
+
+    public_ids = set()
+    while len(public_ids) < count:
+        candidates = {generate_random_string(length) for _ in range(count - len(public_ids))}
+        taken = set(model.objects.filter(public_id__in=candidates).values_list('public_id', flat=True))
+        public_ids |= candidates - taken
+
+    return list(public_ids)
@@ -0,0 +1,119 @@
+"""
+    Admission queue for registration bursts.
+
+    When settings.EVENT_REGISTRATION_QUEUE is on, EventRegistrationView only validates the request and stores a
+    RegistrationTicket. A worker (manage.py process_registration_queue) then group-commits the queued tickets of an
+    event in batches: one event lock, a few set-based lookups, one bulk insert and one allocation run per batch.
+"""
+from django.db import transaction
+from django.utils import timezone
+from accounts.models import HOME_INSTITUTE, ProfileOrganizer, ProfileVolunteer
+from base.utils import generate_public_ids
+from events.models import Event
+from .models import RegistrationTicket, SoloEventRegistration, TeamEventRegistration, TeamMember
+
+
+def enqueue_registration(event, profile, team=None):
+    return RegistrationTicket.objects.create(event=event, profile=profile, team=team)
+
+
+def admit_queued_tickets(batch_size=500):
+    """
+        Processes the oldest event's queued tickets, at most `batch_size` of them.
+        Returns the number of tickets processed, 0 when the queue is empty.
+    """
+
+    event_id = RegistrationTicket.objects.filter(status='queued').order_by('pk') \
+        .values_list('event_id', flat=True).first()
+    if event_id is None:
+        return 0
+    event = Event.objects.get_concrete(pk=event_id)
+
+    with transaction.atomic():
+        # Other workers picking the same event wait here and then only see what is still queued
+        event.lock()
+        tickets = list(RegistrationTicket.objects.filter(event_id=event_id, status='queued')
+                       .select_related('profile__college', 'team').order_by('pk')[:batch_size])
+        if event.team_event:
+            registrations = _admit_teams(event, tickets)
+        else:
+            registrations = _admit_people(event, tickets)
+
+        public_ids = generate_public_ids(registrations[0].__class__, len(registrations)) if registrations else []
+        for registration, public_id in zip(registrations, public_ids):
+            registration.public_id = public_id
+        if registrations:
+            registrations[0].__class__.objects.bulk_create(registrations)
+
+        processed_on = timezone.now()
+        for ticket in tickets:
+            ticket.processed_on = processed_on
+            if ticket.status == 'registered':
+                ticket.registration_public_id = ticket.registration.public_id
+        RegistrationTicket.objects.bulk_update(tickets, ['status', 'message', 'registration_public_id',
+                                                         'processed_on'])
+        event.refresh_participants()
+    return len(tickets)
+
+
+def _admit_people(event, tickets):
+    registered = set(SoloEventRegistration.objects.filter(event=event,
+                                                          profile_id__in=[i.profile_id for i in tickets])
+                     .values_list('profile_id', flat=True))
+    staff = _event_staff(event)
+    registrations = []
+    for ticket in tickets:
+        if ticket.profile_id in registered:
+            _reject(ticket, 'Already registered for event')
+            continue
+        if ticket.profile_id in staff:
+            _reject(ticket, 'Organizers and volunteers can not participate in their own event')
+            continue
+        registered.add(ticket.profile_id)
+        college = ticket.profile.college
+        ticket.registration = SoloEventRegistration(event=event, profile=ticket.profile,
+                                                    is_reserved=college is not None and college.name == HOME_INSTITUTE)
+        ticket.status = 'registered'
+        registrations.append(ticket.registration)
+    return registrations
+
+
+def _admit_teams(event, tickets):
+    teams = {ticket.team_id for ticket in tickets}
+    rosters = {ticket.team_id: {ticket.team.team_leader_id} for ticket in tickets}
+    # Invitees count once they accept, as in TeamEvent.find_registration
+    members = TeamMember.objects.filter(invitation_accepted=True)
+    for team_id, profile_id in members.filter(team_id__in=teams).values_list('team_id', 'profile_id'):
+        rosters[team_id].add(profile_id)
+
+    registered_teams = TeamEventRegistration.objects.filter(event=event)
+    registered = set(registered_teams.values_list('team__team_leader_id', flat=True))
+    registered.update(members.filter(team__events__event=event).values_list('profile_id', flat=True))
+
+    staff = _event_staff(event)
+    registrations = []
+    for ticket in tickets:
+        roster = rosters[ticket.team_id]
+        if roster & registered:
+            _reject(ticket, 'Already registered for event')
+            continue
+        if roster & staff:
+            _reject(ticket, 'Organizers and volunteers of the event can not be in a participating team')
+            continue
+        registered |= roster
+        ticket.registration = TeamEventRegistration(event=event, team=ticket.team,
+                                                    is_reserved=ticket.team.is_reserved)
+        ticket.status = 'registered'
+        registrations.append(ticket.registration)
+    return registrations
+
+
+def _event_staff(event):
+    organizers = ProfileOrganizer.objects.filter(events=event).values_list('profile_id', flat=True)
+    volunteers = ProfileVolunteer.objects.filter(events=event).values_list('profile_id', flat=True)
+    return set(organizers.union(volunteers))
+
+
+def _reject(ticket, message):
+    ticket.status = 'rejected'
+    ticket.message = message
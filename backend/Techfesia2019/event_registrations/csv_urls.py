@@ -3,5 +3,6 @@ from . import csv_views
 
 urlpatterns = [
     path('event/<str:public_id>/registrations/', csv_views.get_event_registrations, name='event_registrations_csv'),
+    path('events/registrations.zip', csv_views.get_events_registrations_zip, name='events_registrations_zip'),
     path('login/', csv_views.staff_login, name='staff_login_csv')
 ]
@@ -1,64 +1,75 @@
+from django.conf import settings
 from django.http import StreamingHttpResponse, HttpResponse, HttpResponseRedirect
 from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import login as auth_login, authenticate
-from events.models import Event, TeamEvent
+from django.core.exceptions import ObjectDoesNotExist
+from django.utils.dateparse import parse_date
+from events.models import Event
 from .permissions import IsStaffUser
 from .forms import StaffLoginForm
-import csv
-from itertools import chain
+from .exports import EXPORT_FORMATS, events_for_export, event_columns, export_filename, export_rows, select_columns
+from .exports import zip_chunks
 from rest_framework.decorators import permission_classes
-from rest_framework.response import Response
-
-
-class Echo:
-    @staticmethod
-    def write(value):
-        return value
 
 
 @login_required(login_url='staff_login_csv', redirect_field_name='next')
 @permission_classes([IsStaffUser, ])  # todo: Add Permission to make sure a staff user is accessing the data
 def get_event_registrations(request, public_id):
-    base_event = Event.objects.get(public_id=public_id)
-    # if Event is a Team Event
-    if base_event.team_event:
-        try:
-            event = base_event.teamevent
-        except TeamEvent.DoesNotExist:
-            return Response(status=404)
-        header = (['Team Name', 'status', 'Reserved', 'Team Leader', 'Team Leader Email', 'college', 'registered on',
-                   'All Members'],)
-        data = ([
-            i.team.name,
-            i.status,
-            str(i.is_reserved),
-            i.team.team_leader.user.first_name + ' ' + i.team.team_leader.user.last_name,
-            str(i.team.team_leader.user.email),
-            i.team.team_leader.college.name,
-            str(i.created_on),
-            i.team.team_members
-        ] for i in event.teameventregistration_set.all())
-    else:
-        event = base_event.soloevent
-        header = (['Participant Name', 'status', 'Reserved', 'email', 'phone number', 'college', 'registered on'],)
-        data = ([
-            i.profile.user.first_name + ' ' + i.profile.user.last_name,
-            i.status,
-            str(i.is_reserved),
-            str(i.profile.user.email),
-            str(i.profile.phone_number),
-            str(i.profile.college.name),
-            str(i.created_on)
-        ] for i in event.soloeventregistration_set.all())
-    psuedo_buffer = Echo()
-    writer = csv.writer(psuedo_buffer)
-    response = StreamingHttpResponse((writer.writerow(row) for row in chain(header, data)), content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="' + event.title + '-participants_list.csv"'
+    """
+        Streams the participants of an event, limited to the columns in ?fields= (comma separated keys),
+        as ?format=csv (the default), tsv or ndjson
+    """
+
+    try:
+        event = Event.objects.get_concrete(public_id=public_id)
+    except ObjectDoesNotExist:
+        return HttpResponse(status=404)
+    export_format = EXPORT_FORMATS.get(request.GET.get('format', 'csv'))
+    if export_format is None:
+        return HttpResponse('Unknown format, choose from ' + ', '.join(EXPORT_FORMATS), status=400)
+    keys = [i.strip() for i in request.GET.get('fields', '').split(',') if i.strip()]
+    try:
+        columns = select_columns(event_columns(event), keys)
+    except ValueError as error:
+        return HttpResponse(str(error), status=400)
+    response = StreamingHttpResponse(export_format.lines(columns, export_rows(event, columns)),
+                                     content_type=export_format.content_type)
+    response['Content-Disposition'] = 'attachment; filename="' + export_filename(event, export_format.extension) + '"'
     response['status'] = 200
     return response
 
 
+def date_param(request, name):
+    value = request.GET.get(name)
+    if not value:
+        return None
+    date = parse_date(value)
+    if date is None:
+        raise ValueError('{0} is not a date'.format(value))
+    return date
+
+
+@login_required(login_url='staff_login_csv', redirect_field_name='next')
+def get_events_registrations_zip(request):
+    """
+        Streams a ZIP with the participant CSV of every event, limited by ?category= (repeatable) and the
+        ?from= and ?to= start dates
+    """
+
+    if not request.user.is_staff:
+        return HttpResponse(status=403)
+    try:
+        categories = [int(i) for i in request.GET.getlist('category')]
+        start_date, end_date = date_param(request, 'from'), date_param(request, 'to')
+    except ValueError:
+        return HttpResponse('Invalid category or date', status=400)
+    events = events_for_export(categories, start_date, end_date)
+    response = StreamingHttpResponse(zip_chunks(events, settings.EXPORT_WORKERS), content_type='application/zip')
+    response['Content-Disposition'] = 'attachment; filename="participants_lists.zip"'
+    return response
+
+
 def staff_login(request):
     if request.method == 'POST':
         print(request.POST)
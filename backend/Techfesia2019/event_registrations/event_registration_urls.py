@@ -1,8 +1,13 @@
 from django.urls import path
 from .views import EventRegistrationView, EventRegistrationDetailView, EventRegistrationListView
+from .views import RegistrationTicketDetailView, WaitlistPositionView, ExportJobCreateView, ExportJobDetailView
 
 urlpatterns = [
     path('', EventRegistrationView.as_view(), name='create_event_registration'),
     path('view', EventRegistrationDetailView.as_view(), name='event_registration_detail'),
     path('view_all', EventRegistrationListView.as_view(), name='list_event_registration'),
+    path('position', WaitlistPositionView.as_view(), name='waitlist_position'),
+    path('tickets/<str:ticket_id>', RegistrationTicketDetailView.as_view(), name='registration_ticket_detail'),
+    path('exports', ExportJobCreateView.as_view(), name='create_export_job'),
+    path('exports/<str:job_id>', ExportJobDetailView.as_view(), name='export_job_detail'),
 ]
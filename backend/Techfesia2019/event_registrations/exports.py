@@ -0,0 +1,401 @@
+"""
+    Participant exports of an event, row by row, for the CSV, TSV and NDJSON downloads, as background ExportJobs,
+    and of many events as a ZIP of CSVs.
+
+    An export is a list of Columns, all of the event's kind by default. Registrations are read in pk ordered chunks
+    with just the columns' fields, and their profiles, teams and rosters as far as the columns need them, loaded per
+    chunk, so an export takes a few queries per chunk however long the event's list is, and holds one chunk in
+    memory.
+
+    An ExportJob is queued by request_export and run by a worker (manage.py process_export_jobs), which writes the
+    CSV to MEDIA_ROOT. The job records the registrations it was generated from, and request_export hands the
+    finished job out again until any of the event's registrations is added, changed or removed. A job still running
+    after EXPORT_JOB_TIMEOUT is taken for dead and marked failed, so the event can be exported again.
+"""
+import csv
+import io
+import tempfile
+import zipfile
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from functools import partial
+from django.conf import settings
+from django.core.files import File
+from django.db import connections
+from django.db.models import Prefetch
+from django.utils import timezone
+from base.renderers import ndjson_lines, NDJSONRenderer
+from events.models import Event
+from .models import ExportJob, TeamMember, registrations_version
+
+EXPORT_CHUNK_SIZE = 2000
+
+# Export jobs record their progress every this many participants
+EXPORT_PROGRESS_EVERY = 500
+
+# Encoded CSVs waiting to go into an archive stay in memory up to this size, then spill to a temporary file
+EXPORT_SPOOL_SIZE = 1024 * 1024
+ZIP_BLOCK_SIZE = 64 * 1024
+
+
+class Column:
+    """
+        A column of the participant export: `key` chooses it in ?fields=, `fields` are the paths it reads (passed
+        to only(), their relations to select_related) and value(registration) gives the cell
+    """
+
+    def __init__(self, key, header, fields, value, prefetch=None):
+        self.key = key
+        self.header = header
+        self.fields = fields
+        self.value = value
+        # Returns a Prefetch the column needs, for relations select_related cannot follow
+        self.prefetch = prefetch
+
+
+def full_name(user):
+    return user.first_name + ' ' + user.last_name
+
+
+def college_name(profile):
+    return profile.college.name if profile.college_id else ''
+
+
+def roster_prefetch():
+    members = TeamMember.objects.select_related('profile__user').only(
+        'team', 'profile__user__first_name', 'profile__user__last_name'
+    )
+    return Prefetch('team__teammember_set', queryset=members.order_by('pk'))
+
+
+STATUS_COLUMN = Column('status', 'status', ('is_complete', 'is_confirmed'), lambda i: i.status)
+RESERVED_COLUMN = Column('reserved', 'Reserved', ('is_reserved',), lambda i: str(i.is_reserved))
+REGISTERED_ON_COLUMN = Column('registeredOn', 'registered on', ('created_on',), lambda i: str(i.created_on))
+
+SOLO_COLUMNS = [
+    Column('name', 'Participant Name', ('profile__user__first_name', 'profile__user__last_name'),
+           lambda i: full_name(i.profile.user)),
+    STATUS_COLUMN,
+    RESERVED_COLUMN,
+    Column('email', 'email', ('profile__user__email',), lambda i: str(i.profile.user.email)),
+    Column('phoneNumber', 'phone number', ('profile__phone_number',), lambda i: str(i.profile.phone_number)),
+    Column('college', 'college', ('profile__college__name',), lambda i: college_name(i.profile)),
+    REGISTERED_ON_COLUMN,
+]
+TEAM_COLUMNS = [
+    Column('teamName', 'Team Name', ('team__name',), lambda i: i.team.name),
+    STATUS_COLUMN,
+    RESERVED_COLUMN,
+    Column('leader', 'Team Leader', ('team__team_leader__user__first_name', 'team__team_leader__user__last_name'),
+           lambda i: full_name(i.team.team_leader.user)),
+    Column('leaderEmail', 'Team Leader Email', ('team__team_leader__user__email',),
+           lambda i: str(i.team.team_leader.user.email)),
+    Column('college', 'college', ('team__team_leader__college__name',), lambda i: college_name(i.team.team_leader)),
+    REGISTERED_ON_COLUMN,
+    Column('members', 'All Members', ('team__id',), lambda i: i.team.team_members, prefetch=roster_prefetch),
+]
+
+
+def event_columns(event):
+    return TEAM_COLUMNS if event.team_event else SOLO_COLUMNS
+
+
+def select_columns(columns, keys=None):
+    """
+        The columns with the given keys, in that order, or all of them when no keys are given.
+        Raises ValueError for an unknown key.
+    """
+
+    if not keys:
+        return columns
+    by_key = {i.key: i for i in columns}
+    unknown = [i for i in keys if i not in by_key]
+    if unknown:
+        raise ValueError('Unknown field(s): {0}, choose from {1}'.format(', '.join(unknown), ', '.join(by_key)))
+    return [by_key[i] for i in keys]
+
+
+def chunked(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+        Yields the rows of queryset in pk order, fetching chunk_size rows at a time with a keyset on pk.
+        Unlike iterator(), every chunk gets the queryset's prefetch_related lookups.
+    """
+
+    queryset = queryset.order_by('pk')
+    last_pk = None
+    while True:
+        chunk = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        chunk = list(chunk[:chunk_size])
+        yield from chunk
+        if len(chunk) < chunk_size:
+            return
+        last_pk = chunk[-1].pk
+
+
+def export_queryset(event, columns):
+    """
+        The event's registrations with just what the columns read, and the event id, loaded along
+    """
+
+    paths = [path for column in columns for path in column.fields]
+    # event_id is always loaded, a deferred one would cost a query per row for anything reading it
+    registrations = event.registrations().only('event', *paths)
+    related = sorted({path.rsplit('__', 1)[0] for path in paths if '__' in path})
+    if related:
+        registrations = registrations.select_related(*related)
+    prefetches = [column.prefetch() for column in columns if column.prefetch]
+    if prefetches:
+        registrations = registrations.prefetch_related(*prefetches)
+    return registrations
+
+
+def registration_row(columns, registration):
+    return [column.value(registration) for column in columns]
+
+
+def export_rows(event, columns, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+        Yields a row of the columns per registration of a SoloEvent or TeamEvent
+    """
+
+    for registration in chunked(export_queryset(event, columns), chunk_size):
+        yield registration_row(columns, registration)
+
+
+def participant_rows(event, chunk_size=EXPORT_CHUNK_SIZE, columns=None):
+    """
+        The header and then a row per registration of a SoloEvent or TeamEvent, of all its columns by default
+    """
+
+    columns = columns or event_columns(event)
+    yield [column.header for column in columns]
+    yield from export_rows(event, columns, chunk_size)
+
+
+class Echo:
+    @staticmethod
+    def write(value):
+        return value
+
+
+def delimited_lines(columns, rows, dialect='excel'):
+    writer = csv.writer(Echo(), dialect=dialect)
+    yield writer.writerow([column.header for column in columns])
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def json_lines(columns, rows):
+    keys = [column.key for column in columns]
+    return ndjson_lines(dict(zip(keys, row)) for row in rows)
+
+
+# Encoders of export_rows by ?format=, lines(columns, rows) yields the encoded text line by line
+ExportFormat = namedtuple('ExportFormat', ['content_type', 'extension', 'lines'])
+
+EXPORT_FORMATS = {
+    'csv': ExportFormat('text/csv', 'csv', delimited_lines),
+    'tsv': ExportFormat('text/tab-separated-values', 'tsv', partial(delimited_lines, dialect='excel-tab')),
+    'ndjson': ExportFormat(NDJSONRenderer.media_type, 'ndjson', json_lines),
+}
+
+
+def events_for_export(categories=(), start_date=None, end_date=None):
+    """
+        The SoloEvents and TeamEvents in any of the given categories, starting between the given dates
+    """
+
+    events = Event.objects.order_by('start_date', 'title')
+    if categories:
+        events = events.filter(pk__in=Event.objects.filter(category__in=categories).values('pk'))
+    if start_date:
+        events = events.filter(start_date__gte=start_date)
+    if end_date:
+        events = events.filter(start_date__lte=end_date)
+    return events.concrete()
+
+
+def export_filename(event, extension='csv'):
+    return '{0}-participants_list.{1}'.format(event.title.replace('/', '-'), extension)
+
+
+def write_csv(event, output, progress=None):
+    """
+        Writes the event's participant CSV to the binary file output, returns the number of participants.
+        progress is called with the number written so far every EXPORT_PROGRESS_EVERY participants.
+    """
+
+    text = io.TextIOWrapper(output, encoding='utf-8', newline='')
+    writer = csv.writer(text)
+    rows = participant_rows(event)
+    writer.writerow(next(rows))
+    written = 0
+    for written, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if progress is not None and written % EXPORT_PROGRESS_EVERY == 0:
+            progress(written)
+    text.flush()
+    text.detach()
+    return written
+
+
+def encode_csv(event):
+    """
+        Writes the event's participant CSV to a spooled temporary file, returned rewound
+    """
+
+    spool = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_SIZE)
+    write_csv(event, spool)
+    spool.seek(0)
+    return spool
+
+
+def encode_csv_in_thread(event):
+    try:
+        return encode_csv(event)
+    finally:
+        # Worker threads have their own connections, which would otherwise stay open
+        connections.close_all()
+
+
+def encoded_csvs(events, workers):
+    """
+        Yields (event, encoded CSV) in the order of events. With more than one worker the CSVs are encoded in
+        parallel, at most `workers` ahead of the one being consumed.
+    """
+
+    if workers <= 1:
+        for event in events:
+            yield event, encode_csv(event)
+        return
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for event in events:
+            pending.append((event, executor.submit(encode_csv_in_thread, event)))
+            if len(pending) > workers:
+                event, future = pending.popleft()
+                yield event, future.result()
+        while pending:
+            event, future = pending.popleft()
+            yield event, future.result()
+
+
+class ZipBuffer:
+    """
+        A write only file for zipfile, handing out what was written since the last take()
+    """
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def zip_chunks(events, workers=1):
+    """
+        Yields a ZIP archive with a participant CSV per event, piece by piece as it is compressed
+    """
+
+    buffer = ZipBuffer()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for event, spool in encoded_csvs(events, workers):
+            with spool, archive.open(export_filename(event), 'w', force_zip64=True) as entry:
+                for block in iter(lambda: spool.read(ZIP_BLOCK_SIZE), b''):
+                    entry.write(block)
+                    if buffer.chunks:
+                        yield buffer.take()
+            yield buffer.take()
+    # The central directory
+    yield buffer.take()
+
+
+def fail_stale_export_jobs():
+    """
+        Marks jobs running for longer than EXPORT_JOB_TIMEOUT as failed, their worker was stopped or crashed.
+        Returns the number of jobs failed.
+    """
+
+    started_before = timezone.now() - timedelta(seconds=settings.EXPORT_JOB_TIMEOUT)
+    return ExportJob.objects.filter(status='running', started_on__lt=started_before) \
+        .update(status='failed', message='The export did not finish in time', finished_on=timezone.now())
+
+
+def request_export(event, profile=None):
+    """
+        Returns (job, reused): the finished export of the event's current registrations when there is one,
+        else the export already waiting or running, else a newly queued one
+    """
+
+    fail_stale_export_jobs()
+    count, updated_on = registrations_version(event.registrations())
+    jobs = ExportJob.objects.filter(event=event).order_by('-pk')
+    done = jobs.filter(status='done', registration_count=count, registrations_updated_on=updated_on).first()
+    if done is not None and done.file.storage.exists(done.file.name):
+        return done, True
+    pending = jobs.filter(status__in=('queued', 'running')).first()
+    if pending is not None:
+        return pending, False
+    return ExportJob.objects.create(event=event, requested_by=profile), False
+
+
+def run_export_job(job):
+    """
+        Writes the job's CSV to storage, recording progress on the job as it goes
+    """
+
+    def progress(written):
+        job.rows_written = written
+        ExportJob.objects.filter(pk=job.pk).update(rows_written=written)
+
+    try:
+        event = Event.objects.get_concrete(pk=job.event_id)
+        # Taken before reading, so a registration changing meanwhile makes the file look outdated, never current
+        job.registration_count, job.registrations_updated_on = registrations_version(event.registrations())
+        job.total_rows = job.registration_count
+        job.save(update_fields=['registration_count', 'registrations_updated_on', 'total_rows'])
+        with tempfile.TemporaryFile() as output:
+            job.rows_written = write_csv(event, output, progress)
+            output.seek(0)
+            job.file.save('{0}-{1}'.format(job.public_id, export_filename(event)), File(output), save=False)
+    except Exception as error:
+        job.status = 'failed'
+        job.message = str(error)[:200]
+        raise
+    else:
+        job.status = 'done'
+    finally:
+        job.finished_on = timezone.now()
+        # Only what the worker owns, the other columns may have been changed since it loaded the job
+        job.save(update_fields=['status', 'message', 'file', 'rows_written', 'finished_on'])
+
+
+def run_next_export_job():
+    """
+        Claims and runs the oldest queued export job, returns it, or None when the queue is empty
+    """
+
+    fail_stale_export_jobs()
+    while True:
+        job = ExportJob.objects.filter(status='queued').order_by('pk').first()
+        if job is None:
+            return None
+        # Another worker may have claimed it since
+        if ExportJob.objects.filter(pk=job.pk, status='queued').update(status='running', started_on=timezone.now()):
+            job.refresh_from_db()
+            try:
+                run_export_job(job)
+            except Exception:
+                # Recorded on the job
+                pass
+            return job
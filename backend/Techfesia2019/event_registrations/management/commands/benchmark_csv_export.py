@@ -0,0 +1,66 @@
+import tracemalloc
+from django.core.management.base import BaseCommand
+from django.db import connection
+from events.models import TeamEvent
+from event_registrations.exports import SOLO_COLUMNS, TEAM_COLUMNS, export_rows, registration_row, select_columns
+from event_registrations.management.synthetic import rolled_back, timed, create_event, create_profiles
+from event_registrations.management.synthetic import create_solo_registrations, create_team_registrations
+
+
+def measure(rows):
+    """
+        Consumes the rows, returns (row count, queries, peak traced memory in KiB)
+    """
+
+    queries = 0
+
+    def count_query(execute, sql, params, many, context):
+        nonlocal queries
+        queries += 1
+        return execute(sql, params, many, context)
+
+    tracemalloc.start()
+    with connection.execute_wrapper(count_query):
+        count = sum(1 for _ in rows())
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return count, queries, peak / 1024
+
+
+class Command(BaseCommand):
+    help = 'Measures queries, time and peak memory of the participant CSV export against building the rows ' \
+           'without eager loading, on synthetic data that is rolled back afterwards'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000, help='Registrations of each event')
+        parser.add_argument('--users', type=int, default=5000, help='Number of synthetic users')
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per export, the median is reported')
+
+    def handle(self, *args, **options):
+        with rolled_back():
+            self.stdout.write('Creating {0} solo and {0} team registrations...'.format(options['rows']))
+            profile_ids = create_profiles(options['users'])
+            solo_event = create_event()
+            create_solo_registrations(solo_event, profile_ids, options['rows'])
+            team_event = create_event(model=TeamEvent, max_team_size=4, min_team_size=1)
+            create_team_registrations(team_event, profile_ids, options['rows'])
+
+            emails = select_columns(SOLO_COLUMNS, ['email'])
+            exports = [
+                ('solo event', lambda: export_rows(solo_event, SOLO_COLUMNS),
+                 lambda: (registration_row(SOLO_COLUMNS, i) for i in solo_event.soloeventregistration_set.all())),
+                ('team event', lambda: export_rows(team_event, TEAM_COLUMNS),
+                 lambda: (registration_row(TEAM_COLUMNS, i) for i in team_event.teameventregistration_set.all())),
+                ('solo event, email only', lambda: export_rows(solo_event, emails),
+                 lambda: (registration_row(emails, i) for i in solo_event.soloeventregistration_set.all())),
+            ]
+            for label, export, naive in exports:
+                self.stdout.write(self.style.MIGRATE_HEADING(label))
+                milliseconds = {}
+                for name, rows in (('export', export), ('no eager loading', naive)):
+                    count, queries, peak = measure(rows)
+                    milliseconds[name] = timed(lambda: sum(1 for _ in rows()), repeat=options['repeat'])
+                    self.stdout.write('  {0}: {1} rows, {2} queries, {3:.2f} ms, {4:.0f} KiB peak'.format(
+                        name, count, queries, milliseconds[name], peak))
+                self.stdout.write(self.style.SUCCESS('  {0:.1f}x faster'.format(
+                    milliseconds['no eager loading'] / max(milliseconds['export'], 0.001))))
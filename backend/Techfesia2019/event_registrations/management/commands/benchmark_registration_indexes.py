@@ -0,0 +1,71 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+from event_registrations.models import SoloEventRegistration
+from event_registrations.management.synthetic import rolled_back, timed, create_event, create_profiles
+from event_registrations.management.synthetic import create_solo_registrations
+
+
+def hot_queries(event):
+    """
+        The registration queries run on every allocation, as (label, queryset) pairs
+    """
+
+    registrations = event.soloeventregistration_set
+    waiting = registrations.filter(is_complete=True, is_confirmed=False)
+    middle = waiting.order_by('created_on', 'pk')[waiting.count() // 2]
+    return [
+        ('confirmed participants', registrations.filter(is_confirmed=True).values('pk')),
+        ('reserved confirmed participants', registrations.filter(is_confirmed=True, is_reserved=True).values('pk')),
+        ('waiting list in order', waiting.order_by('created_on', 'pk').values_list('pk', 'is_reserved')),
+        ('reserved waiting list in order', waiting.filter(is_reserved=True).order_by('created_on').values('pk')),
+        ('waitlist position', waiting.filter(is_reserved=middle.is_reserved, created_on__lt=middle.created_on)
+         .values('pk')),
+    ]
+
+
+class Command(BaseCommand):
+    help = 'Compares query plans and latency of the registration hot queries with and without the composite ' \
+           'indexes, on synthetic data that is rolled back afterwards'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000000, help='Number of synthetic registrations')
+        parser.add_argument('--events', type=int, default=10, help='Number of events the rows are spread over')
+        parser.add_argument('--users', type=int, default=5000, help='Number of synthetic users')
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per query, the median is reported')
+
+    def handle(self, *args, **options):
+        indexes = SoloEventRegistration._meta.indexes
+        with rolled_back():
+            self.stdout.write('Creating {0} registrations...'.format(options['rows']))
+            profile_ids = create_profiles(options['users'])
+            events = [create_event() for _ in range(options['events'])]
+            for event in events:
+                create_solo_registrations(event, profile_ids, options['rows'] // len(events))
+            table = SoloEventRegistration._meta.db_table
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE {0}'.format(connection.ops.quote_name(table)))
+
+            queries = hot_queries(events[0])
+            editor = connection.schema_editor()
+            results = {}
+            for phase in ('without', 'with'):
+                for index in indexes:
+                    if phase == 'without':
+                        editor.execute(index.remove_sql(SoloEventRegistration, editor))
+                    else:
+                        editor.execute(index.create_sql(SoloEventRegistration, editor))
+                for label, queryset in queries:
+                    results.setdefault(label, {})[phase] = (
+                        queryset.explain(),
+                        timed(lambda: len(queryset.all()), repeat=options['repeat']),
+                    )
+
+        for label, phases in results.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(label))
+            for phase in ('without', 'with'):
+                plan, milliseconds = phases[phase]
+                self.stdout.write('  {0} indexes: {1:.2f} ms'.format(phase, milliseconds))
+                for line in plan.splitlines():
+                    self.stdout.write('    ' + line)
+            speedup = phases['without'][1] / max(phases['with'][1], 0.001)
+            self.stdout.write(self.style.SUCCESS('  {0:.1f}x faster'.format(speedup)))
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand, CommandError
+from events.models import TeamEvent
+from event_registrations.serializers import SoloEventRegistrationsSerializer, TeamEventRegistrationsSerializer
+from event_registrations.serializers import solo_registrations_data, team_registrations_data
+from event_registrations.management.synthetic import rolled_back, timed, create_event, create_profiles
+from event_registrations.management.synthetic import create_solo_registrations, create_team_registrations
+
+
+class Command(BaseCommand):
+    help = 'Compares the staff registration listing built with the nested serializers against the values() ' \
+           'fast path, on synthetic data that is rolled back afterwards'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=5000, help='Registrations of each event')
+        parser.add_argument('--users', type=int, default=5000, help='Number of synthetic users')
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per path, the median is reported')
+
+    def handle(self, *args, **options):
+        with rolled_back():
+            self.stdout.write('Creating {0} solo and {0} team registrations...'.format(options['rows']))
+            profile_ids = create_profiles(options['users'])
+            solo_event = create_event()
+            create_solo_registrations(solo_event, profile_ids, options['rows'])
+            team_event = create_event(model=TeamEvent, max_team_size=4, min_team_size=1)
+            create_team_registrations(team_event, profile_ids, options['rows'])
+
+            paths = [
+                ('solo event', solo_event, SoloEventRegistrationsSerializer, solo_registrations_data),
+                ('team event', team_event, TeamEventRegistrationsSerializer, team_registrations_data),
+            ]
+            for label, event, serializer_class, fast_path in paths:
+                queryset = serializer_class.setup_eager_loading(event.__class__.objects.filter(pk=event.pk))
+
+                def serialized():
+                    return serializer_class(queryset.get()).data
+
+                if serialized() != fast_path(event):
+                    raise CommandError('The {0} payloads differ'.format(label))
+                serializer_ms = timed(serialized, repeat=options['repeat'])
+                fast_path_ms = timed(lambda: fast_path(event), repeat=options['repeat'])
+                self.stdout.write(self.style.MIGRATE_HEADING(label))
+                self.stdout.write('  serializer: {0:.2f} ms'.format(serializer_ms))
+                self.stdout.write('  values():   {0:.2f} ms'.format(fast_path_ms))
+                self.stdout.write(self.style.SUCCESS('  {0:.1f}x faster'.format(
+                    serializer_ms / max(fast_path_ms, 0.001))))
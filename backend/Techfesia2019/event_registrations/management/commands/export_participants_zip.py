@@ -0,0 +1,37 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+from event_registrations.exports import events_for_export, zip_chunks
+
+
+def date_argument(value):
+    date = parse_date(value)
+    if date is None:
+        raise ValueError(value)
+    return date
+
+
+class Command(BaseCommand):
+    help = 'Writes a ZIP archive with the participant CSV of every event, optionally limited by category and ' \
+           'start date'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help='Path of the ZIP file to write')
+        parser.add_argument('--category', dest='categories', type=int, action='append', default=[],
+                            help='Only events in this category, can be repeated')
+        parser.add_argument('--from', dest='start_date', type=date_argument, help='Only events starting on or '
+                                                                                  'after this date (YYYY-MM-DD)')
+        parser.add_argument('--to', dest='end_date', type=date_argument, help='Only events starting on or before '
+                                                                              'this date (YYYY-MM-DD)')
+        parser.add_argument('--workers', type=int, default=settings.EXPORT_WORKERS,
+                            help='Threads encoding event CSVs in parallel')
+
+    def handle(self, *args, **options):
+        events = events_for_export(options['categories'], options['start_date'], options['end_date'])
+        if not events:
+            raise CommandError('No events match')
+        with open(options['output'], 'wb') as output:
+            for chunk in zip_chunks(events, options['workers']):
+                output.write(chunk)
+        self.stdout.write(self.style.SUCCESS('Wrote the participants of {0} event(s) to {1}'.format(
+            len(events), options['output'])))
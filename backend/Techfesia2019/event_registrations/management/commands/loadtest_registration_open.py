@@ -0,0 +1,239 @@
+import os
+import random
+import re
+import statistics
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import redirect_stdout
+import requests
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler, get_internal_wsgi_application
+from django.db.models import Count
+from django.test.utils import override_settings
+from rest_framework_simplejwt.tokens import AccessToken
+from events.models import Event
+from events.management.commands.rebuild_seat_counters import count_registrations
+from events.utils import SEAT_COUNTER_FIELDS
+from event_registrations.models import SoloEventRegistration
+from event_registrations.management.synthetic import create_event, create_profiles
+from payments.fake_gateway import FakePaytmGateway
+from payments.models import Transaction
+from registration.models import User
+
+ORDER_PATTERN = re.compile(r'name="ORDER_ID" value="([^"]*)"')
+AMOUNT_PATTERN = re.compile(r'name="TXN_AMOUNT" value="([^"]*)"')
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def percentile(timings, fraction):
+    timings = sorted(timings)
+    return timings[min(len(timings) - 1, int(round(fraction * (len(timings) - 1))))]
+
+
+class LoadTest:
+    """
+        Runs one user journey per user: register for an event, initiate the payment and post the gateway callback
+    """
+
+    def __init__(self, base_url, gateway, pay_ratio, failure_ratio, seed=None):
+        self.base_url = base_url.rstrip('/')
+        self.gateway = gateway
+        self.pay_ratio = pay_ratio
+        self.failure_ratio = failure_ratio
+        self.random = random.Random(seed)
+        self.results = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+        self._local = threading.local()
+
+    @property
+    def session(self):
+        if not hasattr(self._local, 'session'):
+            self._local.session = requests.Session()
+        return self._local.session
+
+    def request(self, step, method, path, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = self.session.request(method, self.base_url + path, timeout=60, **kwargs)
+            status_code = response.status_code
+        except requests.RequestException as error:
+            response = None
+            status_code = error.__class__.__name__
+        self.results[step].append((time.perf_counter() - started, response is not None and response.ok))
+        self.statuses[step][status_code] += 1
+        return response
+
+    def journey(self, token, event_public_id, pays, successful):
+        headers = {'Authorization': 'Bearer {0}'.format(token)}
+        response = self.request('register', 'POST', '/events/{0}/registrations/'.format(event_public_id),
+                                json={}, headers=headers)
+        if response is None or response.status_code != 201 or not pays:
+            return
+        response = self.request('initiate', 'POST', '/payment/initiate', headers=headers,
+                                json={'eventPublicId': event_public_id,
+                                      'registrationId': response.json()['registrationId']})
+        if response is None or response.status_code != 201:
+            return
+        order_id = ORDER_PATTERN.search(response.text).group(1)
+        amount = AMOUNT_PATTERN.search(response.text).group(1)
+        self.request('callback', 'POST', '/payment/callback/', data=self.gateway.pay(order_id, amount, successful))
+
+    def run(self, journeys, concurrency):
+        """
+            Runs all journeys, returns a Counter of the exceptions that ended journeys early
+        """
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futures = []
+            for token, event_public_id in journeys:
+                pays = self.random.random() < self.pay_ratio
+                successful = self.random.random() >= self.failure_ratio
+                futures.append(executor.submit(self.journey, token, event_public_id, pays, successful))
+        return Counter(repr(i.exception()) for i in futures if i.exception() is not None)
+
+
+def check_invariants(events):
+    """
+        Returns a list of seat allocation invariant violations, empty when everything is consistent
+    """
+
+    violations = []
+    counts = count_registrations(SoloEventRegistration.objects.filter(event__in=events))
+    for event in Event.objects.filter(pk__in=[i.pk for i in events]):
+        expected = counts.get(event.pk, dict.fromkeys(SEAT_COUNTER_FIELDS, 0))
+        stored = {field: getattr(event, field) for field in SEAT_COUNTER_FIELDS}
+        if stored != expected:
+            violations.append('{0}: stored counters {1} but registrations give {2}'.format(
+                event.public_id, stored, expected))
+        if expected['confirmed_count'] > event.max_participants:
+            violations.append('{0}: {1} confirmed for {2} seats'.format(
+                event.public_id, expected['confirmed_count'], event.max_participants))
+        general_confirmed = expected['confirmed_count'] - expected['reserved_confirmed_count']
+        if general_confirmed > event.max_participants - event.reserved_slots:
+            violations.append('{0}: {1} general registrations took reserved seats'.format(
+                event.public_id, general_confirmed - event.max_participants + event.reserved_slots))
+        event.load_seat_counters()
+        waiting = SoloEventRegistration.objects.filter(event=event, is_complete=True, is_confirmed=False)
+        for is_reserved in (True, False):
+            if waiting.filter(is_reserved=is_reserved).exists() and event.has_free_seat(is_reserved):
+                violations.append('{0}: {1} registrations wait while a seat is free'.format(
+                    event.public_id, is_reserved and 'reserved' or 'general'))
+
+    registrations = SoloEventRegistration.objects.filter(event__in=events)
+    duplicates = registrations.values('event', 'profile').annotate(count=Count('pk')).filter(count__gt=1).count()
+    if duplicates:
+        violations.append('{0} people are registered twice for the same event'.format(duplicates))
+    paid = Transaction.objects.filter(solo_registration__event__in=events, status='Successful')
+    unpaid_complete = registrations.filter(is_complete=True).exclude(payments__in=paid).count()
+    if unpaid_complete:
+        violations.append('{0} complete registrations have no successful payment'.format(unpaid_complete))
+    paid_incomplete = paid.filter(solo_registration__is_complete=False).count()
+    if paid_incomplete:
+        violations.append('{0} successful payments left their registration incomplete'.format(paid_incomplete))
+    return violations
+
+
+class Command(BaseCommand):
+    help = 'Seeds users and events, fires concurrent registrations, payments and gateway callbacks at a local ' \
+           'server with a fake Paytm gateway, then reports latency, errors and seat invariants'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=2000)
+        parser.add_argument('--events', type=int, default=5)
+        parser.add_argument('--seats', type=int, default=100, help='max_participants of every event')
+        parser.add_argument('--reserved-seats', type=int, default=20, help='reserved_slots of every event')
+        parser.add_argument('--concurrency', type=int, default=50, help='Number of simultaneous clients')
+        parser.add_argument('--pay-ratio', type=float, default=0.9, help='Share of registrations that are paid')
+        parser.add_argument('--failure-ratio', type=float, default=0.05, help='Share of payments that fail')
+        parser.add_argument('--gateway-latency', type=float, default=0, help='Seconds the gateway takes to answer')
+        parser.add_argument('--url', help='Base url of an already running server, by default one is started '
+                                          'in this process. It must use this database and the fake gateway, '
+                                          'so --gateway-port is required with it.')
+        parser.add_argument('--gateway-port', type=int, default=0,
+                            help='Port of the fake gateway, the server has to be started with PAYTM_STATUS_URL = '
+                                 'http://127.0.0.1:<port>/order/status')
+        parser.add_argument('--seed', type=int)
+        parser.add_argument('--keep', action='store_true', help='Do not delete the seeded users and events')
+
+    def handle(self, *args, **options):
+        if options['reserved_seats'] > options['seats']:
+            raise CommandError('--reserved-seats can not be more than --seats')
+        if options['url'] and not options['gateway_port']:
+            raise CommandError('--gateway-port is required with --url, start the server with PAYTM_STATUS_URL '
+                               'pointing at the fake gateway on that port')
+        prefix = 'loadtest{0}-'.format(random.getrandbits(32))
+        self.stdout.write('Seeding {0} users and {1} events...'.format(options['users'], options['events']))
+        create_profiles(options['users'], prefix=prefix)
+        users = list(User.objects.filter(username__startswith=prefix).order_by('pk'))
+        events = [create_event(max_participants=options['seats'], reserved_slots=options['reserved_seats'],
+                               fee=100, reserved_fee=80)
+                  for _ in range(options['events'])]
+        journeys = [(str(AccessToken.for_user(user)), events[i % len(events)].public_id)
+                    for i, user in enumerate(users)]
+
+        gateway = FakePaytmGateway(port=options['gateway_port'], latency=options['gateway_latency']).start()
+        server = None
+        try:
+            if options['url']:
+                base_url = options['url']
+                self.stdout.write('The server must use PAYTM_STATUS_URL = {0!r}'.format(gateway.url))
+            else:
+                server = ThreadedWSGIServer(('127.0.0.1', 0), QuietRequestHandler)
+                server.set_app(get_internal_wsgi_application())
+                threading.Thread(target=server.serve_forever, daemon=True).start()
+                base_url = 'http://127.0.0.1:{0}'.format(server.server_address[1])
+
+            load_test = LoadTest(base_url, gateway, options['pay_ratio'], options['failure_ratio'], options['seed'])
+            self.stdout.write('Running {0} journeys against {1} with {2} clients...'.format(
+                len(journeys), base_url, options['concurrency']))
+            started = time.perf_counter()
+            # The payment views print every request, keep them out of the report
+            with override_settings(PAYTM_STATUS_URL=gateway.url), open(os.devnull, 'w') as devnull, \
+                    redirect_stdout(devnull):
+                exceptions = load_test.run(journeys, options['concurrency'])
+            elapsed = time.perf_counter() - started
+        finally:
+            if server is not None:
+                server.shutdown()
+                server.server_close()
+            gateway.stop()
+
+        self.report(load_test, elapsed)
+        self.stdout.write('The fake gateway answered {0} status check(s)'.format(gateway.requests))
+        for exception, count in exceptions.items():
+            self.stdout.write(self.style.WARNING('{0} journey(s) failed with {1}'.format(count, exception)))
+        violations = check_invariants(events)
+        if not options['keep']:
+            # Registrations protect their event, they go with the users' profiles first
+            User.objects.filter(username__startswith=prefix).delete()
+            Event.objects.filter(pk__in=[i.pk for i in events]).delete()
+        if violations:
+            for violation in violations:
+                self.stdout.write(self.style.ERROR(violation))
+            raise CommandError('{0} seat invariant(s) violated'.format(len(violations)))
+        self.stdout.write(self.style.SUCCESS('All seat invariants hold'))
+
+    def report(self, load_test, elapsed):
+        requests_made = sum(len(i) for i in load_test.results.values())
+        self.stdout.write('{0} requests in {1:.1f} s ({2:.0f} req/s)'.format(
+            requests_made, elapsed, requests_made / max(elapsed, 0.001)))
+        self.stdout.write('{0:<10} {1:>7} {2:>8} {3:>9} {4:>9} {5:>9}'.format(
+            'step', 'count', 'errors', 'p50 ms', 'p95 ms', 'p99 ms'))
+        for step in ('register', 'initiate', 'callback'):
+            results = load_test.results[step]
+            if not results:
+                continue
+            timings = [seconds * 1000 for seconds, _ in results]
+            errors = sum(1 for _, ok in results if not ok)
+            self.stdout.write('{0:<10} {1:>7} {2:>7.1f}% {3:>9.1f} {4:>9.1f} {5:>9.1f}'.format(
+                step, len(results), 100 * errors / len(results), statistics.median(timings),
+                percentile(timings, 0.95), percentile(timings, 0.99)))
+            statuses = sorted(load_test.statuses[step].items(), key=lambda item: str(item[0]))
+            self.stdout.write('           status codes: {0}'.format(', '.join(
+                '{0}: {1}'.format(code, count) for code, count in statuses)))
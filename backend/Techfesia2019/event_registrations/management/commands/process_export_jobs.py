@@ -0,0 +1,28 @@
+import time
+from django.core.management.base import BaseCommand
+from event_registrations.exports import run_next_export_job
+
+
+class Command(BaseCommand):
+    help = 'Runs queued participant export jobs, writing their CSVs to MEDIA_ROOT'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep polling the queue instead of exiting when empty')
+        parser.add_argument('--interval', type=float, default=2,
+                            help='Seconds to wait between polls of an empty queue (with --loop)')
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            job = run_next_export_job()
+            if job is not None:
+                total += 1
+                if job.status == 'done':
+                    self.stdout.write('Exported {0} participant(s) of {1}'.format(job.rows_written, job.event_id))
+                else:
+                    self.stderr.write('Export {0} failed: {1}'.format(job.public_id, job.message))
+            elif options['loop']:
+                time.sleep(options['interval'])
+            else:
+                break
+        self.stdout.write(self.style.SUCCESS('Processed {0} export job(s)'.format(total)))
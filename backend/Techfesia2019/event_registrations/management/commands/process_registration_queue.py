@@ -0,0 +1,26 @@
+import time
+from django.core.management.base import BaseCommand
+from event_registrations.admission import admit_queued_tickets
+
+
+class Command(BaseCommand):
+    help = 'Admits queued registration tickets in batches, one allocation run per batch'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Maximum tickets committed per batch')
+        parser.add_argument('--loop', action='store_true', help='Keep polling the queue instead of exiting when empty')
+        parser.add_argument('--interval', type=float, default=0.5,
+                            help='Seconds to wait between polls of an empty queue (with --loop)')
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            processed = admit_queued_tickets(batch_size=options['batch_size'])
+            total += processed
+            if processed:
+                self.stdout.write('Admitted a batch of {0} ticket(s)'.format(processed))
+            elif options['loop']:
+                time.sleep(options['interval'])
+            else:
+                break
+        self.stdout.write(self.style.SUCCESS('Processed {0} ticket(s)'.format(total)))
@@ -0,0 +1,109 @@
+"""
+    Helpers for the benchmark commands: synthetic data that is thrown away afterwards, and timing.
+"""
+import datetime as dt
+import random
+import statistics
+import time
+from contextlib import contextmanager
+from django.db import transaction
+from registration.models import User
+from accounts.models import HOME_INSTITUTE, Institute, Profile
+from base.utils import generate_public_ids
+from events.models import SoloEvent, TeamEvent
+from event_registrations.models import SoloEventRegistration, Team, TeamEventRegistration
+
+BATCH_SIZE = 10000
+
+
+class Rollback(Exception):
+    pass
+
+
+@contextmanager
+def rolled_back():
+    """
+        Runs the block in a transaction that is always rolled back, so benchmarks leave no data behind
+    """
+
+    try:
+        with transaction.atomic():
+            yield
+            raise Rollback()
+    except Rollback:
+        pass
+
+
+def timed(func, repeat=5):
+    """
+        Returns the median wall time of `repeat` calls of func, in milliseconds
+    """
+
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def create_event(model=SoloEvent, **kwargs):
+    title = 'benchmark-{0}'.format(random.getrandbits(48))
+    return model.objects.create(title=title, team_event=model is TeamEvent, start_date=dt.date(2019, 8, 3),
+                                end_date=dt.date(2019, 8, 4), start_time=dt.time(12, 0, 0),
+                                end_time=dt.time(15, 0, 0), **kwargs)
+
+
+def create_profiles(count, prefix='benchmark'):
+    """
+        Bulk creates `count` users with profiles, half of them from the reserved institute
+    """
+
+    institute, _ = Institute.objects.get_or_create(name=HOME_INSTITUTE)
+    for start in range(0, count, BATCH_SIZE):
+        User.objects.bulk_create([
+            User(username='{0}{1}'.format(prefix, i), first_name='bench', last_name=str(i),
+                 email='{0}{1}@example.com'.format(prefix, i))
+            for i in range(start, min(count, start + BATCH_SIZE))
+        ])
+    users = User.objects.filter(username__startswith=prefix).exclude(profile__isnull=False)
+    Profile.objects.bulk_create([Profile(user_id=pk, phone_number='+910000000000',
+                                         college=institute if pk % 2 else None)
+                                 for pk in users.values_list('pk', flat=True)])
+    return list(Profile.objects.filter(user__username__startswith=prefix).values_list('pk', flat=True))
+
+
+def registration_flags(i):
+    # 80% paid, a fifth confirmed, a third reserved
+    is_complete = i % 5 != 0
+    return {'is_complete': is_complete, 'is_confirmed': is_complete and i % 5 == 1, 'is_reserved': i % 3 == 0}
+
+
+def create_solo_registrations(event, profile_ids, rows):
+    prefix = 'b{0}-'.format(event.pk)
+    for start in range(0, rows, BATCH_SIZE):
+        SoloEventRegistration.objects.bulk_create([
+            SoloEventRegistration(public_id=prefix + str(i), event=event, profile_id=profile_ids[i % len(profile_ids)],
+                                  **registration_flags(i))
+            for i in range(start, min(rows, start + BATCH_SIZE))
+        ])
+
+
+def create_team_registrations(event, profile_ids, rows):
+    """
+        Bulk creates `rows` teams led by the given profiles, each registered for the team event
+    """
+
+    prefix = 'b{0}-'.format(event.pk)
+    for start in range(0, rows, BATCH_SIZE):
+        stop = min(rows, start + BATCH_SIZE)
+        public_ids = generate_public_ids(Team, stop - start)
+        Team.objects.bulk_create([
+            Team(public_id=public_id, name=prefix + str(i), team_leader_id=profile_ids[i % len(profile_ids)])
+            for i, public_id in zip(range(start, stop), public_ids)
+        ])
+        teams = Team.objects.filter(public_id__in=public_ids).order_by('pk').values_list('pk', flat=True)
+        TeamEventRegistration.objects.bulk_create([
+            TeamEventRegistration(public_id=prefix + str(i), event=event, team_id=team_id, **registration_flags(i))
+            for i, team_id in zip(range(start, stop), teams)
+        ])
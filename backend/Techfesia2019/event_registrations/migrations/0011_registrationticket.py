@@ -0,0 +1,31 @@
+# Generated by Django 2.2.2 on 2026-10-18 19:01
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_auto_20190701_1708'),
+        ('events', '0006_event_seat_counters'),
+        ('event_registrations', '0010_remove_teammember_invitation_rejected'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RegistrationTicket',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('public_id', models.CharField(blank=True, db_index=True, max_length=100, unique=True)),
+                ('status', models.CharField(choices=[('queued', 'queued'), ('registered', 'registered'), ('rejected', 'rejected')], db_index=True, default='queued', max_length=10)),
+                ('message', models.CharField(blank=True, max_length=200)),
+                ('registration_public_id', models.CharField(blank=True, max_length=100)),
+                ('created_on', models.DateTimeField(auto_now_add=True)),
+                ('processed_on', models.DateTimeField(blank=True, null=True)),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='registration_tickets', to='events.Event')),
+                ('profile', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='registration_tickets', to='accounts.Profile')),
+                ('team', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='event_registrations.Team')),
+            ],
+        ),
+    ]
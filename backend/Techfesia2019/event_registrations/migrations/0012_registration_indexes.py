@@ -0,0 +1,29 @@
+# Generated by Django 2.2.2 on 2026-10-18 19:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('event_registrations', '0011_registrationticket'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='soloeventregistration',
+            index=models.Index(fields=['event', 'is_complete', 'is_confirmed', 'is_reserved', 'created_on'], name='solo_registration_queue_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='soloeventregistration',
+            index=models.Index(fields=['event', 'is_confirmed', 'is_reserved'], name='solo_registration_seats_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='teameventregistration',
+            index=models.Index(fields=['event', 'is_complete', 'is_confirmed', 'is_reserved', 'created_on'], name='team_registration_queue_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='teameventregistration',
+            index=models.Index(fields=['event', 'is_confirmed', 'is_reserved'], name='team_registration_seats_idx'),
+        ),
+    ]
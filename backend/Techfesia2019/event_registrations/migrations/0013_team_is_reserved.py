@@ -0,0 +1,36 @@
+# Generated by Django 2.2.2 on 2026-10-18 19:11
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+HOME_INSTITUTE = 'Indian Institute of Information Technology, Sri City'
+
+
+def mark_reserved_teams(apps, schema_editor):
+    Institute = apps.get_model('accounts', 'Institute')
+    Team = apps.get_model('event_registrations', 'Team')
+    home_id = Institute.objects.filter(name=HOME_INSTITUTE).values_list('pk', flat=True).first()
+    if home_id is None:
+        return
+    reserved = Team.objects.filter(team_leader__college=home_id).annotate(
+        member_total=Count('teammember_set'),
+        home_members=Count('teammember_set', filter=Q(teammember_set__profile__college=home_id)),
+    ).values_list('pk', 'member_total', 'home_members')
+    Team.objects.filter(pk__in=[pk for pk, total, home in reserved if total == home]).update(is_reserved=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_auto_20190701_1708'),
+        ('event_registrations', '0012_registration_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='team',
+            name='is_reserved',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.RunPython(mark_reserved_teams, migrations.RunPython.noop),
+    ]
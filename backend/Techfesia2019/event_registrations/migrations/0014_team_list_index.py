@@ -0,0 +1,17 @@
+# Generated by Django 2.2.2 on 2026-10-18 19:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('event_registrations', '0013_team_is_reserved'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='team',
+            index=models.Index(fields=['create_date', 'id'], name='team_list_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 2.2.2 on 2026-10-18 19:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('event_registrations', '0014_team_list_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='soloeventregistration',
+            index=models.Index(fields=['event', 'updated_on'], name='solo_registration_version_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='teameventregistration',
+            index=models.Index(fields=['event', 'updated_on'], name='team_registration_version_idx'),
+        ),
+    ]
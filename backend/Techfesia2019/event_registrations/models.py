@@ -1,12 +1,63 @@
+from django.conf import settings
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
-from django.db import models
+from django.db import models, transaction
+from django.db.models import signals, Count, Exists, Max, OuterRef, Prefetch, Q, Subquery
+from django.dispatch import receiver
 
 # Create your models here.
-from accounts.models import Profile
+from accounts.models import HOME_INSTITUTE, Institute, Profile, ProfileOrganizer, ProfileVolunteer
 from base.utils import generate_public_id
 from django.utils.translation import gettext_lazy as _
 
-from events.models import SoloEvent, TeamEvent
+from events.models import Event, SoloEvent, TeamEvent
+from events.utils import seat_counters
+
+
+class TeamQuerySet(models.QuerySet):
+    def with_member_count(self):
+        """
+            Annotates the number of accepted members, used by Team.member_count
+        """
+
+        return self.annotate(accepted_member_count=Count('teammember_set',
+                                                         filter=Q(teammember_set__invitation_accepted=True)))
+
+    def with_roster(self):
+        """
+            Loads leaders, members, invitees and the teams' registrations along with the teams,
+            so the roster properties of Team do not query again
+        """
+
+        return self.select_related('team_leader__user').prefetch_related(
+            Prefetch('teammember_set', queryset=TeamMember.objects.select_related('profile__user').order_by('pk')),
+            Prefetch('events', queryset=TeamEventRegistration.objects.select_related('event')),
+        )
+
+    def refresh_reserved(self):
+        """
+            Recomputes the stored is_reserved flag of the teams from one aggregate query, and returns
+            {team pk: is_reserved}. A team is reserved when its leader and every member, invitees included,
+            are from the home institute.
+        """
+
+        home = Institute.objects.filter(name=HOME_INSTITUTE).values('pk')[:1]
+        rows = self.order_by().annotate(
+            home_id=Subquery(home),
+            member_total=Count('teammember_set'),
+            home_members=Count('teammember_set', filter=Q(teammember_set__profile__college=Subquery(home))),
+        ).values_list('pk', 'is_reserved', 'team_leader__college', 'home_id', 'member_total', 'home_members')
+
+        flags = {}
+        changed = {True: [], False: []}
+        for pk, stored, leader_college, home_id, member_total, home_members in rows:
+            flags[pk] = home_id is not None and leader_college == home_id and home_members == member_total
+            if flags[pk] != stored:
+                changed[flags[pk]].append(pk)
+        for is_reserved, pks in changed.items():
+            if pks:
+                self.model.objects.filter(pk__in=pks).update(is_reserved=is_reserved)
+        return flags
 
 
 class Team(models.Model):
@@ -26,12 +77,30 @@ class Team(models.Model):
 
     create_date = models.DateTimeField(auto_now_add=True)
 
+    # Kept current by the receivers at the end of this module, see TeamQuerySet.refresh_reserved
+    is_reserved = models.BooleanField(default=False, editable=False)
+
+    objects = TeamQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Keyset pagination of the team list
+            models.Index(fields=['create_date', 'id'], name='team_list_idx'),
+        ]
+
+    def prefetched_roster(self):
+        """
+            Returns the TeamMembers loaded by TeamQuerySet.with_roster, None when they were not prefetched
+        """
+
+        return getattr(self, '_prefetched_objects_cache', {}).get('teammember_set')
+
     @property
     def team_members(self):
-        name_list = []
-        for i in self.teammember_set.all():
-            name_list.append(i.profile.user.first_name + ' ' + i.profile.user.last_name)
-        return ','.join(name_list)
+        roster = self.prefetched_roster()
+        if roster is None:
+            roster = self.teammember_set.select_related('profile__user').order_by('pk')
+        return ','.join(i.profile.user.first_name + ' ' + i.profile.user.last_name for i in roster)
 
     @property
     def leader(self):
@@ -39,33 +108,31 @@ class Team(models.Model):
 
     @property
     def members(self):
+        roster = self.prefetched_roster()
+        if roster is not None:
+            return [i for i in roster if i.invitation_accepted]
         return self.teammember_set.filter(invitation_accepted=True)
 
     @property
     def invitees(self):
+        roster = self.prefetched_roster()
+        if roster is not None:
+            return [i for i in roster if not i.invitation_accepted]
         return self.teammember_set.filter(invitation_accepted=False)
 
     @property
     def member_count(self):
+        roster = self.prefetched_roster()
+        if roster is not None:
+            return 1 + len(self.members)
+        if hasattr(self, 'accepted_member_count'):
+            return 1 + self.accepted_member_count
         return 1 + self.teammember_set.filter(invitation_accepted=True).count()
 
-    @property
-    def is_reserved(self):
-        try:
-            if self.team_leader.college.name == 'Indian Institute of Information Technology, Sri City':
-                for i in self.teammember_set.all():
-                    try:
-                        if i.profile.college.name != 'Indian Institute of Information Technology, Sri City':
-                            return False
-                    except:
-                        return False
-                return True
-        except:
-            return False
-        return False
-
     def ready(self):
-        return self.invitees.count() == 0
+        if self.prefetched_roster() is not None:
+            return not self.invitees
+        return not self.invitees.exists()
 
     def save(self, *args, **kwargs):
         if not self.public_id:
@@ -105,7 +172,93 @@ class TeamMember(models.Model):
             return "pending"
 
 
-class SoloEventRegistration(models.Model):
+def staff_conflicts(event_id, profiles):
+    """
+        Returns (is_organizer, is_volunteer) for the ProfileOrganizer/ProfileVolunteer `profiles` Q, in one query
+        with an EXISTS per table
+    """
+
+    return Event.objects.filter(pk=event_id).annotate(
+        is_organizer=Exists(ProfileOrganizer.objects.filter(profiles, events=OuterRef('pk'))),
+        is_volunteer=Exists(ProfileVolunteer.objects.filter(profiles, events=OuterRef('pk'))),
+    ).values_list('is_organizer', 'is_volunteer').get()
+
+
+def registration_status(is_complete, is_confirmed):
+    if is_complete:
+        if is_confirmed:
+            return 'confirmed'
+        else:
+            return 'waiting'
+    else:
+        return 'payment pending'
+
+
+def registrations_version(registrations):
+    """
+        Returns (count, last update) of a registration queryset in one aggregate query, which changes whenever a
+        registration is added, updated or removed
+    """
+
+    version = registrations.aggregate(count=Count('pk'), last_modified=Max('updated_on'))
+    return version['count'], version['last_modified']
+
+
+class SeatCounterMixin:
+    """
+        Keeps the seat counters on the registration's event in step with the registration's state
+    """
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if {'is_complete', 'is_confirmed', 'is_reserved'}.issubset(field_names):
+            instance._saved_seat_counters = instance.seat_counters
+        return instance
+
+    @property
+    def seat_counters(self):
+        return seat_counters(self.is_complete, self.is_confirmed, self.is_reserved)
+
+    def saved_seat_counters(self):
+        if self._state.adding:
+            return ()
+        if not hasattr(self, '_saved_seat_counters'):
+            saved = self.__class__.objects.filter(pk=self.pk).values_list('is_complete', 'is_confirmed', 'is_reserved')
+            self._saved_seat_counters = seat_counters(*saved[0]) if saved else ()
+        return self._saved_seat_counters
+
+    @property
+    def pool(self):
+        return 'reserved' if self.is_reserved else 'general'
+
+    def waitlist_position(self):
+        """
+            1-based rank among the waiting registrations of the same pool, None if not waiting.
+            Answered with a range count over the registration index and cached for a few seconds,
+            so clients polling their position do not load the queue.
+        """
+        if not self.is_complete or self.is_confirmed:
+            return None
+        key = 'waitlist-position:{0}:{1}:{2}'.format(self._meta.label_lower, self.pk, self.created_on.timestamp())
+        position = cache.get(key)
+        if position is None:
+            ahead = self.__class__.objects.filter(event_id=self.event_id, is_complete=True, is_confirmed=False,
+                                                  is_reserved=self.is_reserved) \
+                .filter(Q(created_on__lt=self.created_on) | Q(created_on=self.created_on, pk__lt=self.pk))
+            position = ahead.count() + 1
+            cache.set(key, position, settings.WAITLIST_POSITION_CACHE_TIMEOUT)
+        return position
+
+    def save_tracking_seats(self, save, *args, **kwargs):
+        with transaction.atomic():
+            old_counters = self.saved_seat_counters()
+            save(*args, **kwargs)
+            Event.shift_seat_counters(self.event_id, old_counters, self.seat_counters)
+            self._saved_seat_counters = self.seat_counters
+
+
+class SoloEventRegistration(SeatCounterMixin, models.Model):
     public_id = models.CharField(max_length=100,
                                  unique=True,
                                  blank=True,
@@ -129,15 +282,20 @@ class SoloEventRegistration(models.Model):
 
     updated_on = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Waiting list in registration order, waitlist positions
+            models.Index(fields=['event', 'is_complete', 'is_confirmed', 'is_reserved', 'created_on'],
+                         name='solo_registration_queue_idx'),
+            # Confirmed seat counts
+            models.Index(fields=['event', 'is_confirmed', 'is_reserved'], name='solo_registration_seats_idx'),
+            # Conditional GET of the registration list, see registrations_version
+            models.Index(fields=['event', 'updated_on'], name='solo_registration_version_idx'),
+        ]
+
     @property
     def status(self):
-        if self.is_complete:
-            if self.is_confirmed:
-                return 'confirmed'
-            else:
-                return 'waiting'
-        else:
-            return 'payment pending'
+        return registration_status(self.is_complete, self.is_confirmed)
 
     @property
     def fee(self):
@@ -150,24 +308,20 @@ class SoloEventRegistration(models.Model):
         if self.is_complete is False and self.is_confirmed is True:
             raise ValidationError(_("Registration can not be confirmed until it is complete"))
 
-        if hasattr(self.profile, 'profileorganizer'):
-
-            if self.profile.profileorganizer in self.event.organizers.all():
-                raise ValidationError(_("Organizer can not be a participant for the same event"))
-
-        if hasattr(self.profile, 'profilevolunteer'):
-
-            if self.profile.profilevolunteer in self.event.volunteers.all():
-                raise ValidationError(_("Volunteer can not be a participant for the same event"))
+        is_organizer, is_volunteer = staff_conflicts(self.event_id, Q(profile=self.profile_id))
+        if is_organizer:
+            raise ValidationError(_("Organizer can not be a participant for the same event"))
+        if is_volunteer:
+            raise ValidationError(_("Volunteer can not be a participant for the same event"))
 
     def save(self, *args, **kwargs):
         if not self.public_id:
             self.public_id = generate_public_id(self)
 
-        super().save(*args, **kwargs)
+        self.save_tracking_seats(super().save, *args, **kwargs)
 
 
-class TeamEventRegistration(models.Model):
+class TeamEventRegistration(SeatCounterMixin, models.Model):
     public_id = models.CharField(max_length=100,
                                  unique=True,
                                  blank=True,
@@ -191,6 +345,17 @@ class TeamEventRegistration(models.Model):
 
     is_reserved = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            # Waiting list in registration order, waitlist positions
+            models.Index(fields=['event', 'is_complete', 'is_confirmed', 'is_reserved', 'created_on'],
+                         name='team_registration_queue_idx'),
+            # Confirmed seat counts
+            models.Index(fields=['event', 'is_confirmed', 'is_reserved'], name='team_registration_seats_idx'),
+            # Conditional GET of the registration list, see registrations_version
+            models.Index(fields=['event', 'updated_on'], name='team_registration_version_idx'),
+        ]
+
     @property
     def event_type(self):
         return 'team'
@@ -208,23 +373,164 @@ class TeamEventRegistration(models.Model):
 
     @property
     def status(self):
-        if self.is_complete:
-            if self.is_confirmed:
-                return 'confirmed'
-            else:
-                return 'waiting'
-        else:
-            return 'payment pending'
+        return registration_status(self.is_complete, self.is_confirmed)
 
     def clean(self):
         if self.is_complete is False and self.is_confirmed is True:
             raise ValidationError(_("Registration can not be confirmed until it is complete"))
 
-    # TODO: A check required that ensures no team member is an organizer/volunteer for same event
-    # Doing it here however might be too expensive
+        members = TeamMember.objects.filter(team=self.team_id, invitation_accepted=True).values('profile')
+        is_organizer, is_volunteer = staff_conflicts(self.event_id, Q(profile__team=self.team_id) |
+                                                     Q(profile__in=members))
+        if is_organizer:
+            raise ValidationError(_("An organizer of the event can not be in a participating team"))
+        if is_volunteer:
+            raise ValidationError(_("A volunteer of the event can not be in a participating team"))
+
+    def save(self, *args, **kwargs):
+        if not self.public_id:
+            self.public_id = generate_public_id(self)
+
+        self.save_tracking_seats(super().save, *args, **kwargs)
+
+
+class RegistrationTicket(models.Model):
+    """
+        A registration request waiting in the admission queue, see event_registrations.admission
+    """
+
+    public_id = models.CharField(max_length=100,
+                                 unique=True,
+                                 blank=True,
+                                 db_index=True)
+
+    event = models.ForeignKey(to=Event, on_delete=models.CASCADE, related_name='registration_tickets')
+
+    profile = models.ForeignKey(to=Profile, on_delete=models.CASCADE, related_name='registration_tickets')
+
+    team = models.ForeignKey(to=Team, on_delete=models.CASCADE, null=True, blank=True)
+
+    status = models.CharField(max_length=10, default='queued', choices=(('queued', 'queued'),
+                                                                        ('registered', 'registered'),
+                                                                        ('rejected', 'rejected')),
+                              db_index=True)
+
+    message = models.CharField(max_length=200, blank=True)
+
+    registration_public_id = models.CharField(max_length=100, blank=True)
+
+    created_on = models.DateTimeField(auto_now_add=True)
+
+    processed_on = models.DateTimeField(null=True, blank=True)
 
     def save(self, *args, **kwargs):
         if not self.public_id:
             self.public_id = generate_public_id(self)
 
         super().save(*args, **kwargs)
+
+
+class ExportJob(models.Model):
+    """
+        A participant CSV export of an event, written to MEDIA_ROOT by a worker, see event_registrations.exports
+    """
+
+    public_id = models.CharField(max_length=100,
+                                 unique=True,
+                                 blank=True,
+                                 db_index=True)
+
+    event = models.ForeignKey(to=Event, on_delete=models.CASCADE, related_name='export_jobs')
+
+    requested_by = models.ForeignKey(to=Profile, on_delete=models.SET_NULL, null=True, blank=True,
+                                     related_name='export_jobs')
+
+    status = models.CharField(max_length=10, default='queued', choices=(('queued', 'queued'),
+                                                                        ('running', 'running'),
+                                                                        ('done', 'done'),
+                                                                        ('failed', 'failed')),
+                              db_index=True)
+
+    # The event's registrations the file was generated from, see registrations_version
+    registration_count = models.IntegerField(null=True, blank=True)
+
+    registrations_updated_on = models.DateTimeField(null=True, blank=True)
+
+    total_rows = models.IntegerField(default=0)
+
+    rows_written = models.IntegerField(default=0)
+
+    file = models.FileField(upload_to='exports/', blank=True)
+
+    message = models.CharField(max_length=200, blank=True)
+
+    created_on = models.DateTimeField(auto_now_add=True)
+
+    started_on = models.DateTimeField(null=True, blank=True)
+
+    finished_on = models.DateTimeField(null=True, blank=True)
+
+    @property
+    def progress(self):
+        if self.status == 'done':
+            return 100
+        if not self.total_rows:
+            return 0
+        return min(99, 100 * self.rows_written // self.total_rows)
+
+    def save(self, *args, **kwargs):
+        if not self.public_id:
+            self.public_id = generate_public_id(self)
+
+        super().save(*args, **kwargs)
+
+
+@receiver(signals.post_delete, sender=SoloEventRegistration)
+@receiver(signals.post_delete, sender=TeamEventRegistration)
+def release_seat_counters(sender, instance, **kwargs):
+    """
+        Takes a deleted registration (including cascaded deletes) out of its event's seat counters
+    """
+
+    Event.shift_seat_counters(instance.event_id, instance.saved_seat_counters(), ())
+
+
+@receiver(signals.post_save, sender=Team)
+def refresh_team_reservation(sender, instance, **kwargs):
+    instance.is_reserved = Team.objects.filter(pk=instance.pk).refresh_reserved()[instance.pk]
+
+
+@receiver(signals.post_save, sender=TeamMember)
+@receiver(signals.post_delete, sender=TeamMember)
+def refresh_member_team_reservation(sender, instance, **kwargs):
+    Team.objects.filter(pk=instance.team_id).refresh_reserved()
+
+
+@receiver(signals.post_save, sender=Profile)
+def refresh_profile_teams_reservation(sender, instance, created, update_fields=None, **kwargs):
+    """
+        A profile's college decides the reservation of the teams it leads or belongs to
+    """
+
+    if created or (update_fields is not None and 'college' not in update_fields):
+        return
+    teams = Team.objects.filter(Q(team_leader=instance) | Q(teammember_set__profile=instance)).values('pk')
+    Team.objects.filter(pk__in=teams).refresh_reserved()
+
+
+@receiver(signals.post_save, sender=Institute)
+def refresh_institute_teams_reservation(sender, instance, created, **kwargs):
+    """
+        Renaming an institute to or from the home institute changes the reservation of its students' teams
+    """
+
+    if created:
+        return
+    teams = Team.objects.filter(Q(team_leader__college=instance) | Q(teammember_set__profile__college=instance))
+    Team.objects.filter(pk__in=teams.values('pk')).refresh_reserved()
+
+
+@receiver(signals.post_delete, sender=ExportJob)
+def delete_export_file(sender, instance, **kwargs):
+    if instance.file:
+        instance.file.delete(save=False)
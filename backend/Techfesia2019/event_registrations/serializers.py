@@ -1,8 +1,12 @@
+from django.db.models import Prefetch
 from rest_framework import serializers
 from events.models import TeamEvent, SoloEvent
-from .models import Team, SoloEventRegistration, TeamEventRegistration, TeamMember
+from .models import Team, SoloEventRegistration, TeamEventRegistration, TeamMember, RegistrationTicket, ExportJob
+from .models import registration_status
 
 
+# Read serializers list their rows from setup_eager_loading(queryset), which takes at most query_budget queries
+# however many rows there are. The budgets are checked in the tests.
 class TeamSerializer(serializers.ModelSerializer):
     teamId = serializers.CharField(source='public_id', read_only=True)
     members = serializers.SlugRelatedField(many=True, read_only=True, slug_field='get_user_username')
@@ -14,6 +18,13 @@ class TeamSerializer(serializers.ModelSerializer):
         model = Team
         fields = ['teamId', 'name', 'leader', 'members', 'invitees', 'events']
 
+    # Teams with their leaders, the roster and the registrations with their events
+    query_budget = 3
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        return queryset.with_roster()
+
     def is_valid(self, raise_exception=False):
         return super().is_valid()
 
@@ -27,6 +38,12 @@ class TeamMemberSerializer(serializers.ModelSerializer):
         model = TeamMember
         fields = ['teamId', 'name', 'leader', 'status']
 
+    query_budget = 1
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        return queryset.select_related('team__team_leader__user')
+
 
 class TeamEventRegistrationSerializer(serializers.ModelSerializer):
     registrationId = serializers.CharField(source='public_id', read_only=True)
@@ -36,6 +53,12 @@ class TeamEventRegistrationSerializer(serializers.ModelSerializer):
         model = TeamEventRegistration
         fields = ['registrationId', 'teamId', 'status']
 
+    query_budget = 1
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        return queryset.select_related('team')
+
 
 # This Serializer is To List all Registrations for a Team Event
 class TeamEventRegistrationsSerializer(serializers.ModelSerializer):
@@ -47,6 +70,14 @@ class TeamEventRegistrationsSerializer(serializers.ModelSerializer):
         model = TeamEvent
         fields = ['eventPublicId', 'eventType', 'registrations']
 
+    # The events and all their registrations
+    query_budget = 1 + TeamEventRegistrationSerializer.query_budget
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        registrations = TeamEventRegistrationSerializer.setup_eager_loading(TeamEventRegistration.objects)
+        return queryset.prefetch_related(Prefetch('teameventregistration_set', queryset=registrations.order_by('pk')))
+
 
 class SoloEventRegistrationSerializer(serializers.ModelSerializer):
     registrationId = serializers.CharField(source='public_id', read_only=True)
@@ -56,6 +87,12 @@ class SoloEventRegistrationSerializer(serializers.ModelSerializer):
         model = SoloEventRegistration
         fields = ['registrationId', 'userId', 'status']
 
+    query_budget = 1
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        return queryset.select_related('profile__user')
+
 
 # This Serializer is To List all Registrations for a Solo Event
 class SoloEventRegistrationsSerializer(serializers.ModelSerializer):
@@ -67,3 +104,105 @@ class SoloEventRegistrationsSerializer(serializers.ModelSerializer):
         model = SoloEvent
         fields = ['eventPublicId', 'eventType', 'registrations']
 
+    # The events and all their registrations
+    query_budget = 1 + SoloEventRegistrationSerializer.query_budget
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        registrations = SoloEventRegistrationSerializer.setup_eager_loading(SoloEventRegistration.objects)
+        return queryset.prefetch_related(Prefetch('soloeventregistration_set', queryset=registrations.order_by('pk')))
+
+
+# values() based equivalents of SoloEventRegistrationsSerializer and TeamEventRegistrationsSerializer for the staff
+# listing: one query for the needed columns, no model instances or serializer fields per registration.
+# Maps each column to its key in the payload.
+SOLO_REGISTRATION_KEYS = {'public_id': 'registrationId', 'profile__user__username': 'userId'}
+TEAM_REGISTRATION_KEYS = {'public_id': 'registrationId', 'team__public_id': 'teamId'}
+
+
+REGISTRATION_CHUNK_SIZE = 2000
+
+
+def registration_rows(event, registrations, keys):
+    """
+        Yields the event's registrations as payload dicts, reading them from the database in chunks
+    """
+
+    columns = list(keys)
+    names = [keys[i] for i in columns]
+    rows = registrations.filter(event=event).order_by('pk').values_list(*columns, 'is_complete', 'is_confirmed')
+    for row in rows.iterator(chunk_size=REGISTRATION_CHUNK_SIZE):
+        item = dict(zip(names, row))
+        item['status'] = registration_status(row[-2], row[-1])
+        yield item
+
+
+def solo_registration_rows(event):
+    return registration_rows(event, SoloEventRegistration.objects, SOLO_REGISTRATION_KEYS)
+
+
+def team_registration_rows(event):
+    return registration_rows(event, TeamEventRegistration.objects, TEAM_REGISTRATION_KEYS)
+
+
+def registrations_data(event, rows):
+    return {'eventPublicId': event.public_id, 'eventType': event.event_type, 'registrations': list(rows)}
+
+
+def solo_registrations_data(event):
+    return registrations_data(event, solo_registration_rows(event))
+
+
+def team_registrations_data(event):
+    return registrations_data(event, team_registration_rows(event))
+
+
+class RegistrationTicketSerializer(serializers.ModelSerializer):
+    ticketId = serializers.CharField(source='public_id', read_only=True)
+    eventPublicId = serializers.SlugRelatedField(source='event', read_only=True, slug_field='public_id')
+    registrationId = serializers.CharField(source='registration_public_id', read_only=True)
+
+    class Meta:
+        model = RegistrationTicket
+        fields = ['ticketId', 'eventPublicId', 'status', 'message', 'registrationId']
+
+    query_budget = 1
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        return queryset.select_related('event')
+
+
+class ExportJobSerializer(serializers.ModelSerializer):
+    jobId = serializers.CharField(source='public_id', read_only=True)
+    eventPublicId = serializers.SlugRelatedField(source='event', read_only=True, slug_field='public_id')
+    progress = serializers.IntegerField(read_only=True)
+    rowsWritten = serializers.IntegerField(source='rows_written', read_only=True)
+    totalRows = serializers.IntegerField(source='total_rows', read_only=True)
+    fileUrl = serializers.SerializerMethodField()
+    createdOn = serializers.DateTimeField(source='created_on', read_only=True)
+    finishedOn = serializers.DateTimeField(source='finished_on', read_only=True)
+
+    class Meta:
+        model = ExportJob
+        fields = ['jobId', 'eventPublicId', 'status', 'progress', 'rowsWritten', 'totalRows', 'fileUrl', 'message',
+                  'createdOn', 'finishedOn']
+
+    query_budget = 1
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        return queryset.select_related('event')
+
+    def get_fileUrl(self, job):
+        if job.status != 'done' or not job.file:
+            return None
+        return job.file.url
+
+
+# Works for both Solo and Team Event Registrations
+class WaitlistPositionSerializer(serializers.Serializer):
+    registrationId = serializers.CharField(source='public_id', read_only=True)
+    status = serializers.CharField(read_only=True)
+    pool = serializers.CharField(read_only=True)
+    position = serializers.IntegerField(source='waitlist_position', read_only=True)
@@ -0,0 +1,95 @@
+from io import StringIO
+from django.core.management import call_command
+from django.test import TestCase
+from registration.models import User
+from accounts.models import Institute
+from events.models import SoloEvent, TeamEvent
+from event_registrations.admission import enqueue_registration, admit_queued_tickets
+from event_registrations.models import Team, TeamMember, SoloEventRegistration, TeamEventRegistration
+import datetime as dt
+
+
+class AdmissionQueueTestCase(TestCase):
+    def setUp(self):
+        self.institute = Institute.objects.create()
+        self.event = SoloEvent.objects.create(title='Sample Solo Event',
+                                              start_date=dt.date(2019, 8, 3),
+                                              start_time=dt.time(12, 0, 0),
+                                              end_date=dt.date(2019, 9, 4),
+                                              end_time=dt.time(10, 0, 0)
+                                              )
+        self.team_event = TeamEvent.objects.create(title='Sample Team Event',
+                                                   team_event=True,
+                                                   start_date=dt.date(2019, 8, 3),
+                                                   start_time=dt.time(12, 0, 0),
+                                                   end_date=dt.date(2019, 9, 4),
+                                                   end_time=dt.time(10, 0, 0),
+                                                   max_team_size=3
+                                                   )
+        self.profiles = []
+        for i in range(1, 6):
+            user = User.objects.create(username='sample_test_user' + str(i),
+                                       email='sample_user{0}@test.com'.format(str(i))
+                                       )
+            user.profile.college = self.institute if i == 1 else None
+            user.profile.save()
+            self.profiles.append(user.profile)
+
+    def test_admit_solo_tickets(self):
+        tickets = [enqueue_registration(self.event, profile) for profile in self.profiles]
+        tickets.append(enqueue_registration(self.event, self.profiles[0]))
+
+        self.assertEqual(admit_queued_tickets(batch_size=4), 4)
+        self.assertEqual(admit_queued_tickets(batch_size=4), 2)
+        self.assertEqual(admit_queued_tickets(batch_size=4), 0)
+
+        for ticket in tickets:
+            ticket.refresh_from_db()
+        self.assertEqual([i.status for i in tickets], ['registered'] * 5 + ['rejected'])
+        self.assertEqual(SoloEventRegistration.objects.filter(event=self.event).count(), 5)
+        registration = SoloEventRegistration.objects.get(public_id=tickets[0].registration_public_id)
+        self.assertEqual(registration.profile, self.profiles[0])
+        self.assertTrue(registration.is_reserved)
+        self.assertEqual(registration.status, 'payment pending')
+
+    def test_admit_team_tickets(self):
+        team1 = Team.objects.create(team_leader=self.profiles[0], name='Sample Team1')
+        TeamMember.objects.create(team=team1, profile=self.profiles[1], invitation_accepted=True)
+        team2 = Team.objects.create(team_leader=self.profiles[2], name='Sample Team2')
+        TeamMember.objects.create(team=team2, profile=self.profiles[1], invitation_accepted=True)
+        team3 = Team.objects.create(team_leader=self.profiles[3], name='Sample Team3')
+
+        tickets = [enqueue_registration(self.team_event, team.team_leader, team=team) for team in (team1, team2)]
+        admit_queued_tickets()
+        tickets.append(enqueue_registration(self.team_event, team3.team_leader, team=team3))
+        tickets.append(enqueue_registration(self.team_event, team1.team_leader, team=team1))
+        admit_queued_tickets()
+
+        for ticket in tickets:
+            ticket.refresh_from_db()
+        # team2 shares a member with team1
+        self.assertEqual([i.status for i in tickets], ['registered', 'rejected', 'registered', 'rejected'])
+        self.assertEqual(set(TeamEventRegistration.objects.filter(event=self.team_event)
+                             .values_list('team__name', flat=True)), {'Sample Team1', 'Sample Team3'})
+
+    def test_admit_team_tickets_pending_invitee(self):
+        team1 = Team.objects.create(team_leader=self.profiles[0], name='Sample Team1')
+        TeamMember.objects.create(team=team1, profile=self.profiles[1], invitation_accepted=False)
+        team2 = Team.objects.create(team_leader=self.profiles[2], name='Sample Team2')
+        TeamMember.objects.create(team=team2, profile=self.profiles[1], invitation_accepted=True)
+
+        tickets = [enqueue_registration(self.team_event, team.team_leader, team=team) for team in (team1, team2)]
+        admit_queued_tickets()
+
+        for ticket in tickets:
+            ticket.refresh_from_db()
+        # profiles[1] has not accepted team1's invitation, so the teams do not share a member
+        self.assertEqual([i.status for i in tickets], ['registered', 'registered'])
+
+    def test_process_registration_queue_command(self):
+        for profile in self.profiles:
+            enqueue_registration(self.event, profile)
+        out = StringIO()
+        call_command('process_registration_queue', batch_size=2, stdout=out)
+        self.assertIn('Processed 5 ticket(s)', out.getvalue())
+        self.assertEqual(SoloEventRegistration.objects.filter(event=self.event).count(), 5)
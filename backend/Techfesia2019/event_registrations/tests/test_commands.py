@@ -0,0 +1,61 @@
+from io import StringIO
+from django.core.management import call_command
+from django.db import connection
+from django.core.management.base import CommandError
+from django.test import TestCase, TransactionTestCase
+from registration.models import User
+from events.models import Event
+from event_registrations.models import SoloEventRegistration, TeamEventRegistration
+
+
+class BenchmarkRegistrationIndexesTestCase(TestCase):
+    def test_benchmark_leaves_no_data_behind(self):
+        out = StringIO()
+        call_command('benchmark_registration_indexes', rows=300, users=20, events=2, repeat=1, stdout=out)
+        self.assertIn('waitlist position', out.getvalue())
+        self.assertIn('with indexes', out.getvalue())
+        self.assertFalse(SoloEventRegistration.objects.exists())
+
+    def test_indexes_are_restored(self):
+        call_command('benchmark_registration_indexes', rows=100, users=10, events=1, repeat=1, stdout=StringIO())
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, SoloEventRegistration._meta.db_table)
+        self.assertIn('solo_registration_queue_idx', constraints)
+        self.assertIn('solo_registration_seats_idx', constraints)
+
+
+class BenchmarkRegistrationListingTestCase(TestCase):
+    def test_benchmark_leaves_no_data_behind(self):
+        out = StringIO()
+        call_command('benchmark_registration_listing', rows=50, users=10, repeat=1, stdout=out)
+        self.assertIn('solo event', out.getvalue())
+        self.assertIn('team event', out.getvalue())
+        self.assertFalse(SoloEventRegistration.objects.exists())
+        self.assertFalse(TeamEventRegistration.objects.exists())
+
+
+class BenchmarkCsvExportTestCase(TestCase):
+    def test_benchmark_leaves_no_data_behind(self):
+        out = StringIO()
+        call_command('benchmark_csv_export', rows=30, users=10, repeat=1, stdout=out)
+        self.assertIn('export: 30 rows', out.getvalue())
+        self.assertIn('no eager loading: 30 rows', out.getvalue())
+        self.assertFalse(TeamEventRegistration.objects.exists())
+
+
+class LoadtestRegistrationOpenTestCase(TransactionTestCase):
+    # The command serves the API from a thread, so the seeded rows have to be committed
+
+    def test_smoke(self):
+        out = StringIO()
+        call_command('loadtest_registration_open', users=12, events=2, seats=4, reserved_seats=1, concurrency=3,
+                     seed=1, stdout=out)
+        self.assertIn('callback', out.getvalue())
+        self.assertIn('All seat invariants hold', out.getvalue())
+        self.assertFalse(User.objects.filter(username__startswith='loadtest').exists())
+        self.assertFalse(Event.objects.exists())
+
+    def test_url_requires_gateway_port(self):
+        with self.assertRaises(CommandError):
+            call_command('loadtest_registration_open', users=1, url='http://127.0.0.1:8000', stdout=StringIO())
+        self.assertFalse(User.objects.exists())
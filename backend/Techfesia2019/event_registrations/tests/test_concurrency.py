@@ -0,0 +1,81 @@
+from django.db import connections
+from django.test import TransactionTestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+from registration.models import User
+from accounts.models import Institute
+from events.models import SoloEvent
+from event_registrations.models import SoloEventRegistration
+import multiprocessing
+import datetime as dt
+
+REGISTRATIONS = 500
+WORKERS = 8
+
+
+def register_and_pay(event_pk, usernames):
+    """
+        Runs in a worker process: registers every user through the API, then completes their payment
+    """
+
+    try:
+        event = SoloEvent.objects.get(pk=event_pk)
+        url = reverse('create_event_registration', args=(event.public_id,))
+        client = APIClient()
+        for username in usernames:
+            user = User.objects.get(username=username)
+            client.force_authenticate(user=user)
+            client.post(url, '{}', content_type='application/json')
+            registration = SoloEventRegistration.objects.get(event=event, profile__user=user)
+            event.complete_registration(registration)
+    finally:
+        connections.close_all()
+
+
+class ConcurrentRegistrationTestCase(TransactionTestCase):
+    def setUp(self):
+        self.institute = Institute.objects.create()
+        self.event = SoloEvent.objects.create(title='Sample Solo Event',
+                                              start_date=dt.date(2019, 8, 3),
+                                              start_time=dt.time(12, 0, 0),
+                                              end_date=dt.date(2019, 9, 4),
+                                              end_time=dt.time(10, 0, 0),
+                                              max_participants=50,
+                                              reserved_slots=10
+                                              )
+        self.usernames = []
+        for i in range(REGISTRATIONS):
+            user = User.objects.create(username='sample_test_user' + str(i),
+                                       email='sample_user{0}@test.com'.format(str(i))
+                                       )
+            if i % 5 == 0:
+                user.profile.college = self.institute
+                user.profile.save()
+            self.usernames.append(user.username)
+
+    def test_concurrent_registrations(self):
+        # Every user is sent by two workers, so duplicate registrations race as well
+        chunks = [self.usernames[i::WORKERS] for i in range(WORKERS)]
+        chunks += [list(reversed(chunk)) for chunk in chunks]
+
+        connections.close_all()
+        with multiprocessing.get_context('fork').Pool(WORKERS) as pool:
+            pool.starmap(register_and_pay, [(self.event.pk, chunk) for chunk in chunks])
+
+        registrations = SoloEventRegistration.objects.filter(event=self.event)
+        self.assertEqual(registrations.count(), REGISTRATIONS)
+        self.assertEqual(registrations.values('profile').distinct().count(), REGISTRATIONS)
+        # Every seat is taken and no more. The reserved slots go to reserved participants first, then they compete
+        # for the general seats too, so more than 10 of them may be confirmed depending on the order.
+        confirmed = registrations.filter(is_confirmed=True)
+        self.assertEqual(confirmed.count(), 50)
+        self.assertGreaterEqual(confirmed.filter(is_reserved=True).count(), 10)
+        self.assertLessEqual(confirmed.filter(is_reserved=False).count(), 40)
+        self.assertEqual(registrations.filter(is_complete=True, is_confirmed=False).count(), REGISTRATIONS - 50)
+
+        self.event.load_seat_counters()
+        self.assertEqual(self.event.confirmed_count, 50)
+        self.assertEqual(self.event.reserved_confirmed_count, confirmed.filter(is_reserved=True).count())
+        self.assertEqual(self.event.waiting_count, REGISTRATIONS - 50)
+        self.assertEqual(self.event.reserved_waiting_count,
+                         registrations.filter(is_complete=True, is_confirmed=False, is_reserved=True).count())
@@ -0,0 +1,385 @@
+import csv
+import io
+from io import StringIO
+import os
+import tempfile
+import zipfile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from registration.models import User
+from accounts.models import Institute
+from events.models import Category, Event, SoloEvent, TeamEvent
+from event_registrations.exports import participant_rows, events_for_export, zip_chunks
+from event_registrations.exports import request_export, run_next_export_job, write_csv
+from event_registrations.exports import SOLO_COLUMNS, TEAM_COLUMNS, export_queryset, export_rows, select_columns
+from event_registrations.models import Team, TeamMember, SoloEventRegistration, TeamEventRegistration, ExportJob
+import datetime as dt
+import shutil
+from unittest import mock
+
+
+SOLO_HEADER = ['Participant Name', 'status', 'Reserved', 'email', 'phone number', 'college', 'registered on']
+TEAM_HEADER = ['Team Name', 'status', 'Reserved', 'Team Leader', 'Team Leader Email', 'college', 'registered on',
+               'All Members']
+
+
+class ParticipantExportTestCase(TestCase):
+    def setUp(self):
+        self.institute = Institute.objects.create(name='Sample Institute')
+        self.event = SoloEvent.objects.create(title='Sample Solo Event',
+                                              start_date=dt.date(2019, 8, 3),
+                                              start_time=dt.time(12, 0, 0),
+                                              end_date=dt.date(2019, 9, 4),
+                                              end_time=dt.time(10, 0, 0)
+                                              )
+        self.team_event = TeamEvent.objects.create(title='Sample Team Event',
+                                                   team_event=True,
+                                                   start_date=dt.date(2019, 8, 3),
+                                                   start_time=dt.time(12, 0, 0),
+                                                   end_date=dt.date(2019, 9, 4),
+                                                   end_time=dt.time(10, 0, 0),
+                                                   max_team_size=3
+                                                   )
+        self.profiles = []
+        for i in range(1, 6):
+            user = User.objects.create(username='sample_test_user' + str(i), first_name='sample', last_name=str(i),
+                                       email='sample_user{0}@test.com'.format(str(i))
+                                       )
+            user.profile.college = self.institute if i % 2 else None
+            user.profile.save()
+            self.profiles.append(user.profile)
+            SoloEventRegistration.objects.create(event=self.event, profile=user.profile, is_complete=i < 3)
+            team = Team.objects.create(team_leader=user.profile, name='Sample Team' + str(i))
+            TeamEventRegistration.objects.create(event=self.team_event, team=team)
+        for i, profile in enumerate(self.profiles[1:]):
+            TeamMember.objects.create(team=Team.objects.get(team_leader=self.profiles[i]), profile=profile,
+                                      invitation_accepted=True)
+
+    def test_solo_rows(self):
+        rows = list(participant_rows(self.event))
+        self.assertEqual(rows[0], SOLO_HEADER)
+        self.assertEqual(len(rows), 6)
+        self.assertEqual(rows[1][:6], ['sample 1', 'waiting', 'False', 'sample_user1@test.com', '',
+                                       'Sample Institute'])
+        self.assertEqual(rows[2][5], '')
+        self.assertEqual(rows[3][1], 'payment pending')
+
+    def test_team_rows(self):
+        rows = list(participant_rows(self.team_event))
+        self.assertEqual(rows[0], TEAM_HEADER)
+        self.assertEqual([i[0] for i in rows[1:]], ['Sample Team' + str(i) for i in range(1, 6)])
+        self.assertEqual(rows[1][3:6], ['sample 1', 'sample_user1@test.com', 'Sample Institute'])
+        self.assertEqual(rows[1][7], 'sample 2')
+        self.assertEqual(rows[5][7], '')
+
+    def test_queries_per_chunk(self):
+        # One query per chunk of solo registrations, two per chunk of team registrations (the rosters)
+        with self.assertNumQueries(3):
+            self.assertEqual(len(list(participant_rows(self.event, chunk_size=2))), 6)
+        with self.assertNumQueries(6):
+            self.assertEqual(len(list(participant_rows(self.team_event, chunk_size=2))), 6)
+        with self.assertNumQueries(2):
+            self.assertEqual(len(list(participant_rows(self.event, chunk_size=5))), 6)
+
+    def test_select_columns(self):
+        self.assertEqual(select_columns(SOLO_COLUMNS), SOLO_COLUMNS)
+        self.assertEqual([i.header for i in select_columns(SOLO_COLUMNS, ['email', 'name'])],
+                         ['email', 'Participant Name'])
+        with self.assertRaises(ValueError):
+            select_columns(SOLO_COLUMNS, ['email', 'password'])
+
+    def test_narrow_export_reads_only_its_columns(self):
+        with CaptureQueriesContext(connection) as queries:
+            rows = list(export_rows(self.event, select_columns(SOLO_COLUMNS, ['email'])))
+        self.assertEqual(rows, [['sample_user{0}@test.com'.format(i)] for i in range(1, 6)])
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('first_name', queries[0]['sql'])
+        self.assertNotIn('college', queries[0]['sql'])
+        with CaptureQueriesContext(connection) as queries:
+            rows = list(export_rows(self.team_event, select_columns(TEAM_COLUMNS, ['teamName', 'leaderEmail'])))
+        self.assertEqual(rows[0], ['Sample Team1', 'sample_user1@test.com'])
+        self.assertEqual(len(queries), 1)
+        with self.assertNumQueries(2):
+            rows = list(export_rows(self.team_event, select_columns(TEAM_COLUMNS, ['members'])))
+        self.assertEqual(rows[0], ['sample 2'])
+
+    def test_export_queryset_loads_event_id(self):
+        registrations = list(export_queryset(self.event, select_columns(SOLO_COLUMNS, ['email'])))
+        with self.assertNumQueries(0):
+            self.assertEqual({i.event_id for i in registrations}, {self.event.pk})
+
+    def test_formats(self):
+        staff_user = User.objects.create(username='staff', email='staff@test.com', is_staff=True)
+        self.client.force_login(staff_user)
+        url = reverse('event_registrations_csv', args=(self.event.public_id,))
+        response = self.client.get(url, {'format': 'tsv', 'fields': 'name, email'})
+        self.assertEqual(response['Content-Type'], 'text/tab-separated-values')
+        self.assertIn('participants_list.tsv', response['Content-Disposition'])
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[:2], ['Participant Name\temail', 'sample 1\tsample_user1@test.com'])
+        response = self.client.get(url, {'format': 'ndjson', 'fields': 'email,status'})
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 5)
+        self.assertEqual(lines[0], '{"email":"sample_user1@test.com","status":"waiting"}')
+        self.assertEqual(self.client.get(url, {'fields': 'password'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'format': 'xml'}).status_code, 400)
+
+    def test_csv_view(self):
+        staff_user = User.objects.create(username='staff', email='staff@test.com', is_staff=True)
+        self.client.force_login(staff_user)
+        response = self.client.get(reverse('event_registrations_csv', args=(self.team_event.public_id,)))
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        rows = list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual(rows[0], TEAM_HEADER)
+        self.assertEqual(len(rows), 6)
+        response = self.client.get(reverse('event_registrations_csv', args=('random_string',)))
+        self.assertEqual(response.status_code, 404)
+
+
+def read_zip(content):
+    with zipfile.ZipFile(io.BytesIO(content)) as archive:
+        return {name: list(csv.reader(io.StringIO(archive.read(name).decode()))) for name in archive.namelist()}
+
+
+class ParticipantsZipTestCase(TestCase):
+    def setUp(self):
+        self.category = Category.objects.create()
+        self.events = []
+        for i in range(1, 4):
+            event = SoloEvent.objects.create(title='Sample Event{0}'.format(i),
+                                             start_date=dt.date(2019, 8, i),
+                                             start_time=dt.time(12, 0, 0),
+                                             end_date=dt.date(2019, 8, i),
+                                             end_time=dt.time(15, 0, 0)
+                                             )
+            for j in range(i):
+                user = User.objects.create(username='sample_user{0}{1}'.format(i, j),
+                                           email='sample_user{0}{1}@test.com'.format(i, j))
+                SoloEventRegistration.objects.create(event=event, profile=user.profile)
+            self.events.append(event)
+        self.events[0].category.add(self.category)
+        self.events[2].category.add(self.category)
+        # Without its SoloEvent/TeamEvent row, left out
+        Event.objects.create(title='Broken Event', start_date=dt.date(2019, 8, 1), start_time=dt.time(12, 0, 0),
+                             end_date=dt.date(2019, 8, 1), end_time=dt.time(15, 0, 0))
+        self.staff_user = User.objects.create(username='staff', email='staff@test.com', is_staff=True)
+
+    def test_events_for_export(self):
+        self.assertEqual(events_for_export(), self.events)
+        self.assertEqual(events_for_export(categories=[self.category.pk]), [self.events[0], self.events[2]])
+        self.assertEqual(events_for_export(start_date=dt.date(2019, 8, 2), end_date=dt.date(2019, 8, 2)),
+                         [self.events[1]])
+
+    def test_zip_chunks(self):
+        files = read_zip(b''.join(zip_chunks(self.events)))
+        self.assertEqual(sorted(files), ['Sample Event{0}-participants_list.csv'.format(i) for i in range(1, 4)])
+        rows = files['Sample Event3-participants_list.csv']
+        self.assertEqual(rows[0], SOLO_HEADER)
+        self.assertEqual(len(rows), 4)
+
+    @override_settings(EXPORT_WORKERS=1)
+    def test_zip_view(self):
+        url = reverse('events_registrations_zip')
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.client.force_login(self.staff_user)
+        response = self.client.get(url, {'category': self.category.pk, 'from': '2019-08-02'})
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        self.assertTrue(response.streaming)
+        files = read_zip(b''.join(response.streaming_content))
+        self.assertEqual(list(files), ['Sample Event3-participants_list.csv'])
+        self.assertEqual(self.client.get(url, {'from': '3 August'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'category': 'sports'}).status_code, 400)
+
+    def test_zip_view_staff_only(self):
+        self.client.force_login(User.objects.create(username='sample_user', email='sample_user@test.com'))
+        self.assertEqual(self.client.get(reverse('events_registrations_zip')).status_code, 403)
+
+    def test_command(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'participants.zip')
+            call_command('export_participants_zip', path, '--to', '2019-08-02', workers=1, stdout=io.StringIO())
+            with open(path, 'rb') as archive:
+                files = read_zip(archive.read())
+        self.assertEqual(len(files), 2)
+
+
+class ParallelParticipantsZipTestCase(TransactionTestCase):
+    def test_parallel_encoding_keeps_order(self):
+        for i in range(1, 7):
+            event = SoloEvent.objects.create(title='Sample Event{0}'.format(i), start_date=dt.date(2019, 8, i),
+                                             start_time=dt.time(12, 0, 0), end_date=dt.date(2019, 8, i),
+                                             end_time=dt.time(15, 0, 0))
+            user = User.objects.create(username='sample_user{0}'.format(i), email='sample{0}@test.com'.format(i))
+            SoloEventRegistration.objects.create(event=event, profile=user.profile)
+        content = b''.join(zip_chunks(events_for_export(), workers=3))
+        with zipfile.ZipFile(io.BytesIO(content)) as archive:
+            self.assertEqual(archive.namelist(), ['Sample Event{0}-participants_list.csv'.format(i)
+                                                  for i in range(1, 7)])
+        for rows in read_zip(content).values():
+            self.assertEqual(rows[0], SOLO_HEADER)
+            self.assertEqual(len(rows), 2)
+
+
+class ExportJobTestCase(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings = override_settings(MEDIA_ROOT=self.media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.event = SoloEvent.objects.create(title='Sample Solo Event',
+                                              start_date=dt.date(2019, 8, 3),
+                                              start_time=dt.time(12, 0, 0),
+                                              end_date=dt.date(2019, 9, 4),
+                                              end_time=dt.time(10, 0, 0)
+                                              )
+        self.registrations = []
+        for i in range(1, 4):
+            user = User.objects.create(username='sample_test_user' + str(i), first_name='sample', last_name=str(i),
+                                       email='sample_user{0}@test.com'.format(str(i))
+                                       )
+            self.registrations.append(SoloEventRegistration.objects.create(event=self.event, profile=user.profile))
+        self.staff_user = User.objects.create(username='staff', email='staff@test.com', is_staff=True)
+
+    def read_file(self, job):
+        with job.file.open('rb') as file:
+            return list(csv.reader(io.StringIO(file.read().decode())))
+
+    def test_worker_writes_file(self):
+        job, reused = request_export(self.event)
+        self.assertFalse(reused)
+        self.assertEqual(job.status, 'queued')
+        self.assertEqual(job.progress, 0)
+        self.assertEqual(run_next_export_job().pk, job.pk)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'done')
+        self.assertEqual((job.rows_written, job.total_rows, job.progress), (3, 3, 100))
+        self.assertTrue(job.file.name.startswith('exports/'))
+        self.assertTrue(os.path.exists(os.path.join(self.media_root, job.file.name)))
+        rows = self.read_file(job)
+        self.assertEqual(rows[0], SOLO_HEADER)
+        self.assertEqual(len(rows), 4)
+        self.assertIsNone(run_next_export_job())
+
+    def test_progress(self):
+        seen = []
+        with mock.patch('event_registrations.exports.EXPORT_PROGRESS_EVERY', 2):
+            self.assertEqual(write_csv(self.event, io.BytesIO(), seen.append), 3)
+        self.assertEqual(seen, [2])
+        job = ExportJob(event=self.event, status='running', rows_written=2, total_rows=3)
+        self.assertEqual(job.progress, 66)
+        job.rows_written = 3
+        self.assertEqual(job.progress, 99)
+
+    def test_unchanged_registrations_reuse_the_file(self):
+        job, _ = request_export(self.event)
+        self.assertEqual(request_export(self.event), (job, False))
+        run_next_export_job()
+        reused, is_reused = request_export(self.event)
+        self.assertTrue(is_reused)
+        self.assertEqual(reused.pk, job.pk)
+
+    def test_changed_registrations_queue_a_new_export(self):
+        job, _ = request_export(self.event)
+        run_next_export_job()
+        self.registrations[0].is_complete = True
+        self.registrations[0].save()
+        changed, reused = request_export(self.event)
+        self.assertFalse(reused)
+        self.assertNotEqual(changed.pk, job.pk)
+        run_next_export_job()
+        self.registrations[1].delete()
+        removed, reused = request_export(self.event)
+        self.assertFalse(reused)
+        self.assertNotEqual(removed.pk, changed.pk)
+
+    def test_missing_file_is_regenerated(self):
+        job, _ = request_export(self.event)
+        run_next_export_job()
+        job.refresh_from_db()
+        os.remove(os.path.join(self.media_root, job.file.name))
+        again, reused = request_export(self.event)
+        self.assertFalse(reused)
+        self.assertNotEqual(again.pk, job.pk)
+
+    def test_failed_job_is_recorded(self):
+        job, _ = request_export(self.event)
+        with mock.patch('event_registrations.exports.write_csv', side_effect=OSError('disk full')):
+            run_next_export_job()
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'failed')
+        self.assertEqual(job.message, 'disk full')
+        self.assertIsNotNone(job.finished_on)
+
+    def test_failed_job_keeps_progress(self):
+        job, _ = request_export(self.event)
+
+        def write_csv(event, output, progress):
+            progress(2)
+            raise OSError('disk full')
+
+        with mock.patch('event_registrations.exports.write_csv', side_effect=write_csv):
+            run_next_export_job()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.rows_written, job.total_rows), ('failed', 2, 3))
+
+    def test_stale_running_job_is_failed(self):
+        job, _ = request_export(self.event)
+        ExportJob.objects.filter(pk=job.pk).update(status='running',
+                                                   started_on=timezone.now() - dt.timedelta(hours=1))
+        with override_settings(EXPORT_JOB_TIMEOUT=60):
+            again, reused = request_export(self.event)
+        self.assertFalse(reused)
+        self.assertNotEqual(again.pk, job.pk)
+        self.assertEqual(again.status, 'queued')
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'failed')
+        self.assertIsNotNone(job.finished_on)
+
+    def test_running_job_is_not_failed_early(self):
+        job, _ = request_export(self.event)
+        ExportJob.objects.filter(pk=job.pk).update(status='running', started_on=timezone.now())
+        self.assertEqual(request_export(self.event)[0].pk, job.pk)
+
+    def test_deleting_job_deletes_file(self):
+        job, _ = request_export(self.event)
+        run_next_export_job()
+        job.refresh_from_db()
+        path = os.path.join(self.media_root, job.file.name)
+        job.delete()
+        self.assertFalse(os.path.exists(path))
+
+    def test_command(self):
+        request_export(self.event)
+        out = StringIO()
+        call_command('process_export_jobs', stdout=out)
+        self.assertIn('Processed 1 export job(s)', out.getvalue())
+
+    def test_views(self):
+        url = reverse('create_export_job', args=(self.event.public_id,))
+        user = User.objects.create(username='not_staff', email='not_staff@test.com')
+        self.client.force_login(user)
+        self.assertEqual(self.client.post(url).status_code, 403)
+        self.client.force_login(self.staff_user)
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['status'], 'queued')
+        self.assertIsNone(response.data['fileUrl'])
+        detail = reverse('export_job_detail', args=(self.event.public_id, response.data['jobId']))
+        run_next_export_job()
+        response = self.client.get(detail)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['status'], response.data['progress'], response.data['rowsWritten']),
+                         ('done', 100, 3))
+        self.assertTrue(response.data['fileUrl'].startswith('/media/exports/'))
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['jobId'], detail.rsplit('/', 1)[1])
+        self.assertEqual(self.client.post(reverse('create_export_job', args=('random_string',))).status_code, 404)
+        self.assertEqual(self.client.get(reverse('export_job_detail', args=(self.event.public_id, 'random_string')))
+                         .status_code, 404)
@@ -1,6 +1,10 @@
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import connection
 from django.test import TestCase
 from event_registrations.models import Team, TeamMember, SoloEventRegistration, TeamEventRegistration
-from accounts.models import Profile, Institute
+from event_registrations.serializers import TeamSerializer
+from accounts.models import Profile, Institute, ProfileOrganizer, ProfileVolunteer
 from events.models import SoloEvent, TeamEvent
 from registration.models import User
 import datetime as dt
@@ -47,22 +51,71 @@ class TeamTestCase(TestCase):
         self.institute2 = Institute.objects.create(name='Sample Institute 2')
         self.team_member = TeamMember.objects.create(team=self.team, profile=self.profile2)
 
+        self.team.refresh_from_db()
         self.assertTrue(self.team.is_reserved)
 
         self.profile2.college = self.institute2
         self.profile2.save()
 
+        self.team.refresh_from_db()
         self.assertFalse(self.team.is_reserved)
 
         self.profile = self.institute2
         self.profile.save()
 
+        self.team.refresh_from_db()
         self.assertFalse(self.team.is_reserved)
 
         self.team_member.profile.college = self.institute
 
+        self.team.refresh_from_db()
         self.assertFalse(self.team.is_reserved)
 
+        self.team_member.profile.save()
+
+        self.team.refresh_from_db()
+        self.assertTrue(self.team.is_reserved)
+
+        self.team_member.delete()
+        self.profile2.college = self.institute2
+        self.profile2.save()
+
+        self.team.refresh_from_db()
+        self.assertTrue(self.team.is_reserved)
+
+    def test_reservation_follows_members(self):
+        user2 = User.objects.create(username='sample_test_user2', email='sampleuser2@test.com')
+        team_member = TeamMember.objects.create(team=self.team, profile=user2.profile)
+
+        self.team.refresh_from_db()
+        self.assertFalse(self.team.is_reserved)
+
+        team_member.delete()
+
+        self.team.refresh_from_db()
+        self.assertTrue(self.team.is_reserved)
+
+    def test_reservation_follows_institute_name(self):
+        self.institute.name = 'Sample Institute 2'
+        self.institute.save()
+
+        self.team.refresh_from_db()
+        self.assertFalse(self.team.is_reserved)
+
+        self.institute.name = 'Indian Institute of Information Technology, Sri City'
+        self.institute.save()
+
+        self.team.refresh_from_db()
+        self.assertTrue(self.team.is_reserved)
+
+    def test_refresh_reserved_is_one_query(self):
+        Team.objects.filter(pk=self.team.pk).update(is_reserved=False)
+        with self.assertNumQueries(2):
+            flags = Team.objects.all().refresh_reserved()
+        self.assertEqual(flags, {self.team.pk: True})
+        with self.assertNumQueries(1):
+            Team.objects.all().refresh_reserved()
+
 
 class TeamMemberTestCase(TestCase):
     def setUp(self):
@@ -128,6 +181,56 @@ class TeamMemberTestCase(TestCase):
         self.assertTrue(self.team.ready())
 
 
+class TeamRosterTestCase(TestCase):
+    def setUp(self):
+        self.event = TeamEvent.objects.create(title='Sample Team Event', team_event=True,
+                                              start_date=dt.date(2019, 8, 3), start_time=dt.time(12, 0, 0),
+                                              end_date=dt.date(2019, 9, 4), end_time=dt.time(10, 0, 0))
+        for i in range(1, 4):
+            leader = User.objects.create(username='leader' + str(i), first_name='leader', last_name=str(i),
+                                         email='leader{0}@test.com'.format(i))
+            team = Team.objects.create(team_leader=leader.profile, name='Team ' + str(i))
+            for j in range(1, 4):
+                member = User.objects.create(username='member{0}{1}'.format(i, j), first_name='member',
+                                             last_name='{0}{1}'.format(i, j),
+                                             email='member{0}{1}@test.com'.format(i, j))
+                TeamMember.objects.create(team=team, profile=member.profile, invitation_accepted=j < 3)
+            TeamEventRegistration.objects.create(event=self.event, team=team)
+
+    def test_roster_from_prefetch(self):
+        with self.assertNumQueries(3):
+            teams = list(Team.objects.with_roster().order_by('name'))
+        team = teams[0]
+        with self.assertNumQueries(0):
+            self.assertEqual(team.leader.username, 'leader1')
+            self.assertEqual([i.profile.user.username for i in team.members], ['member11', 'member12'])
+            self.assertEqual([i.profile.user.username for i in team.invitees], ['member13'])
+            self.assertEqual(team.member_count, 3)
+            self.assertFalse(team.ready())
+            self.assertEqual(team.team_members, 'member 11,member 12,member 13')
+            self.assertEqual([i.get_event_public_id for i in team.events.all()], [self.event.public_id])
+
+    def test_roster_without_prefetch(self):
+        team = Team.objects.get(name='Team 2')
+        self.assertEqual(team.member_count, 3)
+        self.assertFalse(team.ready())
+        self.assertEqual(team.team_members, 'member 21,member 22,member 23')
+        self.assertEqual(team.invitees.get().profile.user.username, 'member23')
+
+    def test_member_count_annotation(self):
+        teams = Team.objects.with_member_count().order_by('name')
+        with self.assertNumQueries(1):
+            self.assertEqual([i.member_count for i in teams], [3, 3, 3])
+
+    def test_serializer_queries_do_not_grow_with_teams(self):
+        with self.assertNumQueries(3):
+            data = TeamSerializer(Team.objects.with_roster().order_by('name'), many=True).data
+        self.assertEqual(len(data), 3)
+        self.assertEqual(data[0]['members'], ['member11', 'member12'])
+        self.assertEqual(data[0]['invitees'], ['member13'])
+        self.assertEqual(data[0]['events'], [self.event.public_id])
+
+
 class SoloEventRegistrationTestCase(TestCase):
     def setUp(self):
         self.user = User.objects.create(username='sample_test_user1',
@@ -256,6 +359,35 @@ class TeamEventRegistrationTestCase(TestCase):
         self.registration.save()
         self.assertEqual(self.registration.status, 'confirmed')
 
+    def test_find_registration(self):
+        outsider = User.objects.create(username='sample_test_user4', email='sampleuser4@test.com')
+        TeamMember.objects.create(team=self.team, profile=outsider.profile)
+        for user in (self.user, self.user1, self.user2):
+            with self.assertNumQueries(1):
+                self.assertEqual(self.event.find_registration(user), self.registration)
+        self.assertIsNone(self.event.find_registration(outsider))
+
+    def test_clean_staff_conflicts(self):
+        with self.assertNumQueries(1):
+            self.registration.clean()
+
+        organizer = ProfileOrganizer.objects.create(profile=self.profile2)
+        organizer.events.add(self.event)
+        with self.assertNumQueries(1), self.assertRaisesMessage(ValidationError, 'organizer'):
+            self.registration.clean()
+        organizer.events.remove(self.event)
+
+        volunteer = ProfileVolunteer.objects.create(profile=self.profile)
+        volunteer.events.add(self.event)
+        with self.assertRaisesMessage(ValidationError, 'volunteer'):
+            self.registration.clean()
+
+    def test_clean_ignores_pending_invitees(self):
+        outsider = User.objects.create(username='sample_test_user4', email='sampleuser4@test.com')
+        TeamMember.objects.create(team=self.team, profile=outsider.profile)
+        ProfileOrganizer.objects.create(profile=outsider.profile).events.add(self.event)
+        self.registration.clean()
+
 
 class EventRefreshParticipantsTestCase(TestCase):
     def setUp(self):
@@ -328,3 +460,172 @@ class EventRefreshParticipantsTestCase(TestCase):
         self.assertLessEqual(self.event.current_participants().filter(is_reserved=False).count(), 10)
         self.assertLessEqual(self.event1.current_reserved_participants().count(), 12)
         self.assertLessEqual(self.event1.current_participants().count(), 18)
+
+    def test_refresh_participants_fills_reserved_slots_first(self):
+        self.assertEqual(self.event.refresh_participants(), 15)
+        self.assertEqual(self.event.current_participants().count(), 15)
+        self.assertEqual(self.event.current_reserved_participants().count(), 5)
+        self.assertEqual(self.event.current_waiting_participants().count(), 5)
+
+        self.assertEqual(self.event1.refresh_participants(), 16)
+        self.assertEqual(self.event1.current_reserved_participants().count(), 10)
+        self.assertEqual(self.event1.current_participants().filter(is_reserved=False).count(), 6)
+
+    def test_refresh_participants_confirms_in_registration_order(self):
+        self.event.refresh_participants()
+        waiting = set(self.event.current_waiting_participants().values_list('profile__user__username', flat=True))
+        self.assertEqual(waiting, {'sample_test_user' + str(i) for i in range(16, 21)})
+
+    def test_refresh_participants_is_idempotent(self):
+        self.event.refresh_participants()
+        self.assertEqual(self.event.refresh_participants(), 0)
+        self.assertEqual(self.event.current_participants().count(), 15)
+
+    def test_refresh_participants_query_count(self):
+        # The number of queries must not depend on the size of the waiting list
+        # Without SELECT ... FOR UPDATE (SQLite) the event lock is taken with an extra update
+        lock = 1 if connection.features.has_select_for_update else 2
+        with self.assertNumQueries(6 + lock):
+            self.event.refresh_participants()
+        self.event.max_participants = 30
+        self.event.save()
+        with self.assertNumQueries(6 + lock):
+            self.event.refresh_participants()
+        with self.assertNumQueries(5 + lock):
+            self.event.refresh_participants()
+
+
+class TeamEventRefreshParticipantsTestCase(TestCase):
+    def setUp(self):
+        self.event = TeamEvent.objects.create(title='Sample Team Event1',
+                                              team_event=True,
+                                              start_date=dt.date(2019, 8, 3),
+                                              start_time=dt.time(12, 0, 0),
+                                              end_date=dt.date(2019, 9, 4),
+                                              end_time=dt.time(10, 0, 0),
+                                              max_participants=4,
+                                              reserved_slots=2
+                                              )
+        for i in range(1, 7):
+            user = User.objects.create(username='sample_test_user' + str(i),
+                                       first_name='sample',
+                                       last_name='user' + str(i),
+                                       email='sample_user{0}@test.com'.format(str(i)),
+                                       email_confirmed=True
+                                       )
+            team = Team.objects.create(team_leader=user.profile, name='Sample Team' + str(i))
+            TeamEventRegistration.objects.create(team=team, event=self.event, is_complete=True, is_reserved=i > 4)
+
+    def test_refresh_participants(self):
+        self.assertEqual(self.event.refresh_participants(), 4)
+        self.assertEqual(self.event.current_reserved_participants().count(), 2)
+        self.assertEqual(self.event.current_participants().filter(is_reserved=False).count(), 2)
+        self.assertEqual(self.event.current_waiting_participants().count(), 2)
+
+
+class SeatCountersTestCase(TestCase):
+    def setUp(self):
+        self.event = SoloEvent.objects.create(title='Sample Solo Event',
+                                              start_date=dt.date(2019, 8, 3),
+                                              start_time=dt.time(12, 0, 0),
+                                              end_date=dt.date(2019, 9, 4),
+                                              end_time=dt.time(10, 0, 0),
+                                              max_participants=3,
+                                              reserved_slots=1
+                                              )
+        self.profiles = []
+        for i in range(1, 6):
+            user = User.objects.create(username='sample_test_user' + str(i),
+                                       first_name='sample',
+                                       last_name='user' + str(i),
+                                       email='sample_user{0}@test.com'.format(str(i))
+                                       )
+            self.profiles.append(user.profile)
+
+    def assertCounters(self, confirmed, waiting, reserved_confirmed, reserved_waiting):
+        self.event.load_seat_counters()
+        self.assertEqual((self.event.confirmed_count, self.event.waiting_count,
+                          self.event.reserved_confirmed_count, self.event.reserved_waiting_count),
+                         (confirmed, waiting, reserved_confirmed, reserved_waiting))
+
+    def register(self, profile, is_reserved=False):
+        return SoloEventRegistration.objects.create(event=self.event, profile=profile, is_reserved=is_reserved)
+
+    def test_pending_registrations_are_not_counted(self):
+        self.register(self.profiles[0])
+        self.assertCounters(0, 0, 0, 0)
+
+    def test_complete_registration(self):
+        registrations = [self.event.complete_registration(self.register(profile)) for profile in self.profiles[:3]]
+        # The last general seat is kept for a reserved candidate
+        self.assertEqual([i.status for i in registrations], ['confirmed', 'confirmed', 'waiting'])
+        self.assertCounters(2, 1, 0, 0)
+
+        reserved = self.event.complete_registration(self.register(self.profiles[3], is_reserved=True))
+        self.assertEqual(reserved.status, 'confirmed')
+        self.assertCounters(3, 1, 1, 0)
+
+        reserved = self.event.complete_registration(self.register(self.profiles[4], is_reserved=True))
+        self.assertEqual(reserved.status, 'waiting')
+        self.assertCounters(3, 2, 1, 1)
+
+    def test_cancel_registration_promotes_waiting_registration(self):
+        registrations = [self.event.complete_registration(self.register(profile)) for profile in self.profiles[:3]]
+        self.event.cancel_registration(registrations[0])
+        self.assertCounters(2, 0, 0, 0)
+        registrations[2].refresh_from_db()
+        self.assertEqual(registrations[2].status, 'confirmed')
+
+    def test_cascaded_delete_updates_counters(self):
+        self.event.complete_registration(self.register(self.profiles[0]))
+        self.profiles[0].user.delete()
+        self.assertCounters(0, 0, 0, 0)
+
+    def test_counters_match_refresh_participants(self):
+        for profile in self.profiles:
+            SoloEventRegistration.objects.filter(pk=self.register(profile).pk).update(is_complete=True)
+        self.event.refresh_participants()
+        self.assertCounters(2, 3, 0, 0)
+
+    def test_complete_registration_twice(self):
+        registration = self.register(self.profiles[0])
+        self.event.complete_registration(registration)
+        self.event.complete_registration(registration)
+        self.assertCounters(1, 0, 0, 0)
+
+
+class WaitlistPositionTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.event = SoloEvent.objects.create(title='Sample Solo Event',
+                                              start_date=dt.date(2019, 8, 3),
+                                              start_time=dt.time(12, 0, 0),
+                                              end_date=dt.date(2019, 9, 4),
+                                              end_time=dt.time(10, 0, 0),
+                                              max_participants=2,
+                                              reserved_slots=1
+                                              )
+        self.registrations = []
+        for i in range(1, 7):
+            user = User.objects.create(username='sample_test_user' + str(i),
+                                       email='sample_user{0}@test.com'.format(str(i))
+                                       )
+            registration = SoloEventRegistration.objects.create(event=self.event, profile=user.profile,
+                                                                is_reserved=i % 2 == 0)
+            self.registrations.append(self.event.complete_registration(registration))
+
+    def test_waitlist_position(self):
+        # 1 general and 1 reserved seat, the rest wait in their own pool
+        self.assertEqual([i.status for i in self.registrations], ['confirmed', 'confirmed'] + ['waiting'] * 4)
+        self.assertEqual([i.waitlist_position() for i in self.registrations], [None, None, 1, 1, 2, 2])
+        self.assertEqual([i.pool for i in self.registrations[2:4]], ['general', 'reserved'])
+
+    def test_waitlist_position_pending(self):
+        user = User.objects.create(username='sample_test_user7', email='sample_user7@test.com')
+        registration = SoloEventRegistration.objects.create(event=self.event, profile=user.profile)
+        self.assertIsNone(registration.waitlist_position())
+
+    def test_waitlist_position_is_cached(self):
+        self.registrations[4].waitlist_position()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.registrations[4].waitlist_position(), 2)
@@ -3,8 +3,11 @@ from registration.models import User
 from accounts.models import Profile, Institute
 from events.models import SoloEvent, TeamEvent
 from event_registrations.models import Team, TeamMember, SoloEventRegistration, TeamEventRegistration
+from event_registrations.models import RegistrationTicket
 from event_registrations.serializers import TeamSerializer, TeamMemberSerializer, SoloEventRegistrationSerializer
-from event_registrations.serializers import TeamEventRegistrationSerializer
+from event_registrations.serializers import TeamEventRegistrationSerializer, RegistrationTicketSerializer
+from event_registrations.serializers import SoloEventRegistrationsSerializer, TeamEventRegistrationsSerializer
+from event_registrations.serializers import solo_registrations_data, team_registrations_data
 import datetime as dt
 
 
@@ -291,3 +294,82 @@ class TeamEventRegistrationSerializerTestCase(TestCase):
         self.assertEqual(self.test_data1['status'], self.serializer1['status'].value)
         self.assertEqual(self.test_data2['status'], self.serializer2['status'].value)
 
+
+class QueryBudgetTestCase(TestCase):
+    def setUp(self):
+        self.solo_event = SoloEvent.objects.create(title='Sample Solo Event', start_date=dt.date(2019, 7, 1),
+                                                   end_date=dt.date(2019, 7, 1), start_time=dt.time(12, 0, 0),
+                                                   end_time=dt.time(15, 0, 0))
+        self.team_event = TeamEvent.objects.create(title='Sample Team Event', start_date=dt.date(2019, 7, 1),
+                                                   end_date=dt.date(2019, 7, 1), start_time=dt.time(12, 0, 0),
+                                                   end_time=dt.time(15, 0, 0), max_team_size=4, min_team_size=1)
+        self.invitee = User.objects.create(username='invitee', first_name='sample', last_name='invitee',
+                                           email='invitee@test.com').profile
+        self.add_rows(1)
+
+    def add_rows(self, count):
+        start = Team.objects.count()
+        for i in range(start, start + count):
+            user = User.objects.create(username='sample_user' + str(i), first_name='sample', last_name=str(i),
+                                       email='sample{0}@test.com'.format(i))
+            member = User.objects.create(username='sample_member' + str(i), first_name='sample', last_name=str(i),
+                                         email='member{0}@test.com'.format(i))
+            team = Team.objects.create(team_leader=user.profile, name='Sample Team' + str(i))
+            TeamMember.objects.create(team=team, profile=member.profile, invitation_accepted=True)
+            TeamMember.objects.create(team=team, profile=self.invitee)
+            TeamEventRegistration.objects.create(team=team, event=self.team_event)
+            SoloEventRegistration.objects.create(profile=user.profile, event=self.solo_event)
+            RegistrationTicket.objects.create(event=self.solo_event, profile=user.profile)
+
+    def assertWithinBudget(self, serializer_class, queryset, many=True):
+        """
+            Serializing one row and ten rows both take exactly the serializer's query budget
+        """
+
+        for rows in (1, 10):
+            self.add_rows(rows - Team.objects.count())
+            with self.assertNumQueries(serializer_class.query_budget):
+                rows_loaded = serializer_class.setup_eager_loading(queryset.all())
+                data = serializer_class(rows_loaded if many else rows_loaded.get(), many=many).data
+            self.assertTrue(data)
+
+    def test_team_serializer(self):
+        self.assertWithinBudget(TeamSerializer, Team.objects.all())
+
+    def test_team_member_serializer(self):
+        self.assertWithinBudget(TeamMemberSerializer, TeamMember.objects.filter(profile=self.invitee))
+
+    def test_team_event_registration_serializer(self):
+        self.assertWithinBudget(TeamEventRegistrationSerializer, TeamEventRegistration.objects.all())
+
+    def test_solo_event_registration_serializer(self):
+        self.assertWithinBudget(SoloEventRegistrationSerializer, SoloEventRegistration.objects.all())
+
+    def test_registration_ticket_serializer(self):
+        self.assertWithinBudget(RegistrationTicketSerializer, RegistrationTicket.objects.all())
+
+    def test_team_event_registrations_serializer(self):
+        self.assertWithinBudget(TeamEventRegistrationsSerializer, TeamEvent.objects.all(), many=False)
+
+    def test_solo_event_registrations_serializer(self):
+        self.assertWithinBudget(SoloEventRegistrationsSerializer, SoloEvent.objects.all(), many=False)
+
+    def test_solo_registrations_data_matches_serializer(self):
+        self.add_rows(3)
+        first_two = SoloEventRegistration.objects.order_by('pk').values('pk')[:2]
+        SoloEventRegistration.objects.filter(pk__in=first_two).update(is_complete=True)
+        SoloEventRegistration.objects.filter(pk=SoloEventRegistration.objects.first().pk).update(is_confirmed=True)
+        with self.assertNumQueries(1):
+            data = solo_registrations_data(self.solo_event)
+        events = SoloEventRegistrationsSerializer.setup_eager_loading(SoloEvent.objects)
+        self.assertEqual(data, SoloEventRegistrationsSerializer(events.get()).data)
+        self.assertEqual([i['status'] for i in data['registrations']],
+                         ['confirmed', 'waiting', 'payment pending', 'payment pending'])
+
+    def test_team_registrations_data_matches_serializer(self):
+        self.add_rows(3)
+        with self.assertNumQueries(1):
+            data = team_registrations_data(self.team_event)
+        events = TeamEventRegistrationsSerializer.setup_eager_loading(TeamEvent.objects)
+        self.assertEqual(data, TeamEventRegistrationsSerializer(events.get()).data)
+        self.assertEqual(len(data['registrations']), 4)
@@ -1,9 +1,11 @@
+from django.test import override_settings
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
 from registration.models import User
-from accounts.models import Institute, Profile
+from accounts.models import Institute, Profile, ProfileOrganizer, ProfileVolunteer
 from events.models import TeamEvent, SoloEvent
+from event_registrations.admission import admit_queued_tickets
 from event_registrations.models import Team, TeamMember, TeamEventRegistration, SoloEventRegistration
 import json
 import datetime as dt
@@ -317,6 +319,52 @@ class TeamListCreateViewTestCase(APITestCase):
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
+    def test_team_list_view_user_sees_own_teams(self):
+        url = reverse('teams_list_create')
+        self.client.force_login(user=self.user)
+        response = self.client.get(url)
+        self.assertEqual([i['name'] for i in response.data], ['Sample Team1'])
+
+    def test_team_list_view_pages(self):
+        url = reverse('teams_list_create')
+        self.client.force_login(user=self.staff_user)
+        Team.objects.create(team_leader=self.profile, name='Sample Team3')
+        names = []
+        response = self.client.get(url, {'page_size': 1})
+        while True:
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(len(response.data), 1)
+            names.extend(i['name'] for i in response.data)
+            if 'Link' not in response:
+                break
+            response = self.client.get(response['Link'][1:-len('>; rel="next"')])
+        self.assertEqual(names, ['Sample Team1', 'Sample Team2', 'Sample Team3'])
+
+    @override_settings(TEAM_LIST_PAGE_SIZE=2)
+    def test_team_list_view_default_page_size(self):
+        url = reverse('teams_list_create')
+        self.client.force_login(user=self.staff_user)
+        Team.objects.create(team_leader=self.profile, name='Sample Team3')
+        response = self.client.get(url)
+        self.assertEqual([i['name'] for i in response.data], ['Sample Team1', 'Sample Team2'])
+        self.assertIn('Link', response)
+
+    @override_settings(TEAM_LIST_PAGE_SIZE=None)
+    def test_team_list_view_unpaged(self):
+        url = reverse('teams_list_create')
+        self.client.force_login(user=self.staff_user)
+        Team.objects.create(team_leader=self.profile, name='Sample Team3')
+        response = self.client.get(url)
+        self.assertEqual([i['name'] for i in response.data], ['Sample Team1', 'Sample Team2', 'Sample Team3'])
+        self.assertNotIn('Link', response)
+
+    def test_team_list_view_invalid_page(self):
+        url = reverse('teams_list_create')
+        self.client.force_login(user=self.staff_user)
+        for params in ({'cursor': 'not-a-cursor'}, {'page_size': 0}, {'page_size': 'many'}):
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
 
 class TeamInvitationListViewTestCase(APITestCase):
     def setUp(self):
@@ -721,6 +769,70 @@ class TeamInvitationCreateViewTestCase(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
 
 
+class TeamInvitationBulkCreateViewTestCase(APITestCase):
+    def setUp(self):
+        self.users = [User.objects.create(username='sample_test_user' + str(i),
+                                          first_name='sample',
+                                          last_name='user' + str(i),
+                                          email='sampleuser{0}@test.com'.format(i)
+                                          ) for i in range(1, 6)]
+        self.team = Team.objects.create(team_leader=self.users[0].profile,
+                                        name='Sample Team1'
+                                        )
+        TeamMember.objects.create(team=self.team, profile=self.users[1].profile)
+        self.url = reverse('create_bulk_invitations', args=(self.team.public_id,))
+
+    def test_team_bulk_invitation_view_unauthenticated(self):
+        self.client.login(user=None)
+        response = self.client.post(self.url, json.dumps({'usernames': [self.users[2].username]}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_team_bulk_invitation_view_wrong_user(self):
+        self.client.force_login(user=self.users[1])
+        response = self.client.post(self.url, json.dumps({'usernames': [self.users[2].username]}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_team_bulk_invitation_view_no_usernames_input(self):
+        self.client.force_login(user=self.users[0])
+        response = self.client.post(self.url, json.dumps({'usernames': 'sample_test_user3'}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_team_bulk_invitation_view_registered_team(self):
+        event = TeamEvent.objects.create(title='Sample Team Event', team_event=True,
+                                         start_date=dt.date(2019, 7, 1), end_date=dt.date(2019, 7, 1),
+                                         start_time=dt.time(12, 0, 0), end_time=dt.time(15, 0, 0))
+        TeamEventRegistration.objects.create(team=self.team, event=event)
+        self.client.force_login(user=self.users[0])
+        response = self.client.post(self.url, json.dumps({'usernames': [self.users[2].username]}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+    def test_team_bulk_invitation_view(self):
+        self.client.force_login(user=self.users[0])
+        usernames = [i.username for i in self.users] + ['random_username', self.users[2].username]
+        response = self.client.post(self.url, json.dumps({'usernames': usernames}), content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([i['username'] for i in response.data['results']], usernames)
+        self.assertEqual([i.get('error') for i in response.data['results']],
+                         ['You can not invite yourself', 'User Already Invited', None, None, None,
+                          'user does not exist', 'User Already Invited'])
+        self.assertEqual([i.get('message') for i in response.data['results']],
+                         [None, None, 'invited', 'invited', 'invited', None, None])
+        self.assertEqual(sorted(response.data['team']['invitees']), [i.username for i in self.users[1:]])
+        self.assertEqual(self.team.invitees.count(), 4)
+
+    def test_team_bulk_invitation_view_nobody_invited(self):
+        self.client.force_login(user=self.users[0])
+        response = self.client.post(self.url, json.dumps({'usernames': [self.users[1].username]}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(response.data['results'], [{'username': self.users[1].username,
+                                                     'error': 'User Already Invited'}])
+
+
 class TeamInvitationDeleteViewTestCase(APITestCase):
     def setUp(self):
         self.user = User.objects.create(username='sample_test_user1',
@@ -975,6 +1087,18 @@ class EventRegistrationDetailViewTestCase(APITestCase):
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
+    def test_event_registration_detail_view_not_modified(self):
+        url = reverse('event_registration_detail', args=(self.event.public_id,))
+        self.client.force_login(user=self.user)
+        etag = self.client.get(url)['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.registration.is_confirmed = False
+        self.registration.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['status'], 'waiting')
+
 
 class EventRegistrationListViewTestCase(APITestCase):
     def setUp(self):
@@ -1077,6 +1201,47 @@ class EventRegistrationListViewTestCase(APITestCase):
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
+    def test_event_registration_list_view_streams_ndjson(self):
+        url = reverse('list_event_registration', args=(self.event.public_id,))
+        self.client.force_login(user=self.staff_user)
+        expected = [{'registrationId': self.registration.public_id, 'teamId': self.team.public_id,
+                     'status': 'confirmed'},
+                    {'registrationId': self.registration1.public_id, 'teamId': self.team1.public_id,
+                     'status': 'confirmed'}]
+        for response in (self.client.get(url, HTTP_ACCEPT='application/x-ndjson'), self.client.get(url, {'stream': 1})):
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertTrue(response.streaming)
+            self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+            lines = b''.join(response.streaming_content).decode().splitlines()
+            self.assertEqual([json.loads(i) for i in lines], expected)
+
+    def test_event_registration_list_view_not_modified(self):
+        url = reverse('list_event_registration', args=(self.event.public_id,))
+        self.client.force_login(user=self.staff_user)
+        response = self.client.get(url)
+        etag = response['ETag']
+        self.assertIn('Last-Modified', response)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.content, b'')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag, HTTP_ACCEPT='application/x-ndjson')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.registration1.is_confirmed = False
+        self.registration1.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+        self.registration1.delete()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, status.HTTP_200_OK)
+
+    def test_event_registration_list_view_ndjson_error(self):
+        url = reverse('list_event_registration', args=('random_string',))
+        self.client.force_login(user=self.staff_user)
+        response = self.client.get(url, HTTP_ACCEPT='application/x-ndjson')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(json.loads(response.content), {'error': 'Event does not exit'})
+
 
 class EventRegistrationViewTestCase(APITestCase):
     def setUp(self):
@@ -1232,6 +1397,22 @@ class EventRegistrationViewTestCase(APITestCase):
         self.assertTrue(TeamEventRegistration.objects.filter(event=self.event, team=self.team1).exists())
         self.assertFalse(TeamEventRegistration.objects.get(event=self.event, team=self.team1).is_reserved)
 
+    def test_solo_event_register_view_organizer(self):
+        ProfileOrganizer.objects.create(profile=self.profile2).events.add(self.event1)
+        url = reverse('create_event_registration', args=(self.event1.public_id,))
+        self.client.force_login(user=self.user2)
+        response = self.client.post(url, json.dumps({}), content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertFalse(SoloEventRegistration.objects.filter(event=self.event1, profile=self.profile2).exists())
+
+    def test_team_event_register_view_volunteer_member(self):
+        ProfileVolunteer.objects.create(profile=self.profile1).events.add(self.event)
+        url = reverse('create_event_registration', args=(self.event.public_id,))
+        self.client.force_login(user=self.user3)
+        response = self.client.post(url, json.dumps({'teamId': self.team1.public_id}), content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertFalse(TeamEventRegistration.objects.filter(event=self.event, team=self.team1).exists())
+
     def test_event_unregister_view_unauthenticated(self):
         url = reverse('create_event_registration', args=(self.event.public_id,))
         self.client.login(user=None)
@@ -1268,3 +1449,153 @@ class EventRegistrationViewTestCase(APITestCase):
         response = self.client.delete(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
+
+@override_settings(EVENT_REGISTRATION_QUEUE=True)
+class QueuedEventRegistrationViewTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='sample_test_user1',
+                                        first_name='sample',
+                                        last_name='user',
+                                        email='sampleuser1@test.com'
+                                        )
+        self.user1 = User.objects.create(username='sample_test_user2',
+                                         first_name='sample',
+                                         last_name='user1',
+                                         email='sampleuser2@test.com'
+                                         )
+        self.event = SoloEvent.objects.create(title='Sample Solo Event',
+                                              start_date=dt.date(2019, 8, 3),
+                                              end_date=dt.date(2019, 8, 4),
+                                              start_time=dt.time(11, 0, 0),
+                                              end_time=dt.time(15, 0, 0),
+                                              )
+
+    def test_solo_event_register_view_queued(self):
+        url = reverse('create_event_registration', args=(self.event.public_id,))
+        self.client.force_login(user=self.user)
+        response = self.client.post(url, json.dumps({}), content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data['status'], 'queued')
+        self.assertFalse(SoloEventRegistration.objects.filter(event=self.event).exists())
+
+        ticket_url = reverse('registration_ticket_detail', args=(self.event.public_id, response.data['ticketId']))
+        admit_queued_tickets()
+        response = self.client.get(ticket_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['status'], 'registered')
+        registration = SoloEventRegistration.objects.get(event=self.event, profile=self.user.profile)
+        self.assertEqual(response.data['registrationId'], registration.public_id)
+
+    def test_admitted_registration_detail(self):
+        url = reverse('event_registration_detail', args=(self.event.public_id,))
+        self.client.force_login(user=self.user)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_204_NO_CONTENT)
+        self.client.post(reverse('create_event_registration', args=(self.event.public_id,)), json.dumps({}),
+                         content_type='application/json')
+        # Admitted by the worker with bulk_create, which sends no signals
+        admit_queued_tickets()
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['status'], 'payment pending')
+
+    def test_registration_ticket_detail_view_wrong_user(self):
+        url = reverse('create_event_registration', args=(self.event.public_id,))
+        self.client.force_login(user=self.user)
+        response = self.client.post(url, json.dumps({}), content_type='application/json')
+        ticket_url = reverse('registration_ticket_detail', args=(self.event.public_id, response.data['ticketId']))
+        self.client.force_login(user=self.user1)
+        response = self.client.get(ticket_url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_registration_ticket_detail_view_does_not_exist(self):
+        url = reverse('registration_ticket_detail', args=(self.event.public_id, 'random_string'))
+        self.client.force_login(user=self.user)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class WaitlistPositionViewTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='sample_test_user1',
+                                        first_name='sample',
+                                        last_name='user',
+                                        email='sampleuser1@test.com'
+                                        )
+        self.user1 = User.objects.create(username='sample_test_user2',
+                                         first_name='sample',
+                                         last_name='user1',
+                                         email='sampleuser2@test.com'
+                                         )
+        self.user2 = User.objects.create(username='sample_test_user3',
+                                         first_name='sample',
+                                         last_name='user2',
+                                         email='sampleuser3@test.com'
+                                         )
+        self.event = SoloEvent.objects.create(title='Sample Solo Event',
+                                              start_date=dt.date(2019, 8, 3),
+                                              end_date=dt.date(2019, 8, 4),
+                                              start_time=dt.time(11, 0, 0),
+                                              end_time=dt.time(15, 0, 0),
+                                              max_participants=1
+                                              )
+        self.team_event = TeamEvent.objects.create(title='Sample Team Event',
+                                                   team_event=True,
+                                                   start_date=dt.date(2019, 7, 1),
+                                                   end_date=dt.date(2019, 7, 1),
+                                                   start_time=dt.time(12, 0, 0),
+                                                   end_time=dt.time(15, 0, 0),
+                                                   max_participants=0
+                                                   )
+        self.team = Team.objects.create(team_leader=self.user.profile, name='Sample Team1')
+        TeamMember.objects.create(team=self.team, profile=self.user1.profile, invitation_accepted=True)
+        self.event.complete_registration(SoloEventRegistration.objects.create(event=self.event,
+                                                                              profile=self.user.profile))
+        self.event.complete_registration(SoloEventRegistration.objects.create(event=self.event,
+                                                                              profile=self.user1.profile))
+        self.team_event.complete_registration(TeamEventRegistration.objects.create(event=self.team_event,
+                                                                                   team=self.team))
+
+    def test_waitlist_position_view_unauthenticated(self):
+        url = reverse('waitlist_position', args=(self.event.public_id,))
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_waitlist_position_view_not_registered(self):
+        url = reverse('waitlist_position', args=(self.event.public_id,))
+        self.client.force_login(user=self.user2)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+    def test_waitlist_position_view(self):
+        url = reverse('waitlist_position', args=(self.event.public_id,))
+        self.client.force_login(user=self.user)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['status'], 'confirmed')
+        self.assertIsNone(response.data['position'])
+
+        self.client.force_login(user=self.user1)
+        response = self.client.get(url)
+        self.assertEqual(response.data['status'], 'waiting')
+        self.assertEqual(response.data['pool'], 'general')
+        self.assertEqual(response.data['position'], 1)
+
+    def test_waitlist_position_view_team_member(self):
+        url = reverse('waitlist_position', args=(self.team_event.public_id,))
+        self.client.force_login(user=self.user1)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['position'], 1)
+
+    def test_waitlist_position_view_pending_invitee(self):
+        TeamMember.objects.create(team=self.team, profile=self.user2.profile)
+        url = reverse('waitlist_position', args=(self.team_event.public_id,))
+        self.client.force_login(user=self.user2)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+    def test_waitlist_position_view_event_does_not_exist(self):
+        url = reverse('waitlist_position', args=('random_string',))
+        self.client.force_login(user=self.user)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
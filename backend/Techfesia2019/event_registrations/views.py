@@ -1,17 +1,28 @@
-from django.db import IntegrityError
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.http import StreamingHttpResponse
 from rest_framework import status
 from rest_framework.parsers import JSONParser
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 from rest_framework.views import APIView
 from registration.models import User
-from accounts.models import Profile
+from accounts.models import HOME_INSTITUTE, Profile
+from base.conditional import make_etag, not_modified, set_validators
+from base.pagination import paginate_by_keyset
+from base.renderers import NDJSONRenderer, ndjson_lines
+from events.cache import get_event
 from events.models import Event, TeamEvent, SoloEvent
-from .models import Team, TeamMember, TeamEventRegistration, SoloEventRegistration
+from .admission import enqueue_registration
+from .exports import request_export
+from .models import Team, TeamMember, TeamEventRegistration, SoloEventRegistration, RegistrationTicket, ExportJob
+from .models import registrations_version
 from .permissions import IsStaffUser, IsAuthenticatedOrPost
-from .serializers import SoloEventRegistrationSerializer, SoloEventRegistrationsSerializer
-from .serializers import TeamEventRegistrationsSerializer
-from .serializers import TeamSerializer, TeamMemberSerializer, TeamEventRegistrationSerializer
+from .serializers import SoloEventRegistrationSerializer, RegistrationTicketSerializer, WaitlistPositionSerializer
+from .serializers import registrations_data, solo_registration_rows, team_registration_rows
+from .serializers import TeamSerializer, TeamMemberSerializer, TeamEventRegistrationSerializer, ExportJobSerializer
 
 
 class TeamDetailEditDeleteView(APIView):
@@ -19,7 +30,7 @@ class TeamDetailEditDeleteView(APIView):
 
     def get(self, request, public_id, format=None):
         try:
-            team = Team.objects.get(public_id=public_id)
+            team = Team.objects.with_roster().get(public_id=public_id)
         except Team.DoesNotExist:
             return Response({'message': 'Team Doesn\'t Exist.'}, status=status.HTTP_204_NO_CONTENT)
         if team.leader != request.user and not request.user.is_staff:
@@ -46,7 +57,7 @@ class TeamDetailEditDeleteView(APIView):
 
     def put(self, request, public_id, format=None):
         try:
-            team = Team.objects.get(public_id=public_id)
+            team = Team.objects.with_roster().get(public_id=public_id)
         except Team.DoesNotExist:
             return Response({'message': 'Team Doesn\'t Exist.'}, status=status.HTTP_204_NO_CONTENT)
         if team.leader != request.user and not request.user.is_staff:
@@ -62,18 +73,28 @@ class TeamDetailEditDeleteView(APIView):
 
 
 class TeamListCreateView(APIView):
+    """
+        Lists the teams, all of them for staff and the ones they lead for others. The list is paged by creation
+        date, TEAM_LIST_PAGE_SIZE teams at a time unless ?page_size= asks for up to TEAM_LIST_MAX_PAGE_SIZE, and the
+        Link header points at the next page. Setting TEAM_LIST_PAGE_SIZE to None returns the whole list by default.
+    """
+
     permission_classes = (IsAuthenticated,)
 
     def get(self, request, format=None):
-        teams = Team.objects.all()
+        teams = TeamSerializer.setup_eager_loading(Team.objects.all())
         if not request.user.is_staff:
-            try:
-                profile = Profile.objects.get(user=request.user)
-            except Profile.DoesNotExist:
-                return Response({'error': 'Profile not complete'}, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
-            teams = teams.filter(team_leader=profile)
+            teams = teams.filter(team_leader__user=request.user)
+        try:
+            teams, next_url = paginate_by_keyset(request, teams, 'create_date', settings.TEAM_LIST_PAGE_SIZE,
+                                                 settings.TEAM_LIST_MAX_PAGE_SIZE)
+        except ValueError as error:
+            return Response({'error': str(error)}, status=status.HTTP_400_BAD_REQUEST)
         serializer = TeamSerializer(teams, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        response = Response(serializer.data, status=status.HTTP_200_OK)
+        if next_url:
+            response['Link'] = '<{0}>; rel="next"'.format(next_url)
+        return response
 
     def post(self, request, format=None):
         try:
@@ -105,7 +126,7 @@ class TeamInvitationListView(APIView):
             profile = Profile.objects.get(user=request.user)
         except Profile.DoesNotExist:
             return Response({'message': 'User Profile is not complete'}, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
-        invitations = TeamMember.objects.filter(profile=profile)
+        invitations = TeamMemberSerializer.setup_eager_loading(TeamMember.objects.filter(profile=profile))
         serializer = TeamMemberSerializer(invitations, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
@@ -206,6 +227,53 @@ class TeamInvitationCreateView(APIView):
                             )
 
 
+class TeamInvitationBulkCreateView(APIView):
+    permission_classes = (IsAuthenticated,)
+
+    def post(self, request, public_id, format=None):
+        usernames = dict(request.data).get('usernames')
+        if not isinstance(usernames, list) or not all(isinstance(i, str) for i in usernames):
+            return Response({'error': '"usernames" list not provided'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            team = Team.objects.select_related('team_leader').get(public_id=public_id)
+        except Team.DoesNotExist:
+            return Response({'error': 'Team does not exist'}, status=status.HTTP_404_NOT_FOUND)
+        if team.team_leader.user_id != request.user.id:
+            return Response({'error': 'You do not have access to do this'}, status=status.HTTP_403_FORBIDDEN)
+        if team.events.exists():
+            return Response({'error': 'Can\'t add member to a registered team'},
+                            status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+        profiles = dict(User.objects.filter(username__in=usernames).values_list('username', 'profile'))
+        invited = set(TeamMember.objects.filter(team=team, profile__in=[i for i in profiles.values() if i])
+                      .values_list('profile_id', flat=True))
+        results = []
+        team_members = []
+        for username in usernames:
+            profile_id = profiles.get(username)
+            if username not in profiles:
+                results.append({'username': username, 'error': 'user does not exist'})
+            elif profile_id is None:
+                results.append({'username': username, 'error': 'Profile is not complete'})
+            elif profile_id == team.team_leader_id:
+                results.append({'username': username, 'error': 'You can not invite yourself'})
+            elif profile_id in invited:
+                results.append({'username': username, 'error': 'User Already Invited'})
+            else:
+                invited.add(profile_id)
+                team_members.append(TeamMember(team=team, profile_id=profile_id))
+                results.append({'username': username, 'message': 'invited'})
+
+        with transaction.atomic():
+            TeamMember.objects.bulk_create(team_members)
+            # bulk_create sends no post_save, the team's reservation has to be refreshed here
+            Team.objects.filter(pk=team.pk).refresh_reserved()
+        data = {'results': results, 'team': TeamSerializer(Team.objects.with_roster().get(pk=team.pk)).data}
+        if team_members:
+            return Response(data, status=status.HTTP_201_CREATED)
+        return Response(data, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+
 class TeamInvitationDeleteView(APIView):
     permission_classes = (IsAuthenticated,)
 
@@ -268,7 +336,7 @@ class EventRegistrationView(APIView):
     def post(self, request, public_id, format=None):
         # 1. Get Event (check if wrong event type)
         try:
-            base_event = Event.objects.get(public_id=public_id)
+            base_event = get_event(public_id)
         except Event.DoesNotExist:
             return Response({'error': 'Event does not exit'}, status=status.HTTP_400_BAD_REQUEST)
 
@@ -283,7 +351,7 @@ class EventRegistrationView(APIView):
             # 2. Get Team Details (verify team size, leader)
             data = JSONParser().parse(request)
             try:
-                team = Team.objects.get(public_id=data['teamId'])
+                team = Team.objects.with_roster().get(public_id=data['teamId'])
                 if team.leader != request.user:
                     return Response({'error': 'Only Team Leader can register a Team for an event'},
                                     status=status.HTTP_422_UNPROCESSABLE_ENTITY
@@ -302,21 +370,33 @@ class EventRegistrationView(APIView):
             if not team.ready():
                 return Response({'error': 'Team has pending invitations'}, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
 
-            # 3. Check for existing registration
+            if settings.EVENT_REGISTRATION_QUEUE:
+                ticket = enqueue_registration(event, team.team_leader, team=team)
+                return Response(RegistrationTicketSerializer(ticket).data, status=status.HTTP_202_ACCEPTED)
+
             team_members = [team.team_leader.user, ] + [i.profile.user for i in team.teammember_set.all()]
-            for i in team_members:
-                if event.find_registration(user=i) is not None:
-                    serializer = TeamEventRegistrationSerializer(event.find_registration(user=i))
-                    return Response({'error': 'Already registered for event', 'registration_details': serializer.data},
-                                    status=status.HTTP_422_UNPROCESSABLE_ENTITY
-                                    )
-            # 4. Register Team
-            registration = TeamEventRegistration()
-            registration.team = team
-            registration.event = event
-            registration.is_reserved = team.is_reserved
-            registration.save()
-            event.refresh_participants()  # Refreshing registrations
+            # Lock the event so concurrent requests can not register the same members twice
+            with transaction.atomic():
+                event.lock()
+                # 3. Check for existing registration
+                for i in team_members:
+                    registration = event.find_registration(user=i)
+                    if registration is not None:
+                        serializer = TeamEventRegistrationSerializer(registration)
+                        return Response({'error': 'Already registered for event',
+                                         'registration_details': serializer.data},
+                                        status=status.HTTP_422_UNPROCESSABLE_ENTITY
+                                        )
+                # 4. Register Team
+                registration = TeamEventRegistration()
+                registration.team = team
+                registration.event = event
+                registration.is_reserved = team.is_reserved
+                try:
+                    registration.clean()
+                except ValidationError as error:
+                    return Response({'error': ' '.join(error.messages)}, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+                registration.save()
             serializer = TeamEventRegistrationSerializer(registration)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
@@ -334,30 +414,40 @@ class EventRegistrationView(APIView):
             except Profile.DoesNotExist:
                 return Response({'error': 'User Profile do not exist or incomplete'}, status=status.HTTP_404_NOT_FOUND)
 
-            # 3. Check for existing registration
-            if SoloEventRegistration.objects.filter(profile=profile, event=event).count() is not 0:
-                registration = SoloEventRegistration.objects.filter(profile=profile, event=event)[0]
-                serializer = SoloEventRegistrationSerializer(registration)
-                return Response({'error': 'Already registered for event', 'registration_details': serializer.data},
-                                status=status.HTTP_422_UNPROCESSABLE_ENTITY
-                                )
-            # 4. Register Person
-            registration = SoloEventRegistration()
-            registration.profile = profile
-            registration.event = event
-            try:
-                registration.is_reserved = \
-                    (profile.college.name == 'Indian Institute of Information Technology, Sri City')
-            except AttributeError:
-                registration.is_reserved = False
-            registration.save()
-            event.refresh_participants()  # Refreshing registrations
+            if settings.EVENT_REGISTRATION_QUEUE:
+                ticket = enqueue_registration(event, profile)
+                return Response(RegistrationTicketSerializer(ticket).data, status=status.HTTP_202_ACCEPTED)
+
+            # Lock the event so concurrent requests can not register the same person twice
+            with transaction.atomic():
+                event.lock()
+                # 3. Check for existing registration
+                registration = SoloEventRegistration.objects.filter(profile=profile, event=event).first()
+                if registration is not None:
+                    serializer = SoloEventRegistrationSerializer(registration)
+                    return Response({'error': 'Already registered for event',
+                                     'registration_details': serializer.data},
+                                    status=status.HTTP_422_UNPROCESSABLE_ENTITY
+                                    )
+                # 4. Register Person
+                registration = SoloEventRegistration()
+                registration.profile = profile
+                registration.event = event
+                try:
+                    registration.is_reserved = (profile.college.name == HOME_INSTITUTE)
+                except AttributeError:
+                    registration.is_reserved = False
+                try:
+                    registration.clean()
+                except ValidationError as error:
+                    return Response({'error': ' '.join(error.messages)}, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+                registration.save()
             serializer = SoloEventRegistrationSerializer(registration)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     def delete(self, request, public_id, format=None):
         try:
-            base_event = Event.objects.get(public_id=public_id)
+            base_event = get_event(public_id)
         except Event.DoesNotExist:
             return Response({'error': 'Event does not exit'}, status=status.HTTP_400_BAD_REQUEST)
         if base_event.team_event:
@@ -368,8 +458,7 @@ class EventRegistrationView(APIView):
             registration = event.find_registration(request.user)
             if registration is not None:
                 if registration.team.leader == request.user:
-                    registration.delete()
-                    event.refresh_participants()  # Refreshing registrations
+                    event.cancel_registration(registration)
                 else:
                     return Response({'error': 'You are not the leader'}, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
                 return Response({'message': 'Successfully unregistered from event'}, status=status.HTTP_200_OK)
@@ -385,17 +474,22 @@ class EventRegistrationView(APIView):
                 registration = SoloEventRegistration.objects.get(event=event, profile=request.user.profile)
             except SoloEventRegistration.DoesNotExist:
                 return Response({'error': 'Not Registered for Event'}, status=status.HTTP_204_NO_CONTENT)
-            registration.delete()
-            event.refresh_participants()  # Refreshing registrations
+            event.cancel_registration(registration)
             return Response({'message': 'Successfully unregistered from event'}, status=status.HTTP_200_OK)
 
 
 class EventRegistrationListView(APIView):
+    """
+        Lists the registrations of an event. With Accept: application/x-ndjson or ?stream=1 the registrations are
+        streamed one per line instead, as they are read from the database.
+    """
+
     permission_classes = (IsStaffUser,)
+    renderer_classes = list(api_settings.DEFAULT_RENDERER_CLASSES) + [NDJSONRenderer]
 
     def get(self, request, public_id, format=None):
         try:
-            base_event = Event.objects.get(public_id=public_id)
+            base_event = get_event(public_id)
         except Event.DoesNotExist:
             return Response({'error': 'Event does not exit'}, status=status.HTTP_404_NOT_FOUND)
         if base_event.team_event:
@@ -403,14 +497,25 @@ class EventRegistrationListView(APIView):
                 event = base_event.teamevent
             except TeamEvent.DoesNotExist:
                 return Response({'error': 'The event Doesn\'t exist'}, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
-            serializer = TeamEventRegistrationsSerializer(event)
+            rows = team_registration_rows(event)
+            registrations = TeamEventRegistration.objects.filter(event=event)
         else:
             try:
                 event = base_event.soloevent
-            except TeamEvent.DoesNotExist:
+            except SoloEvent.DoesNotExist:
                 return Response({'error': 'The event Doesn\'t exist'}, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
-            serializer = SoloEventRegistrationsSerializer(event)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+            rows = solo_registration_rows(event)
+            registrations = SoloEventRegistration.objects.filter(event=event)
+        streaming = request.accepted_renderer.format == NDJSONRenderer.format or request.query_params.get('stream')
+        count, last_modified = registrations_version(registrations)
+        etag = make_etag(streaming and NDJSONRenderer.format or request.accepted_renderer.format, count,
+                         last_modified and last_modified.timestamp())
+        response = not_modified(request, etag, last_modified)
+        if response is None and streaming:
+            response = StreamingHttpResponse(ndjson_lines(rows), content_type=NDJSONRenderer.media_type)
+        elif response is None:
+            response = Response(registrations_data(event, rows), status=status.HTTP_200_OK)
+        return set_validators(response, etag, last_modified)
 
 
 class EventRegistrationDetailView(APIView):
@@ -418,7 +523,7 @@ class EventRegistrationDetailView(APIView):
 
     def get(self, request, public_id, format=None):
         try:
-            base_event = Event.objects.get(public_id=public_id)
+            base_event = get_event(public_id)
         except Event.DoesNotExist:
             return Response({'error': 'Event does not exit'}, status=status.HTTP_400_BAD_REQUEST)
         if base_event.team_event:
@@ -426,12 +531,10 @@ class EventRegistrationDetailView(APIView):
                 event = base_event.teamevent
             except TeamEvent.DoesNotExist:
                 return Response({'error': 'The event Doesn\'t exist'}, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
-            if event.find_registration(user=request.user) is None:
+            registration = event.find_registration(user=request.user)
+            if registration is None:
                 return Response({'error': 'User is Not Registered'}, status=status.HTTP_204_NO_CONTENT)
-            else:
-                registration = event.find_registration(user=request.user)
-            serializer = TeamEventRegistrationSerializer(registration)
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            serializer_class = TeamEventRegistrationSerializer
         else:
             try:
                 event = base_event.soloevent
@@ -441,5 +544,79 @@ class EventRegistrationDetailView(APIView):
                 registration = SoloEventRegistration.objects.get(event=event, profile=request.user.profile)
             except SoloEventRegistration.DoesNotExist:
                 return Response({'error': 'User is Not Registered'}, status=status.HTTP_204_NO_CONTENT)
-            serializer = SoloEventRegistrationSerializer(registration)
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            serializer_class = SoloEventRegistrationSerializer
+        etag = make_etag(request.accepted_renderer.format, registration.public_id, registration.updated_on.timestamp())
+        response = not_modified(request, etag, registration.updated_on)
+        if response is None:
+            response = Response(serializer_class(registration).data, status=status.HTTP_200_OK)
+        return set_validators(response, etag, registration.updated_on)
+
+
+class RegistrationTicketDetailView(APIView):
+    permission_classes = (IsAuthenticated,)
+
+    def get(self, request, public_id, ticket_id, format=None):
+        try:
+            ticket = RegistrationTicket.objects.select_related('event').get(public_id=ticket_id,
+                                                                            event__public_id=public_id)
+        except RegistrationTicket.DoesNotExist:
+            return Response({'error': 'Ticket does not exist'}, status=status.HTTP_404_NOT_FOUND)
+        if ticket.profile.user_id != request.user.id and not request.user.is_staff:
+            return Response({'error': 'This is not your ticket'}, status=status.HTTP_403_FORBIDDEN)
+        serializer = RegistrationTicketSerializer(ticket)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+class ExportJobCreateView(APIView):
+    """
+        Asks for the participant CSV of an event. Answers 200 with the finished export when none of the event's
+        registrations changed since it was written, else 202 with the export queued for the worker.
+    """
+
+    permission_classes = (IsStaffUser,)
+
+    def post(self, request, public_id, format=None):
+        try:
+            event = Event.objects.get_concrete(public_id=public_id)
+        except Event.DoesNotExist:
+            return Response({'error': 'Event does not exit'}, status=status.HTTP_404_NOT_FOUND)
+        job, reused = request_export(event, Profile.objects.filter(user=request.user).first())
+        serializer = ExportJobSerializer(job)
+        return Response(serializer.data, status=status.HTTP_200_OK if reused else status.HTTP_202_ACCEPTED)
+
+
+class ExportJobDetailView(APIView):
+    permission_classes = (IsStaffUser,)
+
+    def get(self, request, public_id, job_id, format=None):
+        jobs = ExportJobSerializer.setup_eager_loading(ExportJob.objects)
+        try:
+            job = jobs.get(public_id=job_id, event__public_id=public_id)
+        except ExportJob.DoesNotExist:
+            return Response({'error': 'Export does not exist'}, status=status.HTTP_404_NOT_FOUND)
+        serializer = ExportJobSerializer(job)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+class WaitlistPositionView(APIView):
+    permission_classes = (IsAuthenticated,)
+
+    def get(self, request, public_id, format=None):
+        try:
+            base_event = get_event(public_id)
+        except Event.DoesNotExist:
+            return Response({'error': 'Event does not exit'}, status=status.HTTP_404_NOT_FOUND)
+        if base_event.team_event:
+            try:
+                event = base_event.teamevent
+            except TeamEvent.DoesNotExist:
+                return Response({'error': 'The event Doesn\'t exist'}, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+            # The leader's or an accepted member's team, pending invitees are not registered
+            registration = event.find_registration(user=request.user)
+        else:
+            registration = SoloEventRegistration.objects.filter(event_id=base_event.pk,
+                                                                profile__user=request.user).first()
+        if registration is None:
+            return Response({'error': 'User is Not Registered'}, status=status.HTTP_204_NO_CONTENT)
+        serializer = WaitlistPositionSerializer(registration)
+        return Response(serializer.data, status=status.HTTP_200_OK)
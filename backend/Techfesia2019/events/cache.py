@@ -0,0 +1,74 @@
+"""
+    Cache of events by public_id, so the registration and payment views do not query the event and its concrete
+    subclass on every request.
+
+    The first tier is a per-process cachetools TTLCache, the second the Django cache when EVENT_CACHE_SHARED is set.
+    Saving or deleting an event in this process drops it from both tiers (see the receivers in events.models);
+    other processes see the change once their local copy expires, after EVENT_CACHE_TIMEOUT seconds.
+    Seat counters on a cached event are stale, call lock() or load_seat_counters() before relying on them.
+"""
+import pickle
+import threading
+from cachetools import TTLCache
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+
+
+# Holds pickled events, every lookup unpickles its own copy so requests never share an instance.
+# TTLCache evicts the least recently used entry first and is not thread safe, so every access holds the lock.
+local_events = TTLCache(settings.EVENT_CACHE_SIZE, settings.EVENT_CACHE_TIMEOUT)
+local_events_lock = threading.Lock()
+
+
+def get_local(public_id):
+    with local_events_lock:
+        return local_events.get(public_id)
+
+
+def set_local(public_id, data):
+    with local_events_lock:
+        local_events[public_id] = data
+
+
+def event_key(public_id):
+    return 'event:{0}'.format(public_id)
+
+
+def load_event(public_id):
+    """
+        Loads the event along with its concrete SoloEvent or TeamEvent in one query, reachable through
+        event.soloevent or event.teamevent. Raises Event.DoesNotExist.
+    """
+
+    # The subclass is joined even when its row is missing, which the views answer with a 422
+    return apps.get_model('events', 'Event').objects.with_concrete().get(public_id=public_id)
+
+
+def get_event(public_id):
+    """
+        load_event through the cache. Events that do not exist are not cached.
+    """
+
+    if not settings.EVENT_CACHE_TIMEOUT:
+        return load_event(public_id)
+    data = get_local(public_id)
+    if data is None and settings.EVENT_CACHE_SHARED:
+        data = cache.get(event_key(public_id))
+        if data is not None:
+            set_local(public_id, data)
+    if data is not None:
+        return pickle.loads(data)
+    event = load_event(public_id)
+    data = pickle.dumps(event)
+    set_local(public_id, data)
+    if settings.EVENT_CACHE_SHARED:
+        cache.set(event_key(public_id), data, settings.EVENT_CACHE_TIMEOUT)
+    return event
+
+
+def forget_event(public_id):
+    with local_events_lock:
+        local_events.pop(public_id, None)
+    if settings.EVENT_CACHE_SHARED:
+        cache.delete(event_key(public_id))
@@ -0,0 +1,62 @@
+import multiprocessing
+import os
+import time
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+from events.models import SoloEvent, TeamEvent
+
+EVENT_MODELS = {'solo': SoloEvent, 'team': TeamEvent}
+
+
+def reallocate(event_type, pk):
+    """
+        Recomputes the seat assignment of one event in its own transaction.
+        Returns (public_id, promotions, seconds taken).
+    """
+
+    started = time.perf_counter()
+    event = EVENT_MODELS[event_type].objects.get(pk=pk)
+    promoted = event.refresh_participants()
+    return event.public_id, promoted, time.perf_counter() - started
+
+
+def close_connections():
+    # Forked workers must not share the parent's database connection
+    connections.close_all()
+
+
+class Command(BaseCommand):
+    help = 'Recomputes seat assignments for every solo and team event, spreading events across processes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--event', dest='public_ids', action='append', default=[], metavar='PUBLIC_ID',
+                            help='Limit to the given event, can be repeated')
+        parser.add_argument('--type', choices=sorted(EVENT_MODELS), help='Limit to solo or team events')
+        parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                            help='Number of worker processes, 1 runs everything in this process. '
+                                 'Always 1 on SQLite, which only allows one writer at a time')
+
+    def handle(self, *args, **options):
+        jobs = []
+        for event_type, model in sorted(EVENT_MODELS.items()):
+            if options['type'] and options['type'] != event_type:
+                continue
+            events = model.objects.all()
+            if options['public_ids']:
+                events = events.filter(public_id__in=options['public_ids'])
+            jobs.extend((event_type, pk) for pk in events.values_list('pk', flat=True))
+
+        workers = 1 if connection.vendor == 'sqlite' else options['workers']
+        started = time.perf_counter()
+        if workers > 1 and len(jobs) > 1:
+            close_connections()
+            context = multiprocessing.get_context('fork')
+            with context.Pool(min(workers, len(jobs)), initializer=close_connections) as pool:
+                results = pool.starmap(reallocate, jobs)
+        else:
+            results = [reallocate(*job) for job in jobs]
+
+        for public_id, promoted, seconds in results:
+            self.stdout.write('{0}: {1} promotion(s) in {2:.1f} ms'.format(public_id, promoted, seconds * 1000))
+        self.stdout.write(self.style.SUCCESS('Reallocated {0} event(s), {1} promotion(s) in {2:.2f} s'.format(
+            len(results), sum(i[1] for i in results), time.perf_counter() - started)))
@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, Q
+from events.models import Event
+from events.utils import SEAT_COUNTER_FIELDS
+from event_registrations.models import SoloEventRegistration, TeamEventRegistration
+
+
+def count_registrations(registrations):
+    """
+        Returns {event_id: {counter: value}} recounted from the registration table in one query
+    """
+
+    counts = registrations.values('event').annotate(
+        confirmed_count=Count('pk', filter=Q(is_confirmed=True)),
+        waiting_count=Count('pk', filter=Q(is_complete=True, is_confirmed=False)),
+        reserved_confirmed_count=Count('pk', filter=Q(is_confirmed=True, is_reserved=True)),
+        reserved_waiting_count=Count('pk', filter=Q(is_complete=True, is_confirmed=False, is_reserved=True)),
+    )
+    return {row.pop('event'): row for row in counts}
+
+
+class Command(BaseCommand):
+    help = 'Recounts the seat counters stored on every event from its registrations'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify', action='store_true',
+                            help='Only report events whose stored counters are wrong, do not fix them')
+        parser.add_argument('--event', dest='public_ids', action='append', default=[], metavar='PUBLIC_ID',
+                            help='Limit to the given event, can be repeated')
+
+    def handle(self, *args, **options):
+        events = Event.objects.all()
+        if options['public_ids']:
+            events = events.filter(public_id__in=options['public_ids'])
+
+        expected = {}
+        for model in (SoloEventRegistration, TeamEventRegistration):
+            expected.update(count_registrations(model.objects.filter(event__in=events.values('pk'))))
+
+        empty = dict.fromkeys(SEAT_COUNTER_FIELDS, 0)
+        mismatched = 0
+        with transaction.atomic():
+            for event in events.only('public_id', *SEAT_COUNTER_FIELDS).select_for_update():
+                counts = expected.get(event.pk, empty)
+                stored = {field: getattr(event, field) for field in SEAT_COUNTER_FIELDS}
+                if stored == counts:
+                    continue
+                mismatched += 1
+                self.stdout.write('{0}: stored {1}, counted {2}'.format(event.public_id, stored, counts))
+                if not options['verify']:
+                    Event.objects.filter(pk=event.pk).update(**counts)
+
+        if options['verify'] and mismatched:
+            raise CommandError('{0} event(s) have wrong seat counters'.format(mismatched))
+        if options['verify']:
+            self.stdout.write(self.style.SUCCESS('All seat counters are correct'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Rebuilt seat counters of {0} event(s)'.format(mismatched)))
@@ -0,0 +1,49 @@
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def count_seats(apps, schema_editor):
+    Event = apps.get_model('events', 'Event')
+    registration_models = [apps.get_model('event_registrations', 'SoloEventRegistration'),
+                           apps.get_model('event_registrations', 'TeamEventRegistration')]
+    for registration_model in registration_models:
+        counts = registration_model.objects.values('event').annotate(
+            confirmed_count=Count('pk', filter=Q(is_confirmed=True)),
+            waiting_count=Count('pk', filter=Q(is_complete=True, is_confirmed=False)),
+            reserved_confirmed_count=Count('pk', filter=Q(is_confirmed=True, is_reserved=True)),
+            reserved_waiting_count=Count('pk', filter=Q(is_complete=True, is_confirmed=False, is_reserved=True)),
+        )
+        for row in counts:
+            Event.objects.filter(pk=row.pop('event')).update(**row)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0005_auto_20190718_2220'),
+        ('event_registrations', '0010_remove_teammember_invitation_rejected'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='confirmed_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='waiting_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='reserved_confirmed_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='reserved_waiting_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_seats, migrations.RunPython.noop),
+    ]
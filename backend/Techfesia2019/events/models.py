@@ -1,8 +1,15 @@
-from django.db import models
+from django.apps import apps
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import connection, models, transaction
+from django.db.models import signals, Count, F, Q
+from django.dispatch import receiver
+from django.utils import timezone
 import datetime
 
 # Create your models here.
 from base.utils import generate_random_string, generate_public_id
+from .cache import forget_event
+from .utils import plan_promotions, seat_counter_deltas, SEAT_COUNTER_FIELDS
 
 
 class Team(models.Model):
@@ -17,6 +24,45 @@ class Tags(models.Model):
     pass
 
 
+class EventQuerySet(models.QuerySet):
+    def with_concrete(self):
+        """
+            Joins both subclass tables, so event.soloevent and event.teamevent need no further query
+        """
+
+        return self.select_related('soloevent', 'teamevent')
+
+    def get_concrete(self, *args, **kwargs):
+        """
+            Returns the SoloEvent or TeamEvent matching the lookup, with all its columns, in one query.
+            Raises Event.DoesNotExist, or the subclass' DoesNotExist when the event has no row of its kind.
+        """
+
+        return self.with_concrete().get(*args, **kwargs).concrete
+
+    def concrete(self):
+        """
+            Returns the SoloEvents and TeamEvents of the queryset in one query,
+            leaving out events that have no row of their kind
+        """
+
+        events = []
+        for event in self.with_concrete():
+            try:
+                events.append(event.concrete)
+            except ObjectDoesNotExist:
+                pass
+        return events
+
+    def get_concrete_many(self, public_ids):
+        """
+            Returns {public_id: SoloEvent or TeamEvent} for the given public ids in one query,
+            leaving out events that do not exist or have no row of their kind
+        """
+
+        return {event.public_id: event for event in self.filter(public_id__in=public_ids).concrete()}
+
+
 class Event(models.Model):
     public_id = models.CharField(max_length=100,
                                  unique=True,
@@ -66,12 +112,139 @@ class Event(models.Model):
 
     reserved_fee = models.IntegerField(default=0)
 
+    # Seat counters, kept in step with registration state changes
+    confirmed_count = models.IntegerField(default=0, editable=False)
+
+    waiting_count = models.IntegerField(default=0, editable=False)
+
+    reserved_confirmed_count = models.IntegerField(default=0, editable=False)
+
+    reserved_waiting_count = models.IntegerField(default=0, editable=False)
+
+    objects = EventQuerySet.as_manager()
+
     def save(self, *args, **kwargs):
         if not self.public_id:
             self.public_id = generate_public_id(self)
 
         super().save(*args, **kwargs)
 
+    @property
+    def concrete(self):
+        """
+            The SoloEvent or TeamEvent of this event, picked by the team_event flag
+        """
+
+        return self.teamevent if self.team_event else self.soloevent
+
+    def registrations(self):
+        """
+            The event's SoloEventRegistrations or TeamEventRegistrations, picked by the team_event flag, so it works on
+            a plain Event as well
+        """
+
+        model = 'TeamEventRegistration' if self.team_event else 'SoloEventRegistration'
+        return apps.get_model('event_registrations', model).objects.filter(event_id=self.pk)
+
+    @staticmethod
+    def shift_seat_counters(event_id, old_counters, new_counters):
+        """
+            Moves a registration between seat counters, see events.utils.seat_counters
+        """
+        deltas = seat_counter_deltas(old_counters, new_counters)
+        if deltas:
+            Event.objects.filter(pk=event_id).update(**{field: F(field) + delta for field, delta in deltas.items()})
+
+    def load_seat_counters(self):
+        self.refresh_from_db(fields=SEAT_COUNTER_FIELDS)
+
+    def lock(self):
+        """
+            Locks the event row until the end of the current transaction, so seat allocation for an event
+            runs one request at a time while other events proceed in parallel.
+            Reloads the seat counters and limits so decisions are made on current values.
+            Call it first in the transaction: on SQLite, which has no row locks, it takes the database's write lock
+            with a no-op update, and a transaction that already read can not wait for that lock.
+        """
+        if not connection.features.has_select_for_update:
+            Event.objects.filter(pk=self.pk).update(max_participants=F('max_participants'))
+        locked = Event.objects.select_for_update() \
+            .values('max_participants', 'reserved_slots', *SEAT_COUNTER_FIELDS).get(pk=self.pk)
+        for field, value in locked.items():
+            setattr(self, field, value)
+
+    def has_free_seat(self, is_reserved):
+        """
+            Decides from the seat counters alone whether a newly completed registration can be confirmed.
+            Relies on refresh_participants having left no confirmable registration in the waiting list.
+        """
+        if is_reserved and self.reserved_confirmed_count < self.reserved_slots:
+            return True
+        if self.reserved_confirmed_count >= self.reserved_slots:
+            return self.confirmed_count < self.max_participants
+        general_confirmed = self.confirmed_count - self.reserved_confirmed_count
+        return general_confirmed < self.max_participants - self.reserved_slots
+
+    def complete_registration(self, registration):
+        """
+            Marks a registration as complete (e.g. after payment) and confirms it or puts it in the waiting list
+        """
+        with transaction.atomic():
+            self.lock()
+            # Re-read under the lock, a concurrent callback may already have completed it
+            registration = registration.__class__.objects.get(pk=registration.pk)
+            if registration.is_complete:
+                return registration
+            registration.is_complete = True
+            registration.is_confirmed = self.has_free_seat(registration.is_reserved)
+            registration.save()
+        return registration
+
+    def cancel_registration(self, registration):
+        """
+            Deletes a registration, the freed seat (if any) goes to the waiting list
+        """
+        with transaction.atomic():
+            self.lock()
+            # Re-read under the lock so the counters are released from the registration's current state
+            registration = registration.__class__.objects.get(pk=registration.pk)
+            registration.delete()
+            if registration.is_confirmed and self.waiting_count:
+                self.refresh_participants()
+
+    def refresh_participants(self):
+        """
+            Confirms waiting registrations while seats are available, reserved slots first.
+            Uses a fixed number of queries however long the waiting list is, returns the number of promotions.
+            Also rewrites the seat counters from scratch.
+        """
+        registrations = self.registrations()
+        with transaction.atomic():
+            self.lock()
+            counts = registrations.aggregate(
+                confirmed_count=Count('pk', filter=Q(is_confirmed=True)),
+                waiting_count=Count('pk', filter=Q(is_complete=True, is_confirmed=False)),
+                reserved_confirmed_count=Count('pk', filter=Q(is_confirmed=True, is_reserved=True)),
+                reserved_waiting_count=Count('pk', filter=Q(is_complete=True, is_confirmed=False, is_reserved=True)),
+            )
+            waiting = registrations.filter(is_complete=True, is_confirmed=False) \
+                .order_by('created_on', 'pk').values_list('pk', 'is_reserved')
+            waiting = list(waiting)
+            promoted = plan_promotions(waiting, counts['confirmed_count'], counts['reserved_confirmed_count'],
+                                       self.max_participants, self.reserved_slots)
+            if promoted:
+                registrations.filter(pk__in=promoted).update(is_confirmed=True, updated_on=timezone.now())
+                promoted_set = set(promoted)
+                reserved_promotions = sum(1 for pk, is_reserved in waiting if is_reserved and pk in promoted_set)
+                counts['confirmed_count'] += len(promoted)
+                counts['waiting_count'] -= len(promoted)
+                counts['reserved_confirmed_count'] += reserved_promotions
+                counts['reserved_waiting_count'] -= reserved_promotions
+            Event.objects.filter(pk=self.pk).update(**counts)
+            for field, value in counts.items():
+                setattr(self, field, value)
+        return len(promoted)
+
 
 class SoloEvent(Event):
 
@@ -91,38 +264,6 @@ class SoloEvent(Event):
     def current_waiting_reserved_participants(self):
         return self.soloeventregistration_set.filter(is_complete=True, is_confirmed=False, is_reserved=True)
 
-    def refresh_participants(self):
-        total_seats = self.max_participants
-        total_reserved_seats = self.reserved_slots
-        # If reserved registrations are available
-        while self.current_waiting_reserved_participants().count() is not 0:
-            # If reserved seats are available
-            if self.current_reserved_participants().count() < total_reserved_seats:
-                registration = self.current_waiting_reserved_participants().order_by('created_on')[0]
-                registration.is_confirmed = True
-                registration.save()
-            else:
-                break
-        # If All Reserved Slots are full
-        if self.current_reserved_participants().count() >= total_reserved_seats:
-            while self.current_waiting_participants().count() is not 0:
-                # Consider all registrations general
-                if self.current_participants().count() < total_seats:
-                    registration = self.current_waiting_participants().order_by('created_on')[0]
-                    registration.is_confirmed = True
-                    registration.save()
-                else:
-                    break
-        else:
-            while self.current_waiting_participants().count() is not 0:
-                # Leave seats for Reserved Candidates
-                if self.current_participants().filter(is_reserved=False).count() < total_seats - total_reserved_seats:
-                    registration = self.current_waiting_participants().order_by('created_on')[0]
-                    registration.is_confirmed = True
-                    registration.save()
-                else:
-                    break
-
 
 class TeamEvent(Event):
     min_team_size = models.IntegerField(default=1)
@@ -133,13 +274,16 @@ class TeamEvent(Event):
         return 'team'
 
     def find_registration(self, user):
-        if self.teameventregistration_set.filter(team__team_leader=user.profile).count() is 0:
-            if self.teameventregistration_set.filter(team__teammember_set__profile=user.profile).count() is not 0:
-                return self.teameventregistration_set.filter(team__teammember_set__profile=user.profile)[0]
-            else:
-                return None
-        else:
-            return self.teameventregistration_set.filter(team__team_leader__user=user)[0]
+        """
+            Returns the registration of the team the user leads or has joined, None if there is none.
+            One query, both paths are indexed subqueries on the user's teams.
+        """
+
+        Team = apps.get_model('event_registrations', 'Team')
+        TeamMember = apps.get_model('event_registrations', 'TeamMember')
+        led = Team.objects.filter(team_leader__user=user).values('pk')
+        joined = TeamMember.objects.filter(profile__user=user, invitation_accepted=True).values('team')
+        return self.teameventregistration_set.filter(Q(team__in=led) | Q(team__in=joined)).first()
 
     def current_participants(self):
         return self.teameventregistration_set.filter(is_confirmed=True)
@@ -153,20 +297,12 @@ class TeamEvent(Event):
     def current_waiting_reserved_participants(self):
         return self.teameventregistration_set.filter(is_confirmed=False, is_complete=True, is_reserved=True)
 
-    def refresh_participants(self):
-        total_seats = self.max_participants
-        total_reserved_seats = self.reserved_slots
-
-        reserved_slot = total_reserved_seats - self.current_reserved_participants().count()
-        if reserved_slot > 0:
-            for registration in self.current_waiting_reserved_participants().order_by('created_on')[:reserved_slot]:
-                registration.is_confirmed = True
-                registration.save()
-
-        if self.current_reserved_participants().count() < total_reserved_seats:
-            reserved_slot = total_seats - total_reserved_seats - self.current_participants().filter(is_reserved=False)
-        else:
-            reserved_slot = total_seats - self.current_participants().count()
-        for registration in self.current_waiting_participants().order_by('created_on')[:reserved_slot]:
-            registration.is_confirmed = True
-            registration.save()
+
+@receiver(signals.post_save, sender=Event)
+@receiver(signals.post_save, sender=SoloEvent)
+@receiver(signals.post_save, sender=TeamEvent)
+@receiver(signals.post_delete, sender=Event)
+@receiver(signals.post_delete, sender=SoloEvent)
+@receiver(signals.post_delete, sender=TeamEvent)
+def forget_cached_event(sender, instance, **kwargs):
+    forget_event(instance.public_id)
@@ -0,0 +1,77 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from events.cache import get_event, local_events
+from events.models import Event, SoloEvent, TeamEvent
+import datetime as dt
+
+
+class EventCacheTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        local_events.clear()
+        self.event = SoloEvent.objects.create(title='Sample Solo Event',
+                                              start_date=dt.date(2019, 8, 3),
+                                              start_time=dt.time(12, 0, 0),
+                                              end_date=dt.date(2019, 9, 4),
+                                              end_time=dt.time(10, 0, 0)
+                                              )
+        self.team_event = TeamEvent.objects.create(title='Sample Team Event',
+                                                   team_event=True,
+                                                   start_date=dt.date(2019, 8, 3),
+                                                   start_time=dt.time(12, 0, 0),
+                                                   end_date=dt.date(2019, 9, 4),
+                                                   end_time=dt.time(10, 0, 0)
+                                                   )
+
+    def test_concrete_event_is_cached(self):
+        with self.assertNumQueries(1):
+            event = get_event(self.team_event.public_id)
+            self.assertEqual(event.teamevent.max_team_size, self.team_event.max_team_size)
+        with self.assertNumQueries(0):
+            event = get_event(self.team_event.public_id)
+            self.assertEqual(event.teamevent.pk, self.team_event.pk)
+
+    def test_lookups_get_their_own_copy(self):
+        first = get_event(self.event.public_id)
+        first.title = 'Changed'
+        self.assertEqual(get_event(self.event.public_id).title, 'Sample Solo Event')
+
+    def test_missing_event_is_not_cached(self):
+        with self.assertRaises(Event.DoesNotExist):
+            get_event('random_string')
+        self.assertIsNone(local_events.get('random_string'))
+
+    def test_missing_subclass(self):
+        event = Event.objects.create(title='Base Event', team_event=True, start_date=dt.date(2019, 8, 3),
+                                     start_time=dt.time(12, 0, 0), end_date=dt.date(2019, 9, 4),
+                                     end_time=dt.time(10, 0, 0))
+        get_event(event.public_id)
+        with self.assertNumQueries(0), self.assertRaises(TeamEvent.DoesNotExist):
+            get_event(event.public_id).teamevent
+
+    def test_save_and_delete_invalidate(self):
+        get_event(self.event.public_id)
+        self.event.title = 'Renamed'
+        self.event.save()
+        self.assertEqual(get_event(self.event.public_id).title, 'Renamed')
+        public_id = self.event.public_id
+        self.event.delete()
+        with self.assertRaises(Event.DoesNotExist):
+            get_event(public_id)
+
+    @override_settings(EVENT_CACHE_SHARED=True)
+    def test_shared_tier(self):
+        get_event(self.event.public_id)
+        local_events.clear()
+        with self.assertNumQueries(0):
+            self.assertEqual(get_event(self.event.public_id).soloevent.pk, self.event.pk)
+        self.event.save()
+        local_events.clear()
+        with self.assertNumQueries(1):
+            get_event(self.event.public_id).soloevent
+
+    @override_settings(EVENT_CACHE_TIMEOUT=0)
+    def test_disabled(self):
+        get_event(self.event.public_id)
+        with self.assertNumQueries(1):
+            get_event(self.event.public_id).soloevent
@@ -0,0 +1,82 @@
+from io import StringIO
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+from events.models import Event, SoloEvent
+from event_registrations.models import SoloEventRegistration
+from registration.models import User
+import datetime as dt
+
+
+class RebuildSeatCountersTestCase(TestCase):
+    def setUp(self):
+        self.event = SoloEvent.objects.create(title='Sample Solo Event',
+                                              start_date=dt.date(2019, 8, 3),
+                                              start_time=dt.time(12, 0, 0),
+                                              end_date=dt.date(2019, 9, 4),
+                                              end_time=dt.time(10, 0, 0)
+                                              )
+        for i in range(1, 4):
+            user = User.objects.create(username='sample_test_user' + str(i),
+                                       email='sample_user{0}@test.com'.format(str(i))
+                                       )
+            SoloEventRegistration.objects.create(event=self.event, profile=user.profile, is_complete=True,
+                                                 is_confirmed=i < 3, is_reserved=i == 1)
+
+    def test_verify_correct_counters(self):
+        out = StringIO()
+        call_command('rebuild_seat_counters', verify=True, stdout=out)
+        self.assertIn('All seat counters are correct', out.getvalue())
+
+    def test_rebuild_counters(self):
+        Event.objects.filter(pk=self.event.pk).update(confirmed_count=10, reserved_waiting_count=4)
+        with self.assertRaises(CommandError):
+            call_command('rebuild_seat_counters', verify=True, stdout=StringIO())
+
+        call_command('rebuild_seat_counters', stdout=StringIO())
+        self.event.load_seat_counters()
+        self.assertEqual(self.event.confirmed_count, 2)
+        self.assertEqual(self.event.waiting_count, 1)
+        self.assertEqual(self.event.reserved_confirmed_count, 1)
+        self.assertEqual(self.event.reserved_waiting_count, 0)
+
+
+class ReallocateSeatsTestCase(TestCase):
+    def setUp(self):
+        self.event = SoloEvent.objects.create(title='Sample Solo Event',
+                                              start_date=dt.date(2019, 8, 3),
+                                              start_time=dt.time(12, 0, 0),
+                                              end_date=dt.date(2019, 9, 4),
+                                              end_time=dt.time(10, 0, 0),
+                                              max_participants=2
+                                              )
+        self.event1 = SoloEvent.objects.create(title='Sample Solo Event1',
+                                               start_date=dt.date(2019, 8, 3),
+                                               start_time=dt.time(12, 0, 0),
+                                               end_date=dt.date(2019, 9, 4),
+                                               end_time=dt.time(10, 0, 0),
+                                               max_participants=2
+                                               )
+        for i in range(1, 4):
+            user = User.objects.create(username='sample_test_user' + str(i),
+                                       email='sample_user{0}@test.com'.format(str(i))
+                                       )
+            SoloEventRegistration.objects.create(event=self.event, profile=user.profile, is_complete=True)
+            SoloEventRegistration.objects.create(event=self.event1, profile=user.profile, is_complete=True)
+
+    def test_reallocate_seats(self):
+        out = StringIO()
+        call_command('reallocate_seats', workers=1, stdout=out)
+        self.assertIn('{0}: 2 promotion(s)'.format(self.event.public_id), out.getvalue())
+        self.assertIn('Reallocated 2 event(s), 4 promotion(s)', out.getvalue())
+        self.assertEqual(self.event.current_participants().count(), 2)
+
+    def test_reallocate_seats_filtered(self):
+        out = StringIO()
+        call_command('reallocate_seats', workers=1, public_ids=[self.event1.public_id], stdout=out)
+        self.assertIn('Reallocated 1 event(s), 2 promotion(s)', out.getvalue())
+        self.assertEqual(self.event.current_participants().count(), 0)
+
+        out = StringIO()
+        call_command('reallocate_seats', workers=1, type='team', stdout=out)
+        self.assertIn('Reallocated 0 event(s)', out.getvalue())
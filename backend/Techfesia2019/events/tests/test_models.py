@@ -0,0 +1,66 @@
+from django.test import TestCase
+from registration.models import User
+from events.models import Event, SoloEvent, TeamEvent
+from event_registrations.models import Team, SoloEventRegistration, TeamEventRegistration
+import datetime as dt
+
+
+class EventQuerySetTestCase(TestCase):
+    def setUp(self):
+        self.solo_event = SoloEvent.objects.create(title='Sample Solo Event',
+                                                   start_date=dt.date(2019, 8, 3),
+                                                   start_time=dt.time(12, 0, 0),
+                                                   end_date=dt.date(2019, 9, 4),
+                                                   end_time=dt.time(10, 0, 0),
+                                                   fee=100
+                                                   )
+        self.team_event = TeamEvent.objects.create(title='Sample Team Event',
+                                                   team_event=True,
+                                                   start_date=dt.date(2019, 8, 3),
+                                                   start_time=dt.time(12, 0, 0),
+                                                   end_date=dt.date(2019, 9, 4),
+                                                   end_time=dt.time(10, 0, 0),
+                                                   max_team_size=4
+                                                   )
+        self.base_event = Event.objects.create(title='Sample Base Event',
+                                               team_event=True,
+                                               start_date=dt.date(2019, 8, 3),
+                                               start_time=dt.time(12, 0, 0),
+                                               end_date=dt.date(2019, 9, 4),
+                                               end_time=dt.time(10, 0, 0)
+                                               )
+
+    def test_get_concrete(self):
+        with self.assertNumQueries(2):
+            solo_event = Event.objects.get_concrete(public_id=self.solo_event.public_id)
+            team_event = Event.objects.get_concrete(pk=self.team_event.pk)
+        with self.assertNumQueries(0):
+            self.assertIsInstance(solo_event, SoloEvent)
+            self.assertEqual((solo_event.title, solo_event.fee), ('Sample Solo Event', 100))
+            self.assertIsInstance(team_event, TeamEvent)
+            self.assertEqual((team_event.title, team_event.max_team_size), ('Sample Team Event', 4))
+
+    def test_get_concrete_missing(self):
+        with self.assertRaises(Event.DoesNotExist):
+            Event.objects.get_concrete(public_id='random_string')
+        with self.assertRaises(TeamEvent.DoesNotExist):
+            Event.objects.get_concrete(pk=self.base_event.pk)
+
+    def test_get_concrete_many(self):
+        public_ids = [self.solo_event.public_id, self.team_event.public_id, self.base_event.public_id, 'random']
+        with self.assertNumQueries(1):
+            events = Event.objects.get_concrete_many(public_ids)
+            self.assertEqual(sorted(events), sorted(public_ids[:2]))
+            self.assertEqual(events[self.team_event.public_id].max_team_size, 4)
+            self.assertEqual(events[self.solo_event.public_id].title, 'Sample Solo Event')
+
+    def test_registrations(self):
+        user = User.objects.create(username='sample_test_user1', email='sample_user1@test.com')
+        solo_registration = SoloEventRegistration.objects.create(event=self.solo_event, profile=user.profile)
+        team = Team.objects.create(team_leader=user.profile, name='Sample Team1')
+        team_registration = TeamEventRegistration.objects.create(event=self.team_event, team=team)
+        self.assertEqual(list(self.solo_event.registrations()), [solo_registration])
+        self.assertEqual(list(self.team_event.registrations()), [team_registration])
+        # Plain events pick the registration model from team_event
+        self.assertEqual(list(Event.objects.get(pk=self.solo_event.pk).registrations()), [solo_registration])
+        self.assertEqual(list(Event.objects.get(pk=self.team_event.pk).registrations()), [team_registration])
@@ -0,0 +1,60 @@
+def plan_promotions(waiting, confirmed, reserved_confirmed, total_seats, total_reserved_seats):
+    """
+        Works out which waiting registrations should be confirmed.
+
+        `waiting` is an iterable of (pk, is_reserved) pairs ordered by registration time,
+        `confirmed` and `reserved_confirmed` are the current confirmed counts.
+        Reserved seats are filled first, then general seats, returns the list of pks to confirm.
+    """
+
+    promoted = []
+    remaining = []
+    reserved_available = total_reserved_seats - reserved_confirmed
+    for pk, is_reserved in waiting:
+        if is_reserved and reserved_available > 0:
+            promoted.append(pk)
+            reserved_available -= 1
+        else:
+            remaining.append(pk)
+
+    confirmed += len(promoted)
+    reserved_confirmed += len(promoted)
+
+    if reserved_confirmed >= total_reserved_seats:
+        # All reserved slots are full, consider all registrations general
+        available = total_seats - confirmed
+    else:
+        # Leave seats for reserved candidates
+        available = (total_seats - total_reserved_seats) - (confirmed - reserved_confirmed)
+
+    if available > 0:
+        promoted.extend(remaining[:available])
+    return promoted
+
+
+SEAT_COUNTER_FIELDS = ('confirmed_count', 'waiting_count', 'reserved_confirmed_count', 'reserved_waiting_count')
+
+
+def seat_counters(is_complete, is_confirmed, is_reserved):
+    """
+        Returns the names of the Event counters a registration in the given state is counted in
+    """
+
+    if is_confirmed:
+        return ('confirmed_count', 'reserved_confirmed_count') if is_reserved else ('confirmed_count',)
+    if is_complete:
+        return ('waiting_count', 'reserved_waiting_count') if is_reserved else ('waiting_count',)
+    return ()
+
+
+def seat_counter_deltas(old_counters, new_counters):
+    """
+        Returns a {counter: delta} dict for a registration moving between two states, zero deltas are left out
+    """
+
+    deltas = {}
+    for field in old_counters:
+        deltas[field] = deltas.get(field, 0) - 1
+    for field in new_counters:
+        deltas[field] = deltas.get(field, 0) + 1
+    return {field: delta for field, delta in deltas.items() if delta}
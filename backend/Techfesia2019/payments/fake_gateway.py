@@ -0,0 +1,145 @@
+"""
+    A stand-in for Paytm's order status API, for load tests and local development.
+
+    Point settings.PAYTM_STATUS_URL at FakePaytmGateway.url, call pay() for an order to get the parameters Paytm
+    would post to our callback, and post them. check_with_paytm then finds the same transaction on the gateway.
+    Connections are kept alive like Paytm's, and fail_next() makes the next requests fail to exercise retries.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from django.conf import settings
+from django.utils import timezone
+from .Checksum import generate_checksum, verify_checksum
+
+
+class FakePaytmGateway:
+    def __init__(self, host='127.0.0.1', port=0, latency=0):
+        self.latency = latency
+        self.orders = {}
+        self.requests = 0
+        self.connections = 0
+        self.failures = []
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), StatusRequestHandler)
+        self.server.daemon_threads = True
+        self.server.gateway = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return 'http://{0}:{1}/order/status'.format(host, port)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def pay(self, order_id, amount, successful=True):
+        """
+            Records a payment for the order and returns the signed callback parameters
+        """
+
+        params = {
+            'MID': settings.PAYTM_MERCHANT_ID,
+            'ORDERID': str(order_id),
+            'TXNID': 'FAKETXN{0}'.format(order_id),
+            'BANKTXNID': 'FAKEBANK{0}'.format(order_id),
+            'TXNAMOUNT': str(amount),
+            'CURRENCY': 'INR',
+            'STATUS': successful and 'TXN_SUCCESS' or 'TXN_FAILURE',
+            'RESPCODE': successful and '01' or '227',
+            'RESPMSG': successful and 'Txn Success' or 'Your payment has been declined by your bank.',
+            'TXNDATE': timezone.now().strftime('%Y-%m-%d %H:%M:%S.0'),
+            'GATEWAYNAME': 'FAKE',
+            'PAYMENTMODE': 'UPI',
+        }
+        params['CHECKSUMHASH'] = generate_checksum(params, settings.PAYTM_SECRET_KEY)
+        with self._lock:
+            self.orders[params['ORDERID']] = params
+        return dict(params)
+
+    def fail_next(self, count=1, status=503):
+        """
+            Answers the next count status requests with the HTTP status, or drops their connection when it is None
+        """
+
+        with self._lock:
+            self.failures.extend([status] * count)
+
+    def next_failure(self):
+        with self._lock:
+            return self.failures.pop(0) if self.failures else False
+
+    def status(self, order_id):
+        with self._lock:
+            self.requests += 1
+            params = self.orders.get(order_id)
+        if params is None:
+            return {'ORDERID': order_id, 'TXNID': '', 'BANKTXNID': '', 'TXNAMOUNT': '', 'STATUS': 'TXN_FAILURE',
+                    'RESPCODE': '334', 'RESPMSG': 'Invalid Order Id.', 'CHECKSUMHASH': ''}
+        return dict(params)
+
+
+class StatusRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        with self.server.gateway._lock:
+            self.server.gateway.connections += 1
+
+    def do_POST(self):
+        gateway = self.server.gateway
+        content_length = int(self.headers.get('Content-Length', 0))
+        if self.path.rstrip('/') != '/order/status':
+            self.rfile.read(content_length)
+            self.send_error(404)
+            return
+        failure = gateway.next_failure()
+        if failure is not False:
+            self.rfile.read(content_length)
+            if failure is None:
+                self.close_connection = True
+            else:
+                self.send_error(failure)
+            return
+        try:
+            data = json.loads(self.rfile.read(content_length))
+            checksum = data.pop('CHECKSUMHASH')
+            is_valid_checksum = verify_checksum(data, settings.PAYTM_SECRET_KEY, checksum)
+        except (ValueError, KeyError):
+            is_valid_checksum = False
+        if is_valid_checksum:
+            body = gateway.status(data.get('ORDERID'))
+        else:
+            body = {'STATUS': 'TXN_FAILURE', 'RESPCODE': '330', 'RESPMSG': 'Checksum provided is invalid.',
+                    'TXNID': '', 'BANKTXNID': '', 'TXNAMOUNT': '', 'CHECKSUMHASH': ''}
+        if gateway.latency:
+            time.sleep(gateway.latency)
+        content = json.dumps(body).encode()
+        try:
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client timed out
+            self.close_connection = True
+
+    def log_message(self, format, *args):
+        pass
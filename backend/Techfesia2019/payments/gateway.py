@@ -0,0 +1,145 @@
+"""
+    Client for Paytm's order status API, used to verify callbacks and to refresh pending transactions.
+
+    Calls go through one requests Session per process, so connections to the gateway are kept alive and reused
+    from a pool instead of being opened for every callback. Every call is bounded by a connect and a read timeout,
+    and connection errors, timeouts and 5xx answers are retried a few times after a randomly jittered backoff.
+    A status query only reads the order, so repeating it is safe. The latency of every call is recorded in
+    PaytmClient.metrics.
+"""
+import json
+import random
+import threading
+import time
+from collections import deque
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+from .Checksum import generate_checksum
+
+
+class GatewayError(Exception):
+    """
+        The gateway could not be reached or did not answer with an order status, after all retries
+    """
+
+
+class LatencyMetrics:
+    """
+        Thread safe counters and the latencies of the last `window` calls
+    """
+
+    def __init__(self, window=1000):
+        self.calls = 0
+        self.failures = 0
+        self.retries = 0
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds, attempts, failed):
+        with self._lock:
+            self.calls += 1
+            self.failures += failed
+            self.retries += attempts - 1
+            self._latencies.append(seconds)
+
+    def snapshot(self):
+        """
+            The counters, and the mean, median, 95th percentile and max latency in milliseconds of recent calls
+        """
+
+        with self._lock:
+            latencies = sorted(self._latencies)
+            data = {'calls': self.calls, 'failures': self.failures, 'retries': self.retries}
+        if not latencies:
+            return {**data, 'meanMs': None, 'p50Ms': None, 'p95Ms': None, 'maxMs': None}
+
+        def percentile(share):
+            return round(latencies[min(len(latencies) - 1, int(share * len(latencies)))] * 1000, 2)
+
+        return {**data, 'meanMs': round(sum(latencies) / len(latencies) * 1000, 2), 'p50Ms': percentile(0.5),
+                'p95Ms': percentile(0.95), 'maxMs': round(latencies[-1] * 1000, 2)}
+
+    def reset(self):
+        with self._lock:
+            self.calls = self.failures = self.retries = 0
+            self._latencies.clear()
+
+
+class PaytmClient:
+    """
+        Queries the status of orders. The url, timeouts, retries and pool size default to the PAYTM_STATUS_*
+        settings, the url is read on every call so it can be overridden in tests.
+    """
+
+    def __init__(self, status_url=None, timeout=None, retries=None, backoff=None, pool_size=None):
+        self.status_url = status_url
+        self.timeout = timeout or settings.PAYTM_STATUS_TIMEOUT
+        self.retries = settings.PAYTM_STATUS_RETRIES if retries is None else retries
+        self.backoff = settings.PAYTM_STATUS_BACKOFF if backoff is None else backoff
+        self.metrics = LatencyMetrics()
+        self.session = requests.Session()
+        # Retries are ours, so they are jittered and counted
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size or settings.PAYTM_POOL_SIZE, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def close(self):
+        self.session.close()
+
+    def signed_params(self, order_id):
+        params = {'MID': settings.PAYTM_MERCHANT_ID, 'ORDERID': str(order_id)}
+        params['CHECKSUMHASH'] = generate_checksum(params, settings.PAYTM_SECRET_KEY)
+        return params
+
+    def delay(self, attempt):
+        # Full jitter: anywhere up to the exponential backoff, so callbacks failing together retry apart
+        return random.uniform(0, self.backoff * 2 ** attempt)
+
+    def order_status(self, order_id):
+        """
+            Returns the gateway's status response for the order as a dict. Raises GatewayError.
+        """
+
+        data = json.dumps(self.signed_params(order_id))
+        url = self.status_url or settings.PAYTM_STATUS_URL
+        started = time.perf_counter()
+        attempt = 0
+        while True:
+            try:
+                response = self.session.post(url, data=data, headers={'Content-type': 'application/json'},
+                                             timeout=self.timeout)
+                if response.status_code < 500:
+                    response.raise_for_status()
+                    result = response.json()
+                    break
+                error = GatewayError('Paytm answered {0}'.format(response.status_code))
+            except (requests.ConnectionError, requests.Timeout) as exception:
+                error = GatewayError('Paytm did not answer: {0}'.format(exception))
+            except (requests.HTTPError, ValueError) as exception:
+                # 4xx or a body that is not JSON, repeating the request would not help
+                self.metrics.record(time.perf_counter() - started, attempt + 1, True)
+                raise GatewayError('Paytm answered with an error: {0}'.format(exception))
+            if attempt >= self.retries:
+                self.metrics.record(time.perf_counter() - started, attempt + 1, True)
+                raise error
+            time.sleep(self.delay(attempt))
+            attempt += 1
+        self.metrics.record(time.perf_counter() - started, attempt + 1, False)
+        return result
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """
+        The process wide PaytmClient, sharing its connection pool between requests
+    """
+
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = PaytmClient()
+        return _client
@@ -0,0 +1,44 @@
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from payments.gateway import GatewayError
+from payments.models import Transaction
+from payments.views import refresh_payment_status
+
+
+class Command(BaseCommand):
+    help = 'Asks Paytm for the status of transactions still pending, e.g. because their callback could not ' \
+           'reach the gateway, and completes or fails them'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', type=int, default=30,
+                            help='Minutes since a transaction was started before it is checked, so payments in '
+                                 'progress are left alone')
+        parser.add_argument('--loop', action='store_true', help='Keep checking instead of exiting after one pass')
+        parser.add_argument('--interval', type=float, default=60,
+                            help='Seconds to wait between passes (with --loop)')
+
+    def handle(self, *args, **options):
+        while True:
+            self.refresh(timezone.now() - timedelta(minutes=options['older_than']))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+    def refresh(self, started_before):
+        # The payment views create transactions without a status
+        transactions = Transaction.objects.filter(status__in=('', 'Pending'), order_id__isnull=False,
+                                                  created_on__lt=started_before).order_by('pk')
+        settled = 0
+        for transaction in transactions:
+            try:
+                refresh_payment_status(transaction)
+            except GatewayError as error:
+                # The next pass tries again, the others would most likely fail the same way
+                self.stderr.write('Paytm is unavailable, stopping this pass: {0}'.format(error))
+                break
+            if transaction.status in ('Successful', 'Failed'):
+                settled += 1
+                self.stdout.write('{0}: {1}'.format(transaction.order_id, transaction.status))
+        self.stdout.write(self.style.SUCCESS('Settled {0} pending transaction(s)'.format(settled)))
@@ -1,12 +1,19 @@
 import datetime as dt
+from io import StringIO
 from json import dumps as json_dumps
+from unittest import mock
+from django.core.management import call_command
+from django.test import SimpleTestCase, override_settings
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
 from registration.models import User
 from events.models import SoloEvent
 from event_registrations.models import SoloEventRegistration
+from payments.fake_gateway import FakePaytmGateway
+from payments.gateway import GatewayError, PaytmClient
 from payments.models import Transaction
+from payments.views import refresh_payment_status
 
 
 class PaymentInitiateViewTestCase(APITestCase):
@@ -133,3 +140,202 @@ class PaymentInitiateViewTestCase(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
 
 
+class PaymentCallbackTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='test_user1',
+                                        first_name='test', last_name='user',
+                                        email='test_user1@test.com', email_confirmed=True
+                                        )
+        self.event = SoloEvent.objects.create(title='SoloEvent1',
+                                              start_date=dt.date(2019, 7, 19), end_date=dt.date(2019, 7, 19),
+                                              start_time=dt.time(12, 0, 0),  end_time=dt.time(15, 0, 0),
+                                              fee=100, reserved_fee=80, reserved_slots=0, max_participants=20
+                                              )
+        self.registration = SoloEventRegistration.objects.create(event=self.event, profile=self.user.profile)
+        self.transaction = Transaction.objects.create(created_by=self.user.profile, amount=100,
+                                                      solo_registration=self.registration, status='Pending')
+        self.transaction.generate_order_id()
+        self.gateway = FakePaytmGateway().start()
+        self.addCleanup(self.gateway.stop)
+
+    def post_callback(self, params):
+        with override_settings(PAYTM_STATUS_URL=self.gateway.url):
+            return self.client.post(reverse('callback'), data=params)
+
+    def test_successful_payment(self):
+        response = self.post_callback(self.gateway.pay(self.transaction.order_id, 100))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.gateway.requests, 1)
+        self.transaction.refresh_from_db()
+        self.registration.refresh_from_db()
+        self.assertEqual(self.transaction.status, 'Successful')
+        self.assertEqual(self.transaction.transaction_id, 'FAKETXN' + self.transaction.order_id)
+        self.assertTrue(self.registration.is_complete)
+        self.assertTrue(self.registration.is_confirmed)
+
+    def test_failed_payment(self):
+        response = self.post_callback(self.gateway.pay(self.transaction.order_id, 100, successful=False))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.transaction.refresh_from_db()
+        self.registration.refresh_from_db()
+        self.assertEqual(self.transaction.status, 'Failed')
+        self.assertFalse(self.registration.is_complete)
+
+    def test_forged_payment(self):
+        params = self.gateway.pay(self.transaction.order_id, 100)
+        params['TXNAMOUNT'] = '1'
+        response = self.post_callback(params)
+        self.assertEqual(response.content, b'Forged Transaction')
+        self.registration.refresh_from_db()
+        self.assertFalse(self.registration.is_complete)
+
+    def test_gateway_unavailable(self):
+        self.gateway.fail_next(2)
+        with mock.patch('payments.views.get_client', return_value=PaytmClient(retries=1, backoff=0)):
+            response = self.post_callback(self.gateway.pay(self.transaction.order_id, 100))
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.transaction.refresh_from_db()
+        self.assertEqual(self.transaction.status, 'Pending')
+
+    def test_refresh_payment_status(self):
+        self.gateway.pay(self.transaction.order_id, 100)
+        with override_settings(PAYTM_STATUS_URL=self.gateway.url):
+            refresh_payment_status(self.transaction)
+        self.transaction.refresh_from_db()
+        self.registration.refresh_from_db()
+        self.assertEqual(self.transaction.status, 'Successful')
+        self.assertEqual(self.transaction.transaction_id, 'FAKETXN' + self.transaction.order_id)
+        self.assertTrue(self.registration.is_complete)
+
+
+class RefreshPendingPaymentsTestCase(APITestCase):
+    def setUp(self):
+        self.event = SoloEvent.objects.create(title='SoloEvent1',
+                                              start_date=dt.date(2019, 7, 19), end_date=dt.date(2019, 7, 19),
+                                              start_time=dt.time(12, 0, 0),  end_time=dt.time(15, 0, 0),
+                                              fee=100, reserved_fee=80, reserved_slots=0, max_participants=20
+                                              )
+        self.registrations = []
+        self.transactions = []
+        for i in range(1, 4):
+            user = User.objects.create(username='test_user' + str(i), email='test_user{0}@test.com'.format(i))
+            registration = SoloEventRegistration.objects.create(event=self.event, profile=user.profile)
+            transaction = Transaction.objects.create(created_by=user.profile, amount=100,
+                                                     solo_registration=registration)
+            transaction.generate_order_id()
+            self.registrations.append(registration)
+            self.transactions.append(transaction)
+        self.gateway = FakePaytmGateway().start()
+        self.addCleanup(self.gateway.stop)
+
+    def refresh(self, **options):
+        out, err = StringIO(), StringIO()
+        with override_settings(PAYTM_STATUS_URL=self.gateway.url):
+            call_command('refresh_pending_payments', stdout=out, stderr=err, **options)
+        for i in self.transactions + self.registrations:
+            i.refresh_from_db()
+        return out.getvalue(), err.getvalue()
+
+    def test_pending_transactions_are_settled(self):
+        self.gateway.pay(self.transactions[0].order_id, 100)
+        self.gateway.pay(self.transactions[1].order_id, 100, successful=False)
+        out, _ = self.refresh(older_than=0)
+        self.assertIn('Settled 3 pending transaction(s)', out)
+        self.assertEqual([i.status for i in self.transactions], ['Successful', 'Failed', 'Failed'])
+        self.assertEqual([i.is_complete for i in self.registrations], [True, False, False])
+        self.assertIn('Settled 0 pending transaction(s)', self.refresh(older_than=0)[0])
+
+    def test_recent_transactions_are_left_alone(self):
+        out, _ = self.refresh()
+        self.assertIn('Settled 0 pending transaction(s)', out)
+        self.assertEqual(self.gateway.requests, 0)
+
+    def test_gateway_unavailable(self):
+        self.gateway.fail_next(10)
+        with mock.patch('payments.views.get_client', return_value=PaytmClient(retries=1, backoff=0)):
+            out, err = self.refresh(older_than=0)
+        self.assertIn('Paytm is unavailable', err)
+        self.assertEqual([i.status for i in self.transactions], [''] * 3)
+        # The pass stops at the first transaction
+        self.assertEqual(len(self.gateway.failures), 8)
+
+    def test_pending_at_paytm(self):
+        client = mock.Mock(**{'order_status.return_value': {'STATUS': 'PENDING', 'RESPCODE': '400'}})
+        with mock.patch('payments.views.get_client', return_value=client):
+            self.refresh(older_than=0)
+        self.assertEqual([i.status for i in self.transactions], [''] * 3)
+
+
+class PaytmClientTestCase(SimpleTestCase):
+    def setUp(self):
+        self.gateway = FakePaytmGateway().start()
+        self.addCleanup(self.gateway.stop)
+        self.client = PaytmClient(status_url=self.gateway.url, retries=2, backoff=0)
+        self.addCleanup(self.client.close)
+
+    def test_order_status(self):
+        self.gateway.pay('ORDER1', 100)
+        self.assertEqual(self.client.order_status('ORDER1')['TXNID'], 'FAKETXNORDER1')
+        self.assertEqual(self.client.order_status('ORDER2')['RESPCODE'], '334')
+
+    def test_connections_are_reused(self):
+        for _ in range(3):
+            self.client.order_status('ORDER1')
+        self.assertEqual(self.gateway.requests, 3)
+        self.assertEqual(self.gateway.connections, 1)
+
+    def test_retries(self):
+        self.gateway.pay('ORDER1', 100)
+        self.gateway.fail_next(1)
+        self.gateway.fail_next(1, status=None)
+        self.assertEqual(self.client.order_status('ORDER1')['STATUS'], 'TXN_SUCCESS')
+        metrics = self.client.metrics.snapshot()
+        self.assertEqual((metrics['calls'], metrics['retries'], metrics['failures']), (1, 2, 0))
+
+    def test_retries_are_bounded(self):
+        self.gateway.fail_next(3)
+        with self.assertRaises(GatewayError):
+            self.client.order_status('ORDER1')
+        self.assertEqual(self.gateway.failures, [])
+        self.assertEqual(self.client.metrics.snapshot()['failures'], 1)
+
+    def test_client_errors_are_not_retried(self):
+        self.gateway.fail_next(2, status=400)
+        with self.assertRaises(GatewayError):
+            self.client.order_status('ORDER1')
+        self.assertEqual(len(self.gateway.failures), 1)
+
+    def test_read_timeout(self):
+        self.gateway.latency = 0.5
+        client = PaytmClient(status_url=self.gateway.url, timeout=(1, 0.05), retries=0)
+        self.addCleanup(client.close)
+        with self.assertRaises(GatewayError):
+            client.order_status('ORDER1')
+        self.assertLess(client.metrics.snapshot()['maxMs'], 500)
+
+    def test_jitter_is_bounded(self):
+        client = PaytmClient(status_url=self.gateway.url, backoff=0.25)
+        self.addCleanup(client.close)
+        for attempt in range(3):
+            for _ in range(20):
+                self.assertTrue(0 <= client.delay(attempt) <= 0.25 * 2 ** attempt)
+
+    def test_metrics(self):
+        self.assertEqual(self.client.metrics.snapshot()['p50Ms'], None)
+        for _ in range(4):
+            self.client.order_status('ORDER1')
+        metrics = self.client.metrics.snapshot()
+        self.assertEqual(metrics['calls'], 4)
+        self.assertTrue(0 < metrics['p50Ms'] <= metrics['p95Ms'] <= metrics['maxMs'])
+
+
+class GatewayMetricsViewTestCase(APITestCase):
+    def test_staff_only(self):
+        user = User.objects.create(username='test_user1', email='test_user1@test.com')
+        self.client.force_login(user)
+        self.assertEqual(self.client.get(reverse('payment_gateway_metrics')).status_code, status.HTTP_403_FORBIDDEN)
+        user.is_staff = True
+        user.save()
+        response = self.client.get(reverse('payment_gateway_metrics'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('p95Ms', response.data)
@@ -1,8 +1,9 @@
 from django.urls import path
-from .views import initiate_payment, callback, PaymentInitiateView
+from .views import initiate_payment, callback, PaymentInitiateView, GatewayMetricsView
 
 urlpatterns = [
     # path('initiate', initiate_payment, name='pay'),
     path('initiate', PaymentInitiateView.as_view(), name='payment_initiate'),
     path('callback/', callback, name='callback'),
+    path('gateway/metrics', GatewayMetricsView.as_view(), name='payment_gateway_metrics'),
 ]
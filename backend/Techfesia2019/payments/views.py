@@ -1,9 +1,9 @@
-import requests
-import json
 from payments.models import Transaction
 from .Checksum import generate_checksum, verify_checksum
+from .gateway import GatewayError, get_client
 from accounts.models import User, Profile
 from events.models import Event, TeamEvent, SoloEvent
+from events.cache import get_event
 from event_registrations.models import TeamEventRegistration, SoloEventRegistration
 from django.http import HttpResponse
 from django.shortcuts import render
@@ -14,7 +14,7 @@ from django.template.loader import render_to_string
 from rest_framework import status
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
 
 
 # Create your views here.
@@ -65,7 +65,7 @@ class PaymentInitiateView(APIView):
         except Profile.DoesNotExist:
             return Response({'error': 'Profile Does Not Exist'}, status=status.HTTP_404_NOT_FOUND)
         try:
-            base_event = Event.objects.get(public_id=event_public_id)
+            base_event = get_event(event_public_id)
         except Event.DoesNotExist:
             return Response({'error': 'Event Does Not exist'}, status=status.HTTP_404_NOT_FOUND)
         if base_event.team_event:
@@ -189,7 +189,13 @@ def callback(request):
         except Transaction.DoesNotExist:
             return Response({'error': 'Invalid Transaction'}, status=status.HTTP_404_NOT_FOUND)
 
-        if check_with_paytm(transaction.order_id, paytm_params) is False:
+        try:
+            is_genuine = check_with_paytm(transaction.order_id, paytm_params)
+        except GatewayError:
+            # The transaction stays pending, manage.py refresh_pending_payments settles it later
+            return HttpResponse('Unable to verify the payment with Paytm, it will be checked again later',
+                                status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        if is_genuine is False:
             return HttpResponse('Forged Transaction')
 
         transaction.response_checksum = paytm_checksum
@@ -202,9 +208,7 @@ def callback(request):
             else:
                 registration = transaction.solo_registration
 
-            registration.is_complete = True
-            registration.save()
-            registration.event.refresh_participants()
+            registration.event.complete_registration(registration)
         else:
             transaction.status = 'Failed'
 
@@ -214,69 +218,45 @@ def callback(request):
 
 
 def check_with_paytm(order_id, received_params):
-    paytm_params = dict()
-
-    paytm_params["MID"] = settings.PAYTM_MERCHANT_ID
-    paytm_params["ORDERID"] = order_id
-
-    checksum = generate_checksum(paytm_params, settings.PAYTM_SECRET_KEY)
-    paytm_params["CHECKSUMHASH"] = checksum
-    post_data = json.dumps(paytm_params)
-
-    # for Staging
-    url = "https://securegw-stage.paytm.in/order/status"
-
-    # for Production
-    if settings.PAYTM_PRODUCTION:
-        url = "https://securegw.paytm.in/order/status"
-
-    response = requests.post(url, data=post_data, headers={"Content-type": "application/json"}).json()
-    print(response)
-    print(received_params)
-    is_valid = response['TXNID'] == received_params['TXNID'] \
+    response = get_client().order_status(order_id)
+    return response['TXNID'] == received_params['TXNID'] \
         and response['BANKTXNID'] == received_params['BANKTXNID'] \
         and response['TXNAMOUNT'] == received_params['TXNAMOUNT'] \
         and response['STATUS'] == received_params['STATUS']
-    print(is_valid)
-    return is_valid
 
 
-# In case of Pending/Late Transactions
+# In case of Pending/Late Transactions, see manage.py refresh_pending_payments. Raises GatewayError.
 def refresh_payment_status(transaction):
-    paytm_params = dict()
-
-    paytm_params["MID"] = settings.PAYTM_MERCHANT_ID
-    paytm_params["ORDERID"] = transaction.order_id
-
-    checksum = generate_checksum(paytm_params, settings.PAYTM_SECRET_KEY)
-    paytm_params["CHECKSUMHASH"] = checksum
-    post_data = json.dumps(paytm_params)
-
-    # for Staging
-    url = "https://securegw-stage.paytm.in/order/status"
-
-    # for Production
-    if settings.PAYTM_PRODUCTION:
-        url = "https://securegw.paytm.in/order/status"
-
-    response = requests.post(url, data=post_data, headers={"Content-type": "application/json"}).json()
+    response = get_client().order_status(transaction.order_id)
+    if response['STATUS'] == 'PENDING':
+        # Paytm has not settled it yet
+        return transaction
 
     transaction.response_checksum = response['CHECKSUMHASH']
 
     if response['RESPCODE'] == '01':
         transaction.status = 'Successful'
-        transaction.transaction_id = response['TXNIDfrom ']
+        transaction.transaction_id = response['TXNID']
         if transaction.is_team_registration:
             registration = transaction.team_registration
         else:
             registration = transaction.solo_registration
 
-        registration.is_complete = True
-        registration.save()
-        registration.event.refresh_participants()
+        registration.event.complete_registration(registration)
     else:
         transaction.status = 'Failed'
 
     transaction.save()
 
     return transaction
+
+
+class GatewayMetricsView(APIView):
+    """
+        Latency and failure counts of this process' calls to the Paytm order status API
+    """
+
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        return Response(get_client().metrics.snapshot(), status=status.HTTP_200_OK)